@@ -0,0 +1,128 @@
+# alpaca_clients.py
+# Long-lived Alpaca historical data clients and a bar request planner.
+#
+# One client per market (stocks, crypto) lives for the whole process, so its
+# requests Session keeps HTTPS connections alive between calls. Big pulls
+# are planned into chunks of at most MAX_SYMBOLS_PER_REQUEST symbols and a
+# time range expected to fit one Alpaca page (PAGE_BARS), fetched on a
+# thread pool and merged back per symbol in time order, so latency follows
+# the number of parallel chunks rather than Alpaca's sequential paging.
+# iter_bars_planned yields the chunks in order instead, with at most
+# max_workers of them in flight, for callers that stream pages out.
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from requests.adapters import HTTPAdapter
+from alpaca.data.historical import CryptoHistoricalDataClient, StockHistoricalDataClient
+from alpaca.data.requests import StockBarsRequest, CryptoBarsRequest
+
+from src.config import ALPACA_SECRET_KEY, ALPACA_PUBLIC_KEY
+from src.prices_helper import get_resolution
+from src.resample import RESOLUTION_SECONDS
+
+# bars per page of Alpaca's bars endpoint
+PAGE_BARS = 10000
+MAX_SYMBOLS_PER_REQUEST = 100
+# parallel requests per pull; also the keep-alive pool size per client
+MAX_WORKERS = 8
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_historical_client(crypto=False):
+    """The process-wide stock (or crypto) historical data client."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(crypto)
+        if client is None:
+            client_class = CryptoHistoricalDataClient if crypto else StockHistoricalDataClient
+            client = client_class(ALPACA_PUBLIC_KEY, ALPACA_SECRET_KEY)
+            # requests keeps 10 connections per host by default; allow one per worker
+            client._session.mount('https://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
+            _CLIENTS[crypto] = client
+        return client
+
+
+def plan_bar_requests(symbols, resolution, start, end,
+                      page_bars=PAGE_BARS, max_symbols=MAX_SYMBOLS_PER_REQUEST) -> list:
+    """
+    [(symbols, start, end)] chunks covering start..end for every symbol, in
+    symbol-group then time order. Each chunk spans at most page_bars bars
+    assuming a bar every period (an upper bound; markets close), so no
+    chunk needs a second page. Alpaca's end is inclusive, so inner chunk
+    ends stop one second before the next chunk starts.
+    """
+    symbols = list(symbols)
+    bar_seconds = RESOLUTION_SECONDS.get(resolution, RESOLUTION_SECONDS['min'])
+    plan = []
+    for i in range(0, len(symbols), max_symbols):
+        group = symbols[i:i + max_symbols]
+        span = timedelta(seconds=max(page_bars // len(group), 1) * bar_seconds)
+        cursor = start
+        while cursor < end:
+            chunk_end = min(cursor + span, end)
+            plan.append((group, cursor, chunk_end if chunk_end == end else chunk_end - timedelta(seconds=1)))
+            cursor = chunk_end
+    return plan
+
+
+def _fetch_chunk(client, crypto, resolution, chunk):
+    group, start, end = chunk
+    request_class = CryptoBarsRequest if crypto else StockBarsRequest
+    params = request_class(symbol_or_symbols=group, start=start, end=end,
+                           timeframe=get_resolution(resolution), limit=10000000)
+    res = client.get_crypto_bars(params) if crypto else client.get_stock_bars(params)
+    return res.data
+
+
+def iter_bars_planned(symbols, resolution, start, end=None, crypto=False,
+                      max_workers=MAX_WORKERS, fetch_chunk=_fetch_chunk):
+    """
+    Yields (chunk, {symbol: [Bar]}) for the plan_bar_requests chunks of
+    start..end (UTC datetimes; end None = up to now) in plan order, fetched
+    in parallel on the shared client with at most max_workers chunks
+    fetched but not yet consumed.
+    """
+    open_ended = end is None
+    end = end or datetime.now(timezone.utc)
+    plan = plan_bar_requests(symbols, resolution, start, end)
+    if open_ended:
+        # let Alpaca pick the latest end the subscription allows
+        plan = [(group, chunk_start, None if chunk_end == end else chunk_end)
+                for group, chunk_start, chunk_end in plan]
+    client = get_historical_client(crypto)
+    if len(plan) <= 1:
+        for chunk in plan:
+            yield chunk, fetch_chunk(client, crypto, resolution, chunk)
+        return
+
+    logging.info(f"Fetching {len(symbols)} symbols in {len(plan)} chunks.")
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(plan)))
+    pending = deque()
+    try:
+        for chunk in plan:
+            pending.append((chunk, pool.submit(fetch_chunk, client, crypto, resolution, chunk)))
+            if len(pending) >= max_workers:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+    finally:
+        # a consumer that stops early leaves no queued requests behind
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_bars_planned(symbols, resolution, start, end=None, crypto=False,
+                       max_workers=MAX_WORKERS, fetch_chunk=_fetch_chunk) -> dict:
+    """{symbol: [Bar]} for start..end, merged from iter_bars_planned."""
+    merged = {}
+    # chunks arrive in plan order, so each symbol's bars stay in time order
+    for _, result in iter_bars_planned(symbols, resolution, start, end, crypto,
+                                       max_workers, fetch_chunk):
+        for symbol, bars in result.items():
+            merged.setdefault(symbol, []).extend(bars)
+    return merged
@@ -16,10 +16,15 @@ import matplotlib
 import matplotlib.pyplot as plt
 import psycopg2
 import yfinance as yf
-from flask import Flask, request, jsonify, session, send_from_directory, Response
+from flask import Flask, request, jsonify, session, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
-from src.prices import get_indicators, get_prices
+from src.prices import get_indicators, get_indicator_columns, get_prices, stream_prices
+from src.response_formats import (
+    RESPONSE_FORMATS, NDJSON_CONTENT_TYPE, encode_indicator_result, encode_bars_ndjson,
+    encode_ndjson_line)
+from src.resample import parse_bucket
+from src.downsample import DOWNSAMPLE_METHODS, MIN_POINTS, downsample_bars, downsample_columns
 from src.esg import get_esg_indicators
 from src.dcf_valuation import (
     calculate_dcf_valuation,
@@ -44,8 +49,22 @@ from src.data_layer.data_access import (
     get_metrics_for_comparison,
     get_all_metrics_for_ranking
 )
-from src.screener_scoring import calculate_scores
-from src.ranking_engine import rank_companies
+from src.data_layer.backends import get_metrics_backend
+from src.data_layer.materialised_rankings import get_materialised_rankings
+from src.data_layer.sector_stats import get_sector_stats
+from src.data_layer.screening import parse_screen_request, parse_screen_args, screen_rows
+from src.data_layer.metrics_history import get_metrics_as_of, get_metric_trend
+from src.data_layer.freshness import record_ticker_requests
+from src.screener_scoring import calculate_scores, calculate_scores_batch
+from src.ranking_engine import rank_companies, rank_companies_page, page_of, decode_cursor
+from src.custom_profiles import validate_custom_profile, profile_hash, rank_custom_profile
+from src.data_layer.custom_profile_store import (
+    ensure_custom_profiles_table,
+    list_custom_profiles,
+    get_custom_profile,
+    save_custom_profile,
+    delete_custom_profile
+)
 from src.sentiment import get_stock_sentiment
 from src.sentiment_validation import *
 
@@ -232,6 +251,18 @@ def login():
 
 
 
+def get_token_user_id():
+    """user_id from an 'Authorization: Bearer <token>' login token, or None."""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        claims = jwt.decode(header[len('Bearer '):], app.config['SECRET_KEY'], algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    return claims.get('user_id')
+
+
 @app.route('/logout', methods=['POST'])
 def logout():
     # session.pop('user_id', None)  # Clearing user session
@@ -241,6 +272,36 @@ def logout():
 # dev get indicator crypto
 
 
+def downsample_args():
+    """
+    (max_points, method) of the optional max_points and downsample
+    ('lttb' or 'minmax') query args; max_points None keeps every bar.
+    """
+    max_points = request.args.get('max_points', type=int)
+    method = request.args.get('downsample', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"downsample must be one of {', '.join(DOWNSAMPLE_METHODS)}")
+    if max_points is not None and max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+    return max_points, method
+
+
+def indicators_response(tickers, indicators, period, resolution, agg, response_format, bucket=None,
+                        max_points=None, method='lttb'):
+    """Columnar indicator result encoded once in response_format."""
+    result = get_indicator_columns(
+        tickers, indicators, period, resolution, agg_number=agg, bucket=bucket)
+    if max_points:
+        result['stock_data'] = {ticker: downsample_columns(data, max_points, method)
+                                for ticker, data in result['stock_data'].items()}
+    try:
+        body, content_type = encode_indicator_result(result, response_format)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    logging.info(f"Calculating Indicators ({response_format})")
+    return Response(body, content_type=content_type)
+
+
 @app.route('/indicators_crypto')
 def indicators_crypto():
     # crypto tickers, can either be singular or a comma seperated list
@@ -263,6 +324,15 @@ def indicators_crypto():
     # Optional: aggregate number of the data
     # e.g. if you want a 5 minute interval you would type '5' here.
     arg5 = request.args.get('agg', type=int, default='1')
+    # Optional: response format. 'bars' (default) is the per-bar dicts the
+    # frontend parses; 'columnar' (JSON), 'msgpack' or 'arrow' return one
+    # array per field instead
+    response_format = request.args.get('format', 'bars')
+    # Optional: time bucket to resample into, e.g. 15m, 4h or 1w
+    # (takes precedence over agg)
+    bucket = request.args.get('bucket')
+    # Optional: max_points=1500 thins each ticker to about that many bars
+    # after the indicators are computed; downsample=lttb (default) or minmax
     try:
         if arg1:
             tickers = list(map(str, arg1.split(',')))
@@ -283,13 +353,32 @@ def indicators_crypto():
         logging.error(f"Error invalid input parameters: %s", e)
         return jsonify({"message": "invalid inputs."}, 400)
 
+    if response_format not in RESPONSE_FORMATS:
+        return jsonify({"message": f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
     try:
+        max_points, method = downsample_args()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if bucket:
+        try:
+            parse_bucket(bucket)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+    try:
+        if response_format != 'bars':
+            return indicators_response(
+                tickers, indicators, period, resolution, agg, response_format, bucket,
+                max_points, method)
         res = get_indicators(
             tickers,
             indicators,
             period,
             resolution,
-            agg_number=agg)
+            agg_number=agg,
+            bucket=bucket)
+        if max_points:
+            res['stock_data'] = {ticker: downsample_bars(bars, max_points, method)
+                                 for ticker, bars in res['stock_data'].items()}
         res = json.dumps(res, default=str)
         logging.info("Calculating Indicators")
         return jsonify(res)
@@ -329,6 +418,15 @@ def indicators_stock():
     # Optional: aggregate number of the data
     # e.g. if you want a 5 minute interval you would type '5' here.
     arg5 = request.args.get('agg', type=int, default='1')
+    # Optional: response format. 'bars' (default) is the per-bar dicts the
+    # frontend parses; 'columnar' (JSON), 'msgpack' or 'arrow' return one
+    # array per field instead
+    response_format = request.args.get('format', 'bars')
+    # Optional: time bucket to resample into, e.g. 15m, 4h or 1w
+    # (takes precedence over agg)
+    bucket = request.args.get('bucket')
+    # Optional: max_points=1500 thins each ticker to about that many bars
+    # after the indicators are computed; downsample=lttb (default) or minmax
 
     try:
         if arg1:
@@ -349,13 +447,32 @@ def indicators_stock():
         logging.error(f"Error invalid input parameters: %s", e)
         return jsonify({"message": "invalid inputs."}, 400)
 
+    if response_format not in RESPONSE_FORMATS:
+        return jsonify({"message": f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
+    try:
+        max_points, method = downsample_args()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if bucket:
+        try:
+            parse_bucket(bucket)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
     try:
+        if response_format != 'bars':
+            return indicators_response(
+                tickers, indicators, period, resolution, agg, response_format, bucket,
+                max_points, method)
         res = get_indicators(
             tickers,
             indicators,
             period,
             resolution,
-            agg_number=agg)
+            agg_number=agg,
+            bucket=bucket)
+        if max_points:
+            res['stock_data'] = {ticker: downsample_bars(bars, max_points, method)
+                                 for ticker, bars in res['stock_data'].items()}
         res = json.dumps(res, default=str)
         logging.info("Calculating Indicators")
         return jsonify(res)
@@ -390,6 +507,17 @@ def indicators_esg():
 # get prices without indicators
 
 
+def ndjson_price_lines(tickers, resolution, start_date, end_date):
+    """stream_prices pages as NDJSON lines, then an error line if it fails midway."""
+    try:
+        for ticker, bars in stream_prices(tickers, resolution, start_date, end_date):
+            yield encode_bars_ndjson(ticker, bars)
+    except Exception as e:
+        logging.error(f"Error streaming prices: %s", e)
+        # the 200 status is already sent, so the failure goes in-band
+        yield encode_ndjson_line({"message": "something went wrong while streaming prices."})
+
+
 @app.route("/get_prices")
 def fetch_prices():
     # stock tickers, can either be singular or a comma seperated list
@@ -404,11 +532,30 @@ def fetch_prices():
     arg3 = request.args.get('start_date', type=str, default='2025-01-5')
     # ending date in iso format 'YYYY-MM-DD'
     arg4 = request.args.get('end_date', type=str, default='2025-01-20')
+    # Optional: 'ndjson' streams one {"symbol", "bars"} line per ticker and
+    # Alpaca page as the pages arrive, instead of one JSON body at the end
+    response_format = request.args.get('format', 'json')
+    # Optional: max_points=1500 thins each ticker to about that many bars
+    # (json format only); downsample=lttb (default) or minmax
     if arg1:
         tickers = list(map(str, arg1.split(',')))
     else:
         return jsonify({"message": "missing arg1, tickers (e.g: AAPL)"})
+    if response_format not in ('json', 'ndjson'):
+        return jsonify({"message": "format must be one of json, ndjson"}), 400
+    try:
+        max_points, method = downsample_args()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if response_format == 'ndjson':
+        if max_points:
+            # pages go out before the whole series is known
+            return jsonify({"message": "max_points needs the json format"}), 400
+        lines = ndjson_price_lines(tickers, arg2, arg3, arg4)
+        return Response(stream_with_context(lines), content_type=NDJSON_CONTENT_TYPE)
     res = get_prices(tickers, arg2, start_date=arg3, end_date=arg4)
+    if max_points and isinstance(res, dict):
+        res = {ticker: downsample_bars(bars, max_points, method) for ticker, bars in res.items()}
     logging.info("Get prices success")
     return jsonify(res)
 
@@ -485,6 +632,8 @@ def fundamentals_valuation():
     ticker = request.args.get('ticker', type=str)
     if not ticker:
         return jsonify({"error": "Missing ticker parameter"}), 400
+    # popularity feeds the cache refresh priority
+    record_ticker_requests([ticker.strip().upper()])
     try:
         # handles outputs for essential metrics
         result = get_key_metrics_summary(ticker)
@@ -518,11 +667,12 @@ def api_compare_companies_cached():
                    for t in tickers_str.split(',') if t.strip()]
     if not ticker_list or len(ticker_list) > 15:
         return jsonify({"error": "Invalid/too many tickers"}), 400
+    record_ticker_requests(ticker_list)
 
     try:
-        # 1. Fetch stored metrics for the selected tickers from SQLite Cache
-        comparison_metrics = get_metrics_for_comparison(
-            ticker_list)  # from data_access.py
+        # 1. Fetch stored metrics for the selected tickers from the metrics store
+        comparison_metrics = get_metrics_backend().get_metrics_for_comparison(
+            ticker_list)  # SQLite cache or shared Postgres store
         if not comparison_metrics:
             return jsonify({"error": "No data for tickers"}), 404
 
@@ -536,27 +686,241 @@ def api_compare_companies_cached():
         return jsonify({"error": "Failed to generate comparison data"}), 500
 
 
+MAX_RANK_PAGE_SIZE = 100
+
+
 @app.route('/api/rank', methods=['GET'])
 def rank_companies():
     goal = request.args.get('goal', 'value')
     risk = request.args.get('risk', 'moderate')
     sector = request.args.get('sector')
+    # Optional: rank as of a past date 'YYYY-MM-DD' using the history store
+    as_of = request.args.get('as_of')
+    # Optional: 'percentile' ranks peers inside the metrics store instead,
+    # 'sector' scores each company against its own sector (sector-neutral)
+    scoring = request.args.get('scoring', 'absolute')
+    # Paging: limit (default 20) and the next_cursor of the previous page
+    try:
+        limit = min(max(1, request.args.get('limit', 20, type=int)), MAX_RANK_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        offset = decode_cursor(cursor) if cursor else max(0, request.args.get('offset', 0, type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Optional: rank with one of the logged-in user's custom profiles
+    profile_name = request.args.get('profile')
+    if profile_name:
+        user_id = get_token_user_id()
+        if user_id is None:
+            return jsonify({"error": "Login required for custom profiles"}), 401
+        conn = get_user_db_connection()
+        try:
+            ensure_custom_profiles_table(conn)
+            profile = get_custom_profile(conn, user_id, profile_name)
+        except psycopg2.Error as e:
+            logging.error(f"DATABASE ERROR loading profile: {e}")
+            return jsonify({"error": "A database error occurred."}), 500
+        finally:
+            conn.close()
+        if profile is None:
+            return jsonify({"error": f"No profile named '{profile_name}'"}), 404
+        if as_of:
+            try:
+                companies = get_metrics_as_of(as_of, sector)
+            except ValueError:
+                return jsonify({"error": "as_of must be an ISO date (YYYY-MM-DD)"}), 400
+        else:
+            companies = get_metrics_backend().get_all_metrics_for_ranking(sector)
+        return jsonify(rank_custom_profile(profile, companies, sector, limit, offset))
+
+    if scoring == 'sector':
+        try:
+            goal_enum, risk_enum = InvestmentGoal(goal), RiskTolerance(risk)
+        except ValueError:
+            return jsonify({"error": "Invalid goal or risk"}), 400
+        if as_of:
+            try:
+                companies = get_metrics_as_of(as_of)
+            except ValueError:
+                return jsonify({"error": "as_of must be an ISO date (YYYY-MM-DD)"}), 400
+            stats = None
+        else:
+            companies = get_metrics_backend().get_all_metrics_for_ranking(sector)
+            stats = get_sector_stats()
+        return jsonify(rank_companies_page(
+            goal_enum, risk_enum, companies, sector, limit, offset,
+            scoring='sector', sector_stats=stats))
+
+    if scoring == 'percentile':
+        try:
+            goal_enum, risk_enum = InvestmentGoal(goal), RiskTolerance(risk)
+        except ValueError:
+            return jsonify({"error": "Invalid goal or risk"}), 400
+        if not as_of:
+            # served from the maintained per-sector percentile indexes
+            page = get_materialised_rankings().percentile_lookup(goal, risk, sector, limit, offset)
+            if page is None:
+                page = get_metrics_backend().rank_by_percentile(
+                    goal_enum, risk_enum, sector, limit=limit, offset=offset)
+            return jsonify(page)
+        # Past dates: same percentile scoring over the history snapshot
+        try:
+            companies = get_metrics_as_of(as_of, sector)
+        except ValueError:
+            return jsonify({"error": "as_of must be an ISO date (YYYY-MM-DD)"}), 400
+        return jsonify(rank_companies_page(
+            goal_enum, risk_enum, companies, sector, limit, offset, scoring='percentile'))
+
+    # Unknown profiles would each compile (and cache) their own scoring table
+    try:
+        InvestmentGoal(goal), RiskTolerance(risk)
+    except ValueError:
+        return jsonify({"error": "Invalid goal or risk"}), 400
+
+    # Current data: serve the precomputed ranking for this profile/sector
+    if not as_of:
+        page = get_materialised_rankings().lookup(goal, risk, sector, limit, offset)
+        if page is not None:
+            return jsonify(page)
 
     # Fetch company data from database
-    companies = get_all_metrics_for_ranking(sector)
+    if as_of:
+        try:
+            companies = get_metrics_as_of(as_of, sector)
+        except ValueError:
+            return jsonify({"error": "as_of must be an ISO date (YYYY-MM-DD)"}), 400
+    else:
+        companies = get_metrics_backend().get_all_metrics_for_ranking(sector)
 
-    # Calculate scores for each company based on goal and risk
-    for company in companies:
-        scores = calculate_scores(company, goal=goal, risk=risk)
+    # Score the whole universe at once for this goal and risk
+    for company, scores in zip(companies, calculate_scores_batch(companies, goal=goal, risk=risk)):
         company.update(scores)
 
-    # Sort by overall score
-    ranked_companies = sorted(
-        companies, key=lambda x: x.get(
-            'overall_score', 0), reverse=True)
+    # Only the requested page is selected and sorted, ties by ticker
+    page = page_of(
+        companies,
+        [company.get('overall_score', 0) for company in companies],
+        limit, offset,
+        tie_keys=[company.get('ticker') or '' for company in companies])
+    return jsonify(page)
+
+
+@app.route('/api/rank/custom', methods=['POST'])
+def rank_with_custom_profile():
+    """
+    Ranks with an unsaved custom profile (see
+    custom_profiles.validate_custom_profile), e.g. to preview it:
+    {"profile": {...}, "sector": "Technology", "limit": 20, "offset": 0}
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    try:
+        profile = validate_custom_profile(payload.get('profile'))
+        limit = min(max(1, int(payload.get('limit', 20))), MAX_RANK_PAGE_SIZE)
+        offset = max(0, int(payload.get('offset', 0)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    sector = payload.get('sector')
+    companies = get_metrics_backend().get_all_metrics_for_ranking(sector)
+    return jsonify(rank_custom_profile(profile, companies, sector, limit, offset))
+
+
+@app.route('/api/profiles', methods=['GET'])
+def list_user_profiles():
+    """The logged-in user's custom scoring profiles."""
+    user_id = get_token_user_id()
+    if user_id is None:
+        return jsonify({"error": "Login required"}), 401
+    conn = get_user_db_connection()
+    try:
+        ensure_custom_profiles_table(conn)
+        return jsonify({"profiles": list_custom_profiles(conn, user_id)})
+    except psycopg2.Error as e:
+        logging.error(f"DATABASE ERROR listing profiles: {e}")
+        return jsonify({"error": "A database error occurred."}), 500
+    finally:
+        conn.close()
+
+
+@app.route('/api/profiles/<name>', methods=['PUT', 'DELETE'])
+def user_profile(name):
+    """PUT saves (validates) a custom profile under <name>; DELETE removes it."""
+    user_id = get_token_user_id()
+    if user_id is None:
+        return jsonify({"error": "Login required"}), 401
+    if request.method == 'PUT':
+        payload = request.get_json(force=True, silent=True) or {}
+        if not isinstance(payload, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        try:
+            profile = validate_custom_profile({**payload, 'name': name})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    conn = get_user_db_connection()
+    try:
+        ensure_custom_profiles_table(conn)
+        if request.method == 'DELETE':
+            if not delete_custom_profile(conn, user_id, name):
+                return jsonify({"error": f"No profile named '{name}'"}), 404
+            return jsonify({"message": "Profile deleted"})
+        digest = profile_hash(profile)
+        save_custom_profile(conn, user_id, profile, digest)
+        return jsonify({"profile": profile, "profile_hash": digest})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except psycopg2.Error as e:
+        logging.error(f"DATABASE ERROR saving profile: {e}")
+        return jsonify({"error": "A database error occurred."}), 500
+    finally:
+        conn.close()
+
+
+@app.route('/api/screen', methods=['GET', 'POST'])
+def api_screen():
+    """
+    Threshold screen over the metrics store. POST a JSON body (see
+    screening.parse_screen_request) or use query args, e.g.
+    /api/screen?pe_ratio=..20&dividend_yield=0.02..&sector=Technology&sort=-market_cap
+    Optional as_of='YYYY-MM-DD' screens the history store instead.
+    """
+    try:
+        if request.method == 'POST':
+            payload = request.get_json(force=True, silent=True) or {}
+            query = parse_screen_request(payload)
+            as_of = payload.get('as_of')
+        else:
+            query = parse_screen_args(request.args)
+            as_of = request.args.get('as_of')
+
+        if as_of:
+            result = screen_rows(query, get_metrics_as_of(as_of))
+        else:
+            result = get_metrics_backend().screen(query)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception:
+        logging.exception("Error in /api/screen endpoint")
+        return jsonify({"error": "Failed to run screen"}), 500
+    return jsonify(result)
+
 
-    # Return top companies
-    return jsonify({"companies": ranked_companies[:20]})
+@app.route('/api/history/trend', methods=['GET'])
+def api_metric_trend():
+    """Returns the stored daily history of one metric for one ticker."""
+    ticker = request.args.get('ticker', type=str)
+    metric = request.args.get('metric', type=str)
+    if not ticker or not metric:
+        return jsonify({"error": "ticker and metric parameters are required"}), 400
+    try:
+        trend = get_metric_trend(
+            ticker.strip().upper(),
+            metric,
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"ticker": ticker.upper(), "metric": metric, "history": trend})
 
 
 @app.route('/fundamentals/calculate_dcf', methods=['GET'])
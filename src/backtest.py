@@ -0,0 +1,221 @@
+# backtest.py
+# Factor backtests of the goal/risk profiles over the metrics history.
+# python3 -m src.backtest [--top-k 10] [--scorer profile|screener] [--prices yahoo]
+#
+# At every rebalance date the universe is re-ranked with the same scoring
+# code the app uses (ranking_engine profile scores or screener_scoring
+# overall scores) on the as-of metrics, the top-k are held equal-weight
+# until the next rebalance, and their forward return is compared with the
+# equal-weight universe. Scores, picks and returns are computed for all
+# dates at once; profiles run in parallel in a process pool.
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .data_layer.metrics_history import get_history_panel
+from .profiles import InvestmentGoal, RiskTolerance, get_profile_metrics
+from .ranking_engine import weighted_profile_scores
+from .screener_scoring import SCORE_COLUMNS, compile_scoring_table, score_matrix
+
+BACKTEST_PROFILES = [(goal.value, risk.value) for goal in InvestmentGoal for risk in RiskTolerance]
+SCORERS = ('profile', 'screener')
+DEFAULT_TOP_K = 10
+
+
+def prices_from_history(panel) -> np.ndarray:
+    """(n_dates, n_tickers) prices from the snapshots' current_price column."""
+    prices = panel['values'][..., panel['columns'].index('current_price')].copy()
+    prices[~(prices > 0)] = np.nan
+    return prices
+
+
+def load_price_panel(tickers, dates) -> np.ndarray:
+    """
+    (n_dates, n_tickers) adjusted closes from Yahoo: the first close on or
+    after each date. Tickers without data are NaN.
+    """
+    import yfinance as yf
+    end = (pd.Timestamp(dates[-1]) + pd.Timedelta(days=7)).date().isoformat()
+    closes = yf.download(list(tickers), start=dates[0], end=end,
+                         auto_adjust=True, progress=False)['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(tickers[0])
+    closes = closes.reindex(columns=list(tickers)).sort_index()
+    trading_days = closes.index.tz_localize(None) if closes.index.tz else closes.index
+    positions = trading_days.searchsorted(pd.to_datetime(dates), side='left')
+    prices = np.full((len(dates), len(tickers)), np.nan)
+    inside = positions < len(closes)
+    prices[inside] = closes.to_numpy(dtype=float)[positions[inside]]
+    return prices
+
+
+def forward_returns(prices) -> np.ndarray:
+    """(n_dates - 1, n_tickers) simple returns from each date to the next."""
+    prices = np.asarray(prices, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return prices[1:] / prices[:-1] - 1.0
+
+
+def profile_score_panel(panel, goal, risk, scorer='profile') -> np.ndarray:
+    """
+    (n_dates, n_tickers) scores for every date at once; NaN where the ticker
+    is not listed on that date.
+    """
+    values, columns = panel['values'], panel['columns']
+    if scorer == 'profile':
+        # as in ranking_engine._score_profile: metrics the data lacks are dropped
+        config = {m: c for m, c in get_profile_metrics(InvestmentGoal(goal), RiskTolerance(risk)).items()
+                  if m in columns}
+        metrics = list(config)
+        # normalised per date over that date's listed universe only
+        listed_values = np.where(panel['listed'][..., None],
+                                 values[..., [columns.index(m) for m in metrics]], np.nan)
+        scores = weighted_profile_scores(
+            listed_values,
+            np.array([config[m]['higher_better'] for m in metrics]),
+            np.array([config[m]['weight'] for m in metrics], dtype=float))
+    elif scorer == 'screener':
+        table = compile_scoring_table(goal, risk)
+        matrix = values[..., [columns.index(metric) for _, metric, _, _ in SCORE_COLUMNS]]
+        flat = matrix.reshape(-1, matrix.shape[-1])
+        scores = score_matrix(flat, table)['overall_score'].reshape(matrix.shape[:-1])
+    else:
+        raise ValueError(f"scorer must be one of {', '.join(SCORERS)}")
+    return np.where(panel['listed'], scores, np.nan)
+
+
+def top_k_returns(scores, returns, top_k):
+    """
+    Equal-weight forward return of the top_k scores at each rebalance date
+    (ties by ticker order) and of the whole eligible universe. Tickers
+    without a score or a forward return are not eligible.
+    """
+    scores = np.asarray(scores, dtype=float)[:len(returns)]
+    eligible = ~np.isnan(scores) & ~np.isnan(returns)
+    # stable argsort keeps ticker (column) order among equal scores
+    order = np.argsort(np.where(eligible, -scores, np.inf), axis=1, kind='stable')[:, :top_k]
+    picked = np.take_along_axis(eligible, order, axis=1)
+    picked_returns = np.where(picked, np.take_along_axis(returns, order, axis=1), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        portfolio = picked_returns.sum(axis=1) / picked.sum(axis=1)
+        benchmark = np.where(eligible, returns, 0.0).sum(axis=1) / eligible.sum(axis=1)
+    return portfolio, benchmark, order, picked
+
+
+def _summary(portfolio, benchmark):
+    valid = ~np.isnan(portfolio) & ~np.isnan(benchmark)
+    portfolio, benchmark = portfolio[valid], benchmark[valid]
+    return {
+        'periods': int(valid.sum()),
+        'cumulative_return': float(np.prod(1.0 + portfolio) - 1.0),
+        'benchmark_cumulative_return': float(np.prod(1.0 + benchmark) - 1.0),
+        'mean_period_return': float(portfolio.mean()) if portfolio.size else None,
+        'mean_excess_return': float((portfolio - benchmark).mean()) if portfolio.size else None,
+        'hit_rate': float((portfolio > benchmark).mean()) if portfolio.size else None,
+    }
+
+
+def backtest_profile(panel, returns, goal, risk, top_k=DEFAULT_TOP_K, scorer='profile') -> dict:
+    """One profile's backtest: per-period returns, holdings and a summary."""
+    scores = profile_score_panel(panel, goal, risk, scorer)
+    portfolio, benchmark, order, picked = top_k_returns(scores, returns, top_k)
+    tickers = np.array(panel['tickers'], dtype=object)
+    periods = []
+    for i in range(len(returns)):
+        periods.append({
+            'start': panel['dates'][i],
+            'end': panel['dates'][i + 1],
+            'return': None if np.isnan(portfolio[i]) else float(portfolio[i]),
+            'benchmark_return': None if np.isnan(benchmark[i]) else float(benchmark[i]),
+            'holdings': tickers[order[i][picked[i]]].tolist(),
+        })
+    return {
+        'goal': goal,
+        'risk': risk,
+        'scorer': scorer,
+        'top_k': top_k,
+        'summary': _summary(portfolio, benchmark),
+        'periods': periods,
+    }
+
+
+# set once per worker process so the panel is not pickled for every task
+_WORKER_DATA = {}
+
+
+def _init_worker(panel, returns):
+    _WORKER_DATA['panel'] = panel
+    _WORKER_DATA['returns'] = returns
+
+
+def _run_worker(goal, risk, top_k, scorer):
+    return backtest_profile(_WORKER_DATA['panel'], _WORKER_DATA['returns'], goal, risk, top_k, scorer)
+
+
+def run_backtests(profiles=None, top_k=DEFAULT_TOP_K, scorer='profile', start_date=None,
+                  end_date=None, rebalance_every=1, prices=None, max_workers=None, conn=None):
+    """
+    Backtests every (goal, risk) in profiles (default: all nine).
+
+    Rebalances on every rebalance_every-th history snapshot date. prices is
+    an (n_dates, n_tickers) array aligned with the history panel, or a
+    callable (tickers, dates) -> array such as load_price_panel; by default
+    the snapshots' own current_price is used. max_workers=1 runs in-process.
+    """
+    if scorer not in SCORERS:
+        raise ValueError(f"scorer must be one of {', '.join(SCORERS)}")
+    profiles = list(profiles or BACKTEST_PROFILES)
+    panel = get_history_panel(start_date, end_date, conn=conn)
+    keep = np.arange(0, len(panel['dates']), max(1, int(rebalance_every)))
+    panel = {**panel, 'dates': [panel['dates'][i] for i in keep],
+             'values': panel['values'][keep], 'listed': panel['listed'][keep]}
+    if len(panel['dates']) < 2:
+        logging.warning("Backtest needs at least two rebalance dates in the history.")
+        return []
+
+    if prices is None:
+        prices = prices_from_history(panel)
+    elif callable(prices):
+        prices = prices(panel['tickers'], panel['dates'])
+    returns = forward_returns(prices)
+    logging.info(
+        f"Backtesting {len(profiles)} profiles over {len(returns)} periods, "
+        f"{len(panel['tickers'])} tickers, top {top_k} by {scorer} score.")
+
+    if max_workers == 1 or len(profiles) == 1:
+        return [backtest_profile(panel, returns, goal, risk, top_k, scorer) for goal, risk in profiles]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(panel, returns)) as executor:
+        futures = [executor.submit(_run_worker, goal, risk, top_k, scorer) for goal, risk in profiles]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the goal/risk profiles over the metrics history.")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--scorer', choices=SCORERS, default='profile')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--rebalance-every', type=int, default=1)
+    parser.add_argument('--prices', choices=('history', 'yahoo'), default='history')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    results = run_backtests(
+        top_k=args.top_k, scorer=args.scorer, start_date=args.start, end_date=args.end,
+        rebalance_every=args.rebalance_every,
+        prices=load_price_panel if args.prices == 'yahoo' else None,
+        max_workers=args.workers)
+    for result in results:
+        s = result['summary']
+        print(f"{result['goal']:>7}/{result['risk']:<12} periods={s['periods']:>4} "
+              f"return={s['cumulative_return']:+.2%} universe={s['benchmark_cumulative_return']:+.2%} "
+              f"hit_rate={s['hit_rate'] if s['hit_rate'] is None else format(s['hit_rate'], '.0%')}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s-%(levelname)s-%(message)s')
+    main()
@@ -24,3 +24,5 @@ DATABASE_URL = f"postgresql://{RDS_USERNAME}:{RDS_PASSWORD}@{RDS_HOST}:{RDS_PORT
 # using sqlite for storing table of companies
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 SQLITE_DB_PATH = os.path.join(PROJECT_ROOT, 'data', 'metrics_cache.sqlite')
+# local OHLCV bar store (data_layer/bar_store.py), one file per symbol and resolution
+BAR_STORE_DIR = os.getenv('BAR_STORE_DIR', os.path.join(PROJECT_ROOT, 'data', 'bars'))
@@ -0,0 +1,161 @@
+# custom_profiles.py
+# User-defined scoring profiles: a power user's own factor weights, directions
+# and optional [min, max] ranges over the cache's numeric metrics.
+#
+# A profile is validated into a canonical form, hashed, and compiled once per
+# hash into weight/direction/range arrays, so ranking with it is the same
+# handful of column operations as the built-in goal/risk profiles.
+import hashlib
+import json
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from .data_layer.schema import NUMERIC_COLUMNS
+from .ranking_engine import normalise_columns, percentile_columns, page_of
+
+CUSTOM_PROFILE_METRICS = list(NUMERIC_COLUMNS)
+NORMALISATIONS = ('minmax', 'percentile')
+MAX_PROFILE_NAME_LENGTH = 50
+
+
+def _finite_number(value, what):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{what} must be a number, got {value!r}")
+    if not np.isfinite(number):
+        raise ValueError(f"{what} must be finite")
+    return number
+
+
+def _parse_metric(metric, spec):
+    if metric not in CUSTOM_PROFILE_METRICS:
+        raise ValueError(f"Cannot score on '{metric}'")
+    if not isinstance(spec, dict):
+        raise ValueError(f"'{metric}' must be an object with a weight")
+    weight = _finite_number(spec.get('weight'), f"'{metric}' weight")
+    if weight <= 0:
+        raise ValueError(f"'{metric}' weight must be > 0")
+    higher_better = spec.get('higher_better', True)
+    if not isinstance(higher_better, bool):
+        raise ValueError(f"'{metric}' higher_better must be true or false")
+    parsed = {'weight': weight, 'higher_better': higher_better}
+    if spec.get('range') is not None:
+        bounds = spec['range']
+        if not isinstance(bounds, (list, tuple)) or len(bounds) != 2:
+            raise ValueError(f"'{metric}' range must be [min, max]")
+        low = _finite_number(bounds[0], f"'{metric}' range min")
+        high = _finite_number(bounds[1], f"'{metric}' range max")
+        if low >= high:
+            raise ValueError(f"'{metric}' range min must be below max")
+        parsed['range'] = [low, high]
+    return parsed
+
+
+def validate_custom_profile(payload: dict) -> dict:
+    """
+    Validates a custom profile and returns its canonical form.
+
+    {"name": "Cheap payers",
+     "normalise": "minmax",
+     "metrics": {"pe_ratio": {"weight": 2, "higher_better": false, "range": [5, 30]},
+                 "dividend_yield": {"weight": 1}}}
+
+    Metrics with a range score linearly inside it (clipped); the others are
+    normalised across the ranked universe ('minmax' or 'percentile').
+    Weights are relative. Raises ValueError on anything invalid.
+    """
+    payload = payload or {}
+    if not isinstance(payload, dict):
+        raise ValueError("profile must be a JSON object")
+    name = str(payload.get('name') or '').strip()
+    if not name or len(name) > MAX_PROFILE_NAME_LENGTH:
+        raise ValueError(f"name must be 1-{MAX_PROFILE_NAME_LENGTH} characters")
+    normalise = payload.get('normalise') or 'minmax'
+    if normalise not in NORMALISATIONS:
+        raise ValueError(f"normalise must be one of {', '.join(NORMALISATIONS)}")
+    metrics = payload.get('metrics')
+    if not isinstance(metrics, dict) or not metrics:
+        raise ValueError("metrics must map at least one metric to its weight")
+    return {
+        'name': name,
+        'normalise': normalise,
+        'metrics': {metric: _parse_metric(metric, metrics[metric]) for metric in sorted(metrics)},
+    }
+
+
+def _scoring_json(profile) -> str:
+    # the name does not affect scores, so renamed copies share a compiled table
+    return json.dumps({'normalise': profile['normalise'], 'metrics': profile['metrics']},
+                      sort_keys=True, separators=(',', ':'))
+
+
+def profile_hash(profile: dict) -> str:
+    """Stable hash of a validated profile's scoring rules."""
+    return hashlib.sha256(_scoring_json(profile).encode()).hexdigest()
+
+
+@lru_cache(maxsize=512)
+def _compile(digest, scoring_json):
+    rules = json.loads(scoring_json)
+    metrics = list(rules['metrics'])
+    specs = [rules['metrics'][m] for m in metrics]
+    weights = np.array([s['weight'] for s in specs], dtype=float)
+    ranges = [s.get('range') for s in specs]
+    return {
+        'hash': digest,
+        'normalise': rules['normalise'],
+        'metrics': metrics,
+        'weights': weights / weights.sum(),
+        'higher_better': np.array([s['higher_better'] for s in specs]),
+        'has_range': np.array([r is not None for r in ranges]),
+        'lows': np.array([r[0] if r else np.nan for r in ranges], dtype=float),
+        'highs': np.array([r[1] if r else np.nan for r in ranges], dtype=float),
+    }
+
+
+def compile_custom_profile(profile: dict) -> dict:
+    """Weight/direction/range arrays for a validated profile, cached by its hash."""
+    scoring_json = _scoring_json(profile)
+    return _compile(hashlib.sha256(scoring_json.encode()).hexdigest(), scoring_json)
+
+
+def score_custom_matrix(values, compiled) -> np.ndarray:
+    """
+    0-100 score per row of an (n_companies, len(compiled['metrics'])) matrix,
+    NaN = missing (scores 0.5 on that metric, like the built-in profiles).
+    """
+    values = np.asarray(values, dtype=float)
+    if values.shape[0] == 0:
+        return np.zeros(0)
+    normalise = percentile_columns if compiled['normalise'] == 'percentile' else normalise_columns
+    normalised = normalise(values, compiled['higher_better'])
+    ranged = compiled['has_range']
+    if ranged.any():
+        lows, highs = compiled['lows'][ranged], compiled['highs'][ranged]
+        with np.errstate(invalid='ignore'):
+            position = np.clip((values[:, ranged] - lows) / (highs - lows), 0.0, 1.0)
+        position = np.where(compiled['higher_better'][ranged], position, 1.0 - position)
+        normalised[:, ranged] = np.where(np.isnan(position), 0.5, position)
+    return normalised @ compiled['weights'] * 100.0
+
+
+def rank_custom_profile(profile, companies, sector=None, limit=20, offset=0) -> dict:
+    """
+    One page (see ranking_engine.build_page) of companies ranked by a
+    validated custom profile; rows get 'profile_score' like rank_companies.
+    """
+    compiled = compile_custom_profile(profile)
+    if sector and sector.lower() != 'all':
+        companies = [c for c in companies if (c.get('sector') or '').lower() == sector.lower()]
+    values = np.array(
+        [[np.nan if (v := company.get(metric)) is None else v for metric in compiled['metrics']]
+         for company in companies], dtype=float).reshape(len(companies), len(compiled['metrics']))
+    scores = score_custom_matrix(values, compiled)
+    for company, score in zip(companies, scores.tolist()):
+        company['profile_score'] = score
+    logging.debug(f"Custom profile {compiled['hash'][:12]} scored {len(companies)} companies.")
+    return page_of(companies, scores, limit, offset,
+                   tie_keys=[company.get('ticker') or '' for company in companies])
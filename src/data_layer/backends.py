@@ -0,0 +1,446 @@
+# backends.py
+# Pluggable store for the screening metrics.
+#
+# 'sqlite' (default) reads the per-node cache file. 'postgres' keeps one
+# shared copy so several app nodes can serve the same data, and ranks in
+# the database with PERCENT_RANK() window functions.
+#   METRICS_BACKEND=postgres  METRICS_DATABASE_URL=postgresql://...
+import io
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from .database import get_sqlite_connection
+from .data_access import (
+    dict_factory, get_all_metrics_for_ranking, get_metrics_for_comparison,
+    get_selectable_companies, RANKING_COLUMNS
+)
+from .data_version import (
+    CHANGE_LOG_RETENTION, CHANGE_LOG_TABLE_NAME, VERSION_TABLE_NAME,
+    change_log_covers, get_changed_tickers, get_data_version
+)
+from .screening import compile_screen_sql, missing_columns, screen_result
+from .schema import (
+    DB_TABLE_NAME, COLUMN_SPEC, FRESHNESS_COLUMNS, NUMERIC_COLUMNS, INDEXED_COLUMNS
+)
+from ..config import DATABASE_URL
+from ..profiles import get_profile_metrics
+from ..ranking_engine import build_page
+
+METRICS_BACKEND = os.getenv('METRICS_BACKEND', 'sqlite').lower()
+METRICS_DATABASE_URL = os.getenv('METRICS_DATABASE_URL', DATABASE_URL)
+PG_POOL_MIN = int(os.getenv('METRICS_PG_POOL_MIN', '1'))
+PG_POOL_MAX = int(os.getenv('METRICS_PG_POOL_MAX', '10'))
+
+# columns the stores keep besides COLUMN_SPEC/FRESHNESS_COLUMNS
+EXTRA_COLUMNS = {'website': 'TEXT'}
+
+
+def percentile_weights(goal, risk, available_columns):
+    """Profile weights for the metrics the store actually has, {col: (weight, higher_better)}."""
+    config = get_profile_metrics(goal, risk)
+    return {metric: (float(cfg['weight']), cfg['higher_better'])
+            for metric, cfg in config.items()
+            if metric in NUMERIC_COLUMNS and metric in available_columns}
+
+
+def build_percentile_rank_sql(weights, columns, placeholder, sector_filter=None):
+    """
+    SELECT ranking every company by the weighted mean of its per-metric
+    PERCENT_RANK (0 worst .. 1 best) scaled to 0-100, like ranking_engine.
+    Missing values, and metrics with fewer than two values, score 0.5. A
+    COUNT(*) window carries the number of ranked companies in column _total.
+    Returns (sql, params); the caller appends the LIMIT and OFFSET values.
+    """
+    total_weight = sum(w for w, _ in weights.values()) or 1.0
+    terms = []
+    for metric, (weight, higher_better) in weights.items():
+        order = 'ASC' if higher_better else 'DESC'
+        terms.append(
+            f"{weight!r} * CASE WHEN {metric} IS NULL OR COUNT({metric}) OVER () < 2 THEN 0.5 "
+            f"ELSE PERCENT_RANK() OVER (PARTITION BY {metric} IS NULL ORDER BY {metric} {order}) END")
+    score_sql = f"({' + '.join(terms)}) / {total_weight!r} * 100.0" if terms else "50.0"
+
+    params = []
+    where = "company_name IS NOT NULL"
+    if sector_filter and sector_filter.lower() != 'all':
+        where += f" AND LOWER(sector) = LOWER({placeholder})"
+        params.append(sector_filter)
+    sql = f"""
+        SELECT * FROM (
+            SELECT {', '.join(columns)}, {score_sql} AS profile_score,
+                   COUNT(*) OVER () AS _total
+            FROM {DB_TABLE_NAME}
+            WHERE {where}
+        ) scored
+        ORDER BY profile_score DESC, ticker
+        LIMIT {placeholder} OFFSET {placeholder}
+    """
+    return sql, params
+
+
+def _copy_text(value):
+    """One field in COPY text format (NULL is \\N)."""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _run_percentile_rank(fetch, sql, params, limit, offset):
+    """One build_page envelope of a percentile ranking; a page past the end still reports the total."""
+    rows = fetch(sql, params + [int(limit), int(offset)])
+    if not rows and offset > 0:
+        probe = fetch(sql, params + [1, 0])
+        return build_page([], probe[0]['_total'] if probe else 0, offset, limit)
+    total = rows[0]['_total'] if rows else 0
+    for row in rows:
+        row.pop('_total', None)
+    return build_page(rows, total, offset, limit)
+
+
+def _run_screen(fetch, query, placeholder):
+    """Runs a compiled screen; a page past the end still reports the total."""
+    rows = fetch(*compile_screen_sql(query, placeholder))
+    if not rows and query['offset'] > 0:
+        probe = fetch(*compile_screen_sql(dict(query, offset=0, limit=1), placeholder))
+        return screen_result([], query, total=probe[0]['_total'] if probe else 0)
+    return screen_result(rows, query)
+
+
+class MetricsBackend:
+    """Read/write interface the app and ingestion use for the metrics store."""
+    name = None
+
+    def get_all_metrics_for_ranking(self, sector_filter=None):
+        raise NotImplementedError
+
+    def get_metrics_for_comparison(self, ticker_list):
+        raise NotImplementedError
+
+    def get_selectable_companies(self, sector_filter=None):
+        raise NotImplementedError
+
+    def upsert_rows(self, rows):
+        """Upserts normalised (possibly partial) rows. Returns rows written."""
+        raise NotImplementedError
+
+    def rank_by_percentile(self, goal, risk, sector_filter=None, limit=20, offset=0):
+        """Ranks companies for a profile inside the store. Returns a build_page envelope."""
+        raise NotImplementedError
+
+    def screen(self, query):
+        """Runs a parsed screening query (see screening.py) in the store."""
+        raise NotImplementedError
+
+    def get_data_version(self):
+        """(version, updated_at) of the rows this backend serves; (0, None) before any write."""
+        raise NotImplementedError
+
+    def get_changed_tickers(self, since_version):
+        """Tickers written after since_version, or None when a full rebuild is needed."""
+        raise NotImplementedError
+
+
+class SQLiteMetricsBackend(MetricsBackend):
+    name = 'sqlite'
+
+    def get_all_metrics_for_ranking(self, sector_filter=None):
+        return get_all_metrics_for_ranking(sector_filter)
+
+    def get_metrics_for_comparison(self, ticker_list):
+        return get_metrics_for_comparison(ticker_list)
+
+    def get_selectable_companies(self, sector_filter=None):
+        return get_selectable_companies(sector_filter)
+
+    def upsert_rows(self, rows):
+        from .ingestion import update_sqlite_table  # ingestion writes through backends
+        return update_sqlite_table(rows)
+
+    def rank_by_percentile(self, goal, risk, sector_filter=None, limit=20, offset=0, conn=None):
+        own_conn = conn is None
+        try:
+            if own_conn:
+                conn = get_sqlite_connection()
+            conn.row_factory = dict_factory
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({DB_TABLE_NAME})")}
+            if not existing:
+                return build_page([], 0, offset, limit)
+            columns = [col for col in RANKING_COLUMNS if col in existing]
+            weights = percentile_weights(goal, risk, existing)
+            sql, params = build_percentile_rank_sql(weights, columns, '?', sector_filter)
+            return _run_percentile_rank(
+                lambda sql, params: conn.execute(sql, params).fetchall(), sql, params, limit, offset)
+        except Exception as e:
+            logging.error(f"Error in SQLite rank_by_percentile: {e}", exc_info=True)
+            return build_page([], 0, offset, limit)
+        finally:
+            if own_conn and conn:
+                conn.close()
+
+    def screen(self, query, conn=None):
+        own_conn = conn is None
+        try:
+            if own_conn:
+                conn = get_sqlite_connection()
+            conn.row_factory = dict_factory
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({DB_TABLE_NAME})")}
+            missing = missing_columns(query, existing)
+            if missing:
+                raise ValueError(f"Columns not available: {', '.join(missing)}")
+            query = dict(query, columns=[c for c in query['columns'] if c in existing])
+            return _run_screen(lambda sql, params: conn.execute(sql, params).fetchall(), query, '?')
+        finally:
+            if own_conn and conn:
+                conn.close()
+
+    def get_data_version(self, conn=None):
+        own_conn = conn is None
+        try:
+            if own_conn:
+                conn = get_sqlite_connection()
+            return get_data_version(conn)
+        finally:
+            if own_conn and conn:
+                conn.close()
+
+    def get_changed_tickers(self, since_version, conn=None):
+        own_conn = conn is None
+        try:
+            if own_conn:
+                conn = get_sqlite_connection()
+            return get_changed_tickers(conn, since_version)
+        finally:
+            if own_conn and conn:
+                conn.close()
+
+
+class PostgresMetricsBackend(MetricsBackend):
+    name = 'postgres'
+
+    def __init__(self, dsn=None, minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX):
+        import psycopg2.pool
+        self.dsn = dsn or METRICS_DATABASE_URL
+        self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, self.dsn)
+        self._table_ready = False
+
+    def close(self):
+        self.pool.closeall()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a pooled connection; commits on success, rolls back on error."""
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    @staticmethod
+    def _pg_type(col_type):
+        return 'DOUBLE PRECISION' if col_type == 'REAL' else 'TEXT'
+
+    def ensure_table_exists(self, conn):
+        if self._table_ready:
+            return
+        wanted = {col: self._pg_type(spec['type']) for col, spec in COLUMN_SPEC.items()}
+        wanted.update({col: 'TEXT' for col in FRESHNESS_COLUMNS})
+        wanted['field_fetched_at'] = 'JSONB'
+        wanted.update(EXTRA_COLUMNS)
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {DB_TABLE_NAME} (ticker TEXT PRIMARY KEY)")
+            for col, col_type in wanted.items():
+                cursor.execute(f"ALTER TABLE {DB_TABLE_NAME} ADD COLUMN IF NOT EXISTS {col} {col_type}")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{DB_TABLE_NAME}_sector ON {DB_TABLE_NAME} (LOWER(sector))")
+            for col in INDEXED_COLUMNS:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{DB_TABLE_NAME}_{col} ON {DB_TABLE_NAME} ({col})")
+            # this store's own data version and change log (see data_version.py)
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {VERSION_TABLE_NAME} (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version BIGINT NOT NULL,
+                updated_at TEXT NOT NULL
+            )""")
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE_NAME} (
+                version BIGINT NOT NULL,
+                ticker TEXT NOT NULL,
+                PRIMARY KEY (version, ticker)
+            )""")
+        conn.commit()
+        self._table_ready = True
+
+    def _fetch_dicts(self, sql, params=()):
+        with self.connection() as conn:
+            self.ensure_table_exists(conn)
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                names = [d[0] for d in cursor.description]
+                return [self._row_dict(names, row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _row_dict(names, row):
+        data = dict(zip(names, row))
+        # keep the SQLite shape: field_fetched_at is a JSON string there
+        if isinstance(data.get('field_fetched_at'), dict):
+            data['field_fetched_at'] = json.dumps(data['field_fetched_at'])
+        return data
+
+    def get_all_metrics_for_ranking(self, sector_filter=None):
+        sql = f"SELECT {', '.join(RANKING_COLUMNS)} FROM {DB_TABLE_NAME} WHERE company_name IS NOT NULL"
+        params = []
+        if sector_filter and sector_filter.lower() != 'all':
+            sql += " AND LOWER(sector) = LOWER(%s)"
+            params.append(sector_filter)
+        try:
+            return self._fetch_dicts(sql, params)
+        except Exception as e:
+            logging.error(f"Error in Postgres get_all_metrics_for_ranking: {e}", exc_info=True)
+            return []
+
+    def get_metrics_for_comparison(self, ticker_list):
+        if not ticker_list:
+            return []
+        try:
+            return self._fetch_dicts(
+                f"SELECT * FROM {DB_TABLE_NAME} WHERE ticker = ANY(%s)", (list(ticker_list),))
+        except Exception as e:
+            logging.error(f"Error in Postgres get_metrics_for_comparison: {e}", exc_info=True)
+            return []
+
+    def get_selectable_companies(self, sector_filter=None):
+        sql = f"SELECT ticker, company_name, sector FROM {DB_TABLE_NAME}"
+        params = []
+        if sector_filter and sector_filter.lower() != 'all':
+            sql += " WHERE LOWER(sector) = LOWER(%s)"
+            params.append(sector_filter)
+        sql += " ORDER BY company_name"
+        try:
+            return self._fetch_dicts(sql, params)
+        except Exception as e:
+            logging.error(f"Error in Postgres get_selectable_companies: {e}", exc_info=True)
+            return []
+
+    def upsert_rows(self, rows):
+        """
+        Bulk upsert: each column set is COPYed into a temp table and merged
+        with one INSERT .. ON CONFLICT, so a batch costs a few round trips
+        regardless of its size. field_fetched_at stamps are merged, not replaced.
+        """
+        # last row per ticker wins; ON CONFLICT can't touch a row twice
+        latest = {row['ticker']: row for row in rows or [] if row and row.get('ticker')}
+        if not latest:
+            return 0
+        known = ['ticker'] + list(COLUMN_SPEC) + list(FRESHNESS_COLUMNS) + list(EXTRA_COLUMNS)
+        by_columns = {}
+        for row in latest.values():
+            columns = tuple(col for col in known if col in row)
+            by_columns.setdefault(columns, []).append(row)
+
+        with self.connection() as conn:
+            self.ensure_table_exists(conn)
+            with conn.cursor() as cursor:
+                for columns, group in by_columns.items():
+                    col_list = ', '.join(columns)
+                    cursor.execute(
+                        f"CREATE TEMP TABLE IF NOT EXISTS {DB_TABLE_NAME}_staging "
+                        f"(LIKE {DB_TABLE_NAME}) ON COMMIT DELETE ROWS")
+                    cursor.execute(f"TRUNCATE {DB_TABLE_NAME}_staging")
+                    buf = io.StringIO(''.join(
+                        '\t'.join(_copy_text(row.get(col)) for col in columns) + '\n'
+                        for row in group))
+                    cursor.copy_expert(f"COPY {DB_TABLE_NAME}_staging ({col_list}) FROM STDIN", buf)
+
+                    updates = [f"{col} = EXCLUDED.{col}" for col in columns
+                               if col not in ('ticker', 'field_fetched_at')]
+                    if 'field_fetched_at' in columns:
+                        updates.append(
+                            f"field_fetched_at = COALESCE({DB_TABLE_NAME}.field_fetched_at, '{{}}'::jsonb)"
+                            " || EXCLUDED.field_fetched_at")
+                    conflict = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+                    cursor.execute(
+                        f"INSERT INTO {DB_TABLE_NAME} ({col_list}) "
+                        f"SELECT {col_list} FROM {DB_TABLE_NAME}_staging "
+                        f"ON CONFLICT (ticker) {conflict}")
+                # same transaction as the rows, so readers never see one without the other
+                self._bump_data_version(cursor, list(latest))
+        logging.info(f"Postgres upsert committed {len(latest)} records.")
+        return len(latest)
+
+    @staticmethod
+    def _bump_data_version(cursor, tickers):
+        cursor.execute(
+            f"""INSERT INTO {VERSION_TABLE_NAME} (id, version, updated_at) VALUES (1, 1, %s)
+                ON CONFLICT (id) DO UPDATE SET version = {VERSION_TABLE_NAME}.version + 1,
+                updated_at = EXCLUDED.updated_at
+                RETURNING version""",
+            (datetime.now(timezone.utc).isoformat(),))
+        version = cursor.fetchone()[0]
+        cursor.executemany(
+            f"INSERT INTO {CHANGE_LOG_TABLE_NAME} (version, ticker) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            [(version, t) for t in tickers])
+        cursor.execute(
+            f"DELETE FROM {CHANGE_LOG_TABLE_NAME} WHERE version <= %s",
+            (version - CHANGE_LOG_RETENTION,))
+        return version
+
+    def get_data_version(self):
+        rows = self._fetch_dicts(f"SELECT version, updated_at FROM {VERSION_TABLE_NAME} WHERE id = 1")
+        return (rows[0]['version'], rows[0]['updated_at']) if rows else (0, None)
+
+    def get_changed_tickers(self, since_version):
+        with self.connection() as conn:
+            self.ensure_table_exists(conn)
+            with conn.cursor() as cursor:
+                # one snapshot for version, log start and tickers
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute(f"SELECT version FROM {VERSION_TABLE_NAME} WHERE id = 1")
+                row = cursor.fetchone()
+                version = row[0] if row else 0
+                cursor.execute(f"SELECT MIN(version) FROM {CHANGE_LOG_TABLE_NAME}")
+                oldest = cursor.fetchone()[0]
+                if not change_log_covers(version, oldest, since_version):
+                    return None
+                cursor.execute(
+                    f"SELECT DISTINCT ticker FROM {CHANGE_LOG_TABLE_NAME} WHERE version > %s",
+                    (since_version,))
+                return [r[0] for r in cursor.fetchall()]
+
+    def rank_by_percentile(self, goal, risk, sector_filter=None, limit=20, offset=0):
+        try:
+            weights = percentile_weights(goal, risk, RANKING_COLUMNS)
+            sql, params = build_percentile_rank_sql(weights, RANKING_COLUMNS, '%s', sector_filter)
+            return _run_percentile_rank(self._fetch_dicts, sql, params, limit, offset)
+        except Exception as e:
+            logging.error(f"Error in Postgres rank_by_percentile: {e}", exc_info=True)
+            return build_page([], 0, offset, limit)
+
+    def screen(self, query):
+        return _run_screen(self._fetch_dicts, query, '%s')
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_metrics_backend():
+    """Returns the process-wide backend selected by METRICS_BACKEND."""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            if METRICS_BACKEND == 'postgres':
+                _BACKEND = PostgresMetricsBackend()
+            else:
+                _BACKEND = SQLiteMetricsBackend()
+            logging.info(f"Metrics backend: {_BACKEND.name}")
+        return _BACKEND
@@ -0,0 +1,220 @@
+# bar_store.py
+# Local columnar store of OHLCV bars, one file per (symbol, resolution), so
+# repeat chart and indicator requests read disk instead of re-downloading
+# the whole window from Alpaca.
+#
+# Bars are a structured NumPy array (epoch-second 't' plus float64 fields)
+# saved as .npy and memory-mapped on read. A small JSON manifest next to it
+# records which [start, end) ranges are covered (a covered range with no
+# bars is a weekend or holiday, not a gap) and which generation of the data
+# file is current; both are swapped with os.replace, so readers never see a
+# data file and coverage that disagree. Only the missing head, tail or
+# middle ranges are fetched, one request per distinct gap for all the
+# symbols that share it.
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from ..config import BAR_STORE_DIR
+from ..prices_helper import bar_field, optional_bar_column
+from ..resample import RESOLUTION_SECONDS, epoch_seconds
+
+STORED_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap')
+BAR_DTYPE = np.dtype([('t', '<i8')] + [(field, '<f8') for field in STORED_FIELDS])
+# the still-forming last bar is re-fetched at most this often
+TAIL_REFRESH_SECONDS = 60
+# a bar only counts as final one full step plus this long after it closes,
+# since late prints and the feed's own lag can still amend it
+BAR_SETTLE_SECONDS = 15
+
+_LOCK = threading.Lock()
+
+
+def missing_ranges(coverage, start, end) -> list:
+    """Sub-ranges of [start, end) not in the sorted, disjoint coverage ranges."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in coverage:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def add_range(coverage, start, end) -> list:
+    """coverage with [start, end) merged in, still sorted and disjoint."""
+    merged = []
+    for covered_start, covered_end in sorted([*coverage, [start, end]]):
+        if merged and covered_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], covered_end)
+        else:
+            merged.append([covered_start, covered_end])
+    return merged
+
+
+def _resolution(resolution):
+    # unknown resolutions fetch minute bars (see prices_helper.get_resolution)
+    return resolution if resolution in RESOLUTION_SECONDS else 'min'
+
+
+def _paths(root, resolution, symbol):
+    folder = os.path.join(root, _resolution(resolution))
+    name = symbol.replace('/', '_')
+    return folder, os.path.join(folder, f"{name}.json"), name
+
+
+def _read_manifest(root, resolution, symbol) -> dict:
+    _, manifest_path, _ = _paths(root, resolution, symbol)
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'generation': 0, 'file': None, 'coverage': [], 'fetched_until': None}
+
+
+def _load(root, resolution, symbol, manifest, mmap_mode='r') -> np.ndarray:
+    if not manifest['file']:
+        return np.zeros(0, dtype=BAR_DTYPE)
+    folder, _, _ = _paths(root, resolution, symbol)
+    return np.load(os.path.join(folder, manifest['file']), mmap_mode=mmap_mode)
+
+
+def read_bars(symbol, resolution, start, end, root=BAR_STORE_DIR) -> np.ndarray:
+    """Stored bars of one symbol with start <= t < end (epoch seconds), as a structured array."""
+    for attempt in range(2):
+        manifest = _read_manifest(root, resolution, symbol)
+        try:
+            records = _load(root, resolution, symbol, manifest)
+            break
+        except FileNotFoundError:
+            # a writer replaced the generation between the two reads
+            if attempt:
+                raise
+    times = records['t']
+    return np.array(records[np.searchsorted(times, start):np.searchsorted(times, end)])
+
+
+def bar_records(bars) -> np.ndarray:
+    """Alpaca Bar objects or bar dicts -> BAR_DTYPE records sorted by time."""
+    records = np.empty(len(bars), dtype=BAR_DTYPE)
+    if not len(bars):
+        return records
+    records['t'] = epoch_seconds(bar_field(bars, 'timestamp'))
+    for field in STORED_FIELDS:
+        records[field] = optional_bar_column(bars, field)
+    return records[np.argsort(records['t'], kind='stable')]
+
+
+def records_to_bars(symbol, records) -> list:
+    """BAR_DTYPE records -> bar dicts with the Alpaca Bar field names, None where NaN."""
+    timestamps = pd.to_datetime(records['t'], unit='s', utc=True).to_pydatetime()
+    columns = []
+    for field in STORED_FIELDS:
+        values = records[field].tolist()
+        for i in np.flatnonzero(np.isnan(records[field])).tolist():
+            values[i] = None
+        columns.append(values)
+    keys = ('symbol', 'timestamp', *STORED_FIELDS)
+    return [dict(zip(keys, row)) for row in zip(repeat(symbol), timestamps, *columns)]
+
+
+def write_bars(symbol, resolution, records, covered=None, fetched_until=None, root=BAR_STORE_DIR):
+    """
+    Merges records into the stored bars (newer values win on equal
+    timestamps) and adds the covered [start, end) range, if any.
+    """
+    folder, manifest_path, name = _paths(root, resolution, symbol)
+    os.makedirs(folder, exist_ok=True)
+    with _LOCK:
+        manifest = _read_manifest(root, resolution, symbol)
+        stored = _load(root, resolution, symbol, manifest, mmap_mode=None)
+        # new records first so unique's first occurrence is the fresh one
+        combined = np.concatenate([records.astype(BAR_DTYPE, copy=False), stored])
+        _, first = np.unique(combined['t'], return_index=True)
+        merged = combined[first]
+
+        generation = manifest['generation'] + 1
+        data_file = f"{name}-{generation}.npy"
+        np.save(os.path.join(folder, data_file + '.tmp.npy'), merged)
+        os.replace(os.path.join(folder, data_file + '.tmp.npy'), os.path.join(folder, data_file))
+
+        coverage = manifest['coverage']
+        if covered is not None and covered[1] > covered[0]:
+            coverage = add_range(coverage, *covered)
+        new_manifest = {'generation': generation, 'file': data_file, 'coverage': coverage,
+                        'fetched_until': max(fetched_until or 0, manifest['fetched_until'] or 0) or None}
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(new_manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        if manifest['file']:
+            try:
+                os.remove(os.path.join(folder, manifest['file']))
+            except FileNotFoundError:
+                pass
+    return merged
+
+
+def _to_seconds(value) -> int:
+    if isinstance(value, datetime):
+        return int(epoch_seconds([value])[0])
+    return int(pd.Timestamp(value, tz='UTC').timestamp())
+
+
+def _to_datetime(seconds) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def store_gaps(manifest, start, end) -> list:
+    """Ranges to fetch; the provisional tail is skipped while it is fresh."""
+    gaps = missing_ranges(manifest['coverage'], start, end)
+    fetched_until = manifest['fetched_until']
+    if (gaps and gaps[-1][1] == end and fetched_until and manifest['coverage']
+            and gaps[-1][0] == manifest['coverage'][-1][1]
+            and end - fetched_until < TAIL_REFRESH_SECONDS):
+        gaps.pop()
+    return gaps
+
+
+def load_bars(symbols, resolution, start, fetch, end=None, root=BAR_STORE_DIR, now=None) -> dict:
+    """
+    {symbol: [bar dicts]} for start <= timestamp < end (end defaults to
+    now), fetching only what the store does not cover.
+
+    :param fetch: callable(symbols, start, end) -> {symbol: [bars]} hitting
+        the API for [start, end) as UTC datetimes
+    """
+    now = _to_seconds(now) if now is not None else int(datetime.now(timezone.utc).timestamp())
+    start = _to_seconds(start)
+    end = _to_seconds(end) if end is not None else now
+    # bars starting at or after this may still change: they stay on the
+    # fetched_until / TAIL_REFRESH_SECONDS path instead of being covered
+    step = RESOLUTION_SECONDS[_resolution(resolution)]
+    complete_until = (now - step - BAR_SETTLE_SECONDS) // step * step
+
+    by_gap = {}
+    for symbol in symbols:
+        for gap in store_gaps(_read_manifest(root, resolution, symbol), start, end):
+            by_gap.setdefault(gap, []).append(symbol)
+    for (gap_start, gap_end), group in by_gap.items():
+        fetched = fetch(group, _to_datetime(gap_start), _to_datetime(gap_end))
+        logging.info(f"Bar store: fetched {resolution} bars for {len(group)} symbols, "
+                     f"{_to_datetime(gap_start)} to {_to_datetime(gap_end)}.")
+        for symbol in group:
+            write_bars(symbol, resolution, bar_records(fetched.get(symbol) or []),
+                       covered=(gap_start, min(gap_end, complete_until)),
+                       fetched_until=gap_end if gap_end >= complete_until else None, root=root)
+
+    return {symbol: records_to_bars(symbol, read_bars(symbol, resolution, start, end, root))
+            for symbol in symbols}
@@ -0,0 +1,100 @@
+# custom_profile_store.py
+# Per-user custom scoring profiles, stored next to the users table in the
+# PostgreSQL user database. Profiles are stored validated (see
+# custom_profiles.validate_custom_profile) together with their hash.
+import logging
+
+from psycopg2.extras import Json
+
+CUSTOM_PROFILES_TABLE_NAME = "user_scoring_profiles"
+MAX_PROFILES_PER_USER = 20
+
+
+def ensure_custom_profiles_table(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CUSTOM_PROFILES_TABLE_NAME} (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            name VARCHAR(50) NOT NULL,
+            profile JSONB NOT NULL,
+            profile_hash CHAR(64) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, name)
+        )""")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error creating {CUSTOM_PROFILES_TABLE_NAME}: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def list_custom_profiles(conn, user_id):
+    """[{'name', 'profile_hash', 'profile', 'updated_at'}] for a user, by name."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT name, profile_hash, profile, updated_at FROM {CUSTOM_PROFILES_TABLE_NAME}
+            WHERE user_id = %s ORDER BY name""", (user_id,))
+        return [{'name': name, 'profile_hash': digest, 'profile': profile,
+                 'updated_at': updated_at.isoformat() if updated_at else None}
+                for name, digest, profile, updated_at in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def get_custom_profile(conn, user_id, name):
+    """The stored (validated) profile, or None."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT profile FROM {CUSTOM_PROFILES_TABLE_NAME}
+            WHERE user_id = %s AND name = %s""", (user_id, name))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+
+def save_custom_profile(conn, user_id, profile, digest):
+    """
+    Inserts or replaces a user's profile under profile['name']. Raises
+    ValueError when a new profile would exceed MAX_PROFILES_PER_USER.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE name = %s)
+            FROM {CUSTOM_PROFILES_TABLE_NAME} WHERE user_id = %s""", (profile['name'], user_id))
+        total, existing = cursor.fetchone()
+        if not existing and total >= MAX_PROFILES_PER_USER:
+            raise ValueError(f"At most {MAX_PROFILES_PER_USER} profiles per user")
+        cursor.execute(f"""
+            INSERT INTO {CUSTOM_PROFILES_TABLE_NAME} (user_id, name, profile, profile_hash)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (user_id, name) DO UPDATE SET
+                profile = EXCLUDED.profile,
+                profile_hash = EXCLUDED.profile_hash,
+                updated_at = CURRENT_TIMESTAMP""",
+            (user_id, profile['name'], Json(profile), digest))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def delete_custom_profile(conn, user_id, name):
+    """True if a profile was deleted."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            DELETE FROM {CUSTOM_PROFILES_TABLE_NAME} WHERE user_id = %s AND name = %s""",
+            (user_id, name))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        cursor.close()
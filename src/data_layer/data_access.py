@@ -3,9 +3,11 @@ import logging
 import os
 import sqlite3
 from .database import get_sqlite_connection
+from .schema import DB_TABLE_NAME, COLUMN_SPEC
 from ..config import SQLITE_DB_PATH
 
-DB_TABLE_NAME = "stock_metrics_cache"
+# columns returned by get_all_metrics_for_ranking (when present in the table)
+RANKING_COLUMNS = ['ticker'] + list(COLUMN_SPEC) + ['website']
 
 def dict_factory(cursor: sqlite3.Cursor, row: sqlite3.Row) -> dict:
     """Helper to return rows as dictionaries."""
@@ -64,33 +66,12 @@ def get_all_metrics_for_ranking(sector_filter: str = None) -> list[dict]:
         logging.error(f"SQLite DB file missing: {SQLITE_DB_PATH}")
         return []
 
-    sql = f"""
-        SELECT
-            ticker,
-            company_name,
-            sector,
-            market_cap,
-            current_price,
-            pe_ratio,
-            ev_ebitda,
-            dividend_yield,
-            payout_ratio,
-            debt_equity_ratio,
-            current_ratio,
-            revenue_growth,
-            earnings_growth,
-            ocf_growth,
-            website
-        FROM {DB_TABLE_NAME}
-        WHERE company_name IS NOT NULL
-    """
     params: list = []
+    sector_sql = ""
     if sector_filter and sector_filter.lower() != 'all':
-        sql += " AND LOWER(sector) = LOWER(?)"
+        sector_sql = " AND LOWER(sector) = LOWER(?)"
         params.append(sector_filter)
 
-    logging.debug(f"SQL Query (ranking): {sql!r} Params: {params}")
-
     try:
         conn = get_sqlite_connection()
         conn.row_factory = dict_factory
@@ -105,6 +86,17 @@ def get_all_metrics_for_ranking(sector_filter: str = None) -> list[dict]:
             logging.error(f"Table {DB_TABLE_NAME} does not exist.")
             return []
 
+        # caches built before a column was added to the schema lack it
+        cursor.execute(f"PRAGMA table_info({DB_TABLE_NAME})")
+        existing = {row['name'] for row in cursor.fetchall()}
+        columns = [col for col in RANKING_COLUMNS if col in existing]
+        sql = f"""
+        SELECT {', '.join(columns)}
+        FROM {DB_TABLE_NAME}
+        WHERE company_name IS NOT NULL{sector_sql}
+        """
+        logging.debug(f"SQL Query (ranking): {sql!r} Params: {params}")
+
         cursor.execute(sql, params)
         results = cursor.fetchall()
         logging.info(f"Fetched {len(results)} records for ranking.")
@@ -0,0 +1,84 @@
+# data_version.py
+# Monotonic version of the metrics store plus a log of which tickers each
+# version touched, so derived data (materialised rankings) can catch up
+# incrementally instead of rebuilding.
+import logging
+from datetime import datetime, timezone
+
+VERSION_TABLE_NAME = "metrics_data_version"
+CHANGE_LOG_TABLE_NAME = "metrics_change_log"
+
+# versions kept in the change log; readers further behind rebuild fully
+CHANGE_LOG_RETENTION = 1000
+
+
+def ensure_version_tables_exist(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE_NAME} (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )""")
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE_NAME} (
+            version INTEGER NOT NULL,
+            ticker TEXT NOT NULL,
+            PRIMARY KEY (version, ticker)
+        )""")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def get_data_version(conn):
+    """(version, updated_at); (0, None) before the first write."""
+    ensure_version_tables_exist(conn)
+    row = conn.execute(f"SELECT version, updated_at FROM {VERSION_TABLE_NAME} WHERE id = 1").fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def bump_data_version(conn, tickers):
+    """Records that `tickers` changed; returns the new version. Commits."""
+    ensure_version_tables_exist(conn)
+    now = datetime.now(timezone.utc).isoformat()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"""INSERT INTO {VERSION_TABLE_NAME} (id, version, updated_at) VALUES (1, 1, ?)
+                ON CONFLICT(id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at""",
+            (now,))
+        version = cursor.execute(f"SELECT version FROM {VERSION_TABLE_NAME} WHERE id = 1").fetchone()[0]
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {CHANGE_LOG_TABLE_NAME} (version, ticker) VALUES (?, ?)",
+            [(version, t) for t in dict.fromkeys(tickers) if t])
+        cursor.execute(
+            f"DELETE FROM {CHANGE_LOG_TABLE_NAME} WHERE version <= ?",
+            (version - CHANGE_LOG_RETENTION,))
+        conn.commit()
+        logging.debug(f"Metrics data version {version}: {len(tickers)} tickers changed.")
+        return version
+    finally:
+        cursor.close()
+
+
+def change_log_covers(version, oldest, since_version):
+    """Whether a log starting at `oldest` still holds every change after since_version."""
+    return version <= since_version or (oldest is not None and oldest <= since_version + 1)
+
+
+def get_changed_tickers(conn, since_version):
+    """
+    Tickers changed after since_version, or None when the log no longer
+    reaches back that far (caller should rebuild everything).
+    """
+    ensure_version_tables_exist(conn)
+    oldest = conn.execute(f"SELECT MIN(version) FROM {CHANGE_LOG_TABLE_NAME}").fetchone()[0]
+    version, _ = get_data_version(conn)
+    if not change_log_covers(version, oldest, since_version):
+        return None
+    rows = conn.execute(
+        f"SELECT DISTINCT ticker FROM {CHANGE_LOG_TABLE_NAME} WHERE version > ?",
+        (since_version,)).fetchall()
+    return [row[0] for row in rows]
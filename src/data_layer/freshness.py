@@ -0,0 +1,139 @@
+# freshness.py
+# Per-field freshness bookkeeping for stock_metrics_cache and the refresh
+# planner that decides which tickers/source groups to re-fetch in a run.
+import json
+import logging
+import math
+from datetime import datetime, timezone
+
+from .database import get_sqlite_connection
+from .schema import DB_TABLE_NAME, COLUMN_SPEC, FRESHNESS_COLUMNS
+
+REQUEST_STATS_TABLE_NAME = "ticker_request_stats"
+
+# staleness given to columns that have never been fetched
+NEVER_FETCHED_STALENESS = 10.0
+
+
+def ensure_freshness_columns_exist(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"PRAGMA table_info({DB_TABLE_NAME})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for col, col_type in FRESHNESS_COLUMNS.items():
+            if existing and col not in existing:
+                cursor.execute(f"ALTER TABLE {DB_TABLE_NAME} ADD COLUMN {col} {col_type}")
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REQUEST_STATS_TABLE_NAME} (
+            ticker TEXT PRIMARY KEY,
+            request_count INTEGER NOT NULL DEFAULT 0,
+            last_requested TEXT
+        )""")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def field_timestamps(columns, fetched_at):
+    """{column: fetched_at} for every given column."""
+    return {col: fetched_at for col in columns}
+
+
+def record_ticker_requests(tickers):
+    """Bumps the popularity counter of tickers users asked for."""
+    tickers = [t for t in tickers if t]
+    if not tickers:
+        return
+    conn = None
+    try:
+        conn = get_sqlite_connection()
+        ensure_freshness_columns_exist(conn)
+        now = datetime.now(timezone.utc).isoformat()
+        conn.executemany(
+            f"""INSERT INTO {REQUEST_STATS_TABLE_NAME} (ticker, request_count, last_requested)
+                VALUES (?, 1, ?)
+                ON CONFLICT(ticker) DO UPDATE SET
+                    request_count = request_count + 1, last_requested = excluded.last_requested""",
+            [(t, now) for t in tickers])
+        conn.commit()
+    except Exception as e:
+        logging.warning(f"Could not record ticker requests: {e}")
+    finally:
+        if conn: conn.close()
+
+
+def _parse_ts(value):
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def column_staleness(field_fetched_at, fetched_at, now, columns=None):
+    """
+    Returns {column: age / ttl} for one row. Rows written before per-field
+    tracking fall back to the row-level fetched_at.
+    """
+    staleness = {}
+    row_ts = _parse_ts(fetched_at)
+    for col in columns or COLUMN_SPEC:
+        ts = _parse_ts(field_fetched_at.get(col)) or row_ts
+        if ts is None:
+            staleness[col] = NEVER_FETCHED_STALENESS
+            continue
+        age_hours = (now - ts).total_seconds() / 3600.0
+        staleness[col] = max(0.0, age_hours / COLUMN_SPEC[col]['ttl_hours'])
+    return staleness
+
+
+def plan_refresh(conn, universe, api_budget, source, now=None):
+    """
+    Picks what to re-fetch this run from `source`.
+
+    Only the source groups covering columns past their TTL (staleness >= 1)
+    are refreshed. Tickers are ordered by max staleness *
+    (1 + log1p(request_count)) and taken while the API budget lasts, each
+    costing source.cost(groups). Returns an ordered list of (ticker, [groups]).
+    """
+    now = now or datetime.now(timezone.utc)
+    ensure_freshness_columns_exist(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT ticker, fetched_at, field_fetched_at FROM {DB_TABLE_NAME}")
+        rows = {r[0]: (r[1], r[2]) for r in cursor.fetchall()}
+        cursor.execute(f"SELECT ticker, request_count FROM {REQUEST_STATS_TABLE_NAME}")
+        popularity = {r[0]: r[1] for r in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+    candidates = []
+    for ticker in dict.fromkeys(universe):
+        fetched_at, field_json = rows.get(ticker, (None, None))
+        try:
+            field_fetched_at = json.loads(field_json) if field_json else {}
+        except ValueError:
+            field_fetched_at = {}
+        staleness = column_staleness(field_fetched_at, fetched_at, now, source.columns)
+        stale_columns = [col for col, s in staleness.items() if s >= 1.0]
+        if not stale_columns:
+            continue
+        groups = source.groups_for_columns(stale_columns)
+        priority = max(staleness.values()) * (1.0 + math.log1p(popularity.get(ticker, 0)))
+        candidates.append((priority, ticker, groups))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    plan = []
+    spent = 0
+    for _, ticker, groups in candidates:
+        cost = source.cost(groups)
+        if spent + cost > api_budget:
+            continue
+        plan.append((ticker, groups))
+        spent += cost
+    logging.info(
+        f"Refresh plan ({source.name}): {len(plan)}/{len(candidates)} stale tickers, "
+        f"{spent}/{api_budget} API calls budgeted.")
+    return plan
@@ -0,0 +1,399 @@
+# ingestion.py
+# One ingestion engine for every stock_metrics_cache refresh job.
+#
+# A job = universe + source adapter. Adapters declare, per API call
+# ("group"), which cache columns they fill and from which raw keys
+# (optionally with a transform). Table layout comes from schema.COLUMN_SPEC;
+# fetching, batching, checkpointing and rate limiting are shared
+# (pipeline.py), and freshness.plan_refresh decides what each run fetches.
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import yfinance as yf
+
+from ..fundamentals import (
+    get_profile, get_ratios, get_key_metrics, get_growth, get_ocf_growth
+)
+from .backends import get_metrics_backend
+from .data_version import bump_data_version
+from .database import get_sqlite_connection
+from .metrics_history import record_snapshot
+from .pipeline import RateLimiter, run_pipeline
+from .freshness import ensure_freshness_columns_exist, field_timestamps, plan_refresh
+from .schema import (
+    DB_TABLE_NAME, COLUMN_SPEC, FRESHNESS_COLUMNS, TEXT_COLUMNS, CACHE_COLUMNS,
+    INDEXED_COLUMNS
+)
+
+FETCH_WORKERS = int(os.getenv('INGEST_FETCH_WORKERS', '4'))
+WRITE_BATCH_SIZE = int(os.getenv('INGEST_WRITE_BATCH_SIZE', '25'))
+# max API calls a single refresh run may spend
+INGEST_API_BUDGET = int(os.getenv('INGEST_API_BUDGET', '1500'))
+
+
+def normalise_rating(rating_text):
+    if not rating_text:
+        return None
+    rating_map = {'strong_buy': 5.0, 'buy': 4.0, 'hold': 3.0, 'underperform': 2.0, 'sell': 1.0}
+    return rating_map.get(rating_text.lower().replace(' ', '_'), 3.0)
+
+
+def _to_float(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _percent_to_ratio(value):
+    value = _to_float(value)
+    return value / 100.0 if value is not None else None
+
+
+class SourceAdapter:
+    """
+    Base adapter. Subclasses set `name`, `calls_per_minute` and `groups`:
+    {group: {column: raw_key or (raw_key, transform)}}, one API call per group.
+    """
+    name = None
+    calls_per_minute = 60
+    groups = {}
+    # groups fetched whenever a ticker is refreshed
+    required_groups = []
+
+    @property
+    def columns(self):
+        return [col for mapping in self.groups.values() for col in mapping]
+
+    def groups_for_columns(self, columns):
+        wanted = set(columns)
+        groups = [g for g, mapping in self.groups.items() if wanted & set(mapping)]
+        return [g for g in self.groups if g in self.required_groups or g in groups]
+
+    def cost(self, groups):
+        return len(groups)
+
+    def fetch(self, ticker, groups):
+        raise NotImplementedError
+
+    def normalise(self, ticker, raw):
+        """Maps raw payloads of the fetched groups onto cache columns."""
+        data = {'ticker': ticker}
+        fetched_columns = []
+        for group, payload in raw.items():
+            for col, source_key in self.groups.get(group, {}).items():
+                transform = None
+                if isinstance(source_key, tuple):
+                    source_key, transform = source_key
+                value = payload.get(source_key)
+                if transform is not None:
+                    value = transform(value)
+                data[col] = value if col in TEXT_COLUMNS else _to_float(value)
+                fetched_columns.append(col)
+        self.fixup(data, raw)
+
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        data['fetched_at'] = fetched_at
+        data['field_fetched_at'] = json.dumps(field_timestamps(fetched_columns, fetched_at))
+        return data
+
+    def fixup(self, data, raw):
+        """Hook for cross-field derivations after the column mapping."""
+
+
+class FMPSource(SourceAdapter):
+    name = 'fmp'
+    calls_per_minute = int(os.getenv('FMP_CALLS_PER_MINUTE', '300'))
+    required_groups = ['profile']
+    groups = {
+        'profile': {
+            'company_name': 'companyName',
+            'sector': 'sector',
+            'market_cap': 'mktCap',
+            'current_price': 'price',
+        },
+        'ratios': {
+            'pe_ratio': 'peRatioTTM',
+            'roe': 'returnOnEquityTTM',
+            'dividend_yield': 'dividendYieldTTM',
+            'payout_ratio': 'payoutRatioTTM',
+            'debt_equity_ratio': 'debtEquityRatioTTM',
+            'current_ratio': 'currentRatioTTM',
+        },
+        'key_metrics': {'ev_ebitda': 'enterpriseValueOverEBITDATTM'},
+        'growth': {
+            'revenue_growth': 'revenue_growth',
+            'earnings_growth': 'earnings_growth',
+        },
+        'ocf_growth': {'ocf_growth': 'ocf_growth'},
+    }
+    fetchers = {
+        'profile': get_profile,
+        'ratios': get_ratios,
+        'key_metrics': get_key_metrics,
+        'growth': get_growth,
+        'ocf_growth': get_ocf_growth,
+    }
+
+    def fetch(self, ticker, groups):
+        profile = get_profile(ticker)
+        if not profile:
+            return None
+        raw = {'profile': profile}
+        for group in groups:
+            if group != 'profile':
+                raw[group] = self.fetchers[group](ticker) or {}
+        return raw
+
+    def fixup(self, data, raw):
+        # FMP often has no TTM dividend yield: derive it from the last dividend
+        if 'ratios' not in raw or data.get('dividend_yield') is not None:
+            return
+        price = data.get('current_price')
+        last_div = _to_float(raw['profile'].get('lastDiv'))
+        if price and price > 0 and last_div:
+            data['dividend_yield'] = last_div / price
+
+
+class YahooSource(SourceAdapter):
+    name = 'yahoo'
+    calls_per_minute = int(os.getenv('YAHOO_CALLS_PER_MINUTE', '60'))
+    groups = {
+        'info': {
+            'company_name': 'longName',
+            'sector': 'sector',
+            'market_cap': 'marketCap',
+            'current_price': 'currentPrice',
+            'pe_ratio': 'trailingPE',
+            'ev_ebitda': 'enterpriseToEbitda',
+            'roe': 'returnOnEquity',
+            'dividend_yield': 'trailingAnnualDividendYield',
+            'payout_ratio': 'payoutRatio',
+            'debt_equity_ratio': ('debtToEquity', _percent_to_ratio),
+            'current_ratio': 'currentRatio',
+            'revenue_growth': 'revenueGrowth',
+            'earnings_growth': 'earningsGrowth',
+        },
+    }
+    required_groups = ['info']
+
+    def fetch(self, ticker, groups):
+        info = yf.Ticker(ticker).info
+        if not info or not (info.get('longName') or info.get('shortName')):
+            return None
+        if not info.get('longName'):
+            info['longName'] = info.get('shortName')
+        return {'info': info}
+
+
+FMP_SOURCE = FMPSource()
+YAHOO_SOURCE = YahooSource()
+SOURCES = {source.name: source for source in (FMP_SOURCE, YAHOO_SOURCE)}
+
+# one limiter per source, shared by every job hitting that API
+_RATE_LIMITERS = {}
+
+
+def get_rate_limiter(source):
+    if source.name not in _RATE_LIMITERS:
+        _RATE_LIMITERS[source.name] = RateLimiter(
+            source.calls_per_minute / 60.0,
+            burst=len(source.groups) * FETCH_WORKERS)
+    return _RATE_LIMITERS[source.name]
+
+
+def ensure_db_table_exists(conn):
+    cursor = conn.cursor()
+    try:
+        column_defs = ',\n            '.join(
+            f"{col} {spec['type']}" for col, spec in COLUMN_SPEC.items())
+        freshness_defs = ',\n            '.join(
+            f"{col} {col_type}" for col, col_type in FRESHNESS_COLUMNS.items())
+        # 1) Create if it doesn't exist
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DB_TABLE_NAME} (
+            ticker TEXT PRIMARY KEY,
+            {column_defs},
+            {freshness_defs}
+        )""")
+        # 2) Add any spec columns an older table is missing
+        cursor.execute(f"PRAGMA table_info({DB_TABLE_NAME})")
+        existing = {row[1] for row in cursor.fetchall()}  # row[1] == column name
+        wanted = {col: spec['type'] for col, spec in COLUMN_SPEC.items()}
+        wanted.update(FRESHNESS_COLUMNS)
+        for col, col_type in wanted.items():
+            if col not in existing:
+                cursor.execute(f"ALTER TABLE {DB_TABLE_NAME} ADD COLUMN {col} {col_type}")
+        # 3) Indexes for screening (sector is matched case-insensitively)
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{DB_TABLE_NAME}_sector ON {DB_TABLE_NAME} (LOWER(sector))")
+        for col in INDEXED_COLUMNS:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{DB_TABLE_NAME}_{col} ON {DB_TABLE_NAME} ({col})")
+        conn.commit()
+    finally:
+        cursor.close()
+    ensure_freshness_columns_exist(conn)
+
+
+def fetch_and_process_ticker(ticker, source=FMP_SOURCE):
+    """Fetches and normalises every column the source provides for one ticker."""
+    logging.debug(f"Processing {ticker} via {source.name}...")
+    try:
+        raw = source.fetch(ticker, list(source.groups))
+        if raw is None: return None
+        return source.normalise(ticker, raw)
+    except Exception as e:
+        logging.error(f"Failed processing {ticker}: {e}", exc_info=True)
+        return None
+
+
+# tickers per SELECT when reading back rows for the history
+SNAPSHOT_CHUNK = 500
+
+
+def _stored_rows(cursor, tickers):
+    """The cache rows of `tickers` as now stored, including untouched columns."""
+    rows = []
+    for i in range(0, len(tickers), SNAPSHOT_CHUNK):
+        chunk = tickers[i:i + SNAPSHOT_CHUNK]
+        cursor.execute(
+            f"SELECT * FROM {DB_TABLE_NAME} WHERE ticker IN ({', '.join('?' for _ in chunk)})",
+            chunk)
+        rows.extend(dict(row) for row in cursor.fetchall())
+    return rows
+
+
+def record_history(tickers):
+    """Appends the stored rows of `tickers` to today's history partition in one write."""
+    tickers = list(dict.fromkeys(t for t in tickers if t))
+    if not tickers:
+        return 0
+    conn = get_sqlite_connection()
+    cursor = conn.cursor()
+    try:
+        return record_snapshot(_stored_rows(cursor, tickers), conn=conn)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def update_sqlite_table(all_ticker_data, snapshot=True):
+    """
+    Upserts rows into the cache. Returns the number of rows written (0 on failure).
+    snapshot=False leaves the history to the caller (see record_history).
+    """
+    if not all_ticker_data: return 0
+    conn = None
+    cursor = None
+    try:
+        conn = get_sqlite_connection()
+        ensure_db_table_exists(conn)
+        cursor = conn.cursor()
+        # rows from a partial refresh only carry some columns: upsert each
+        # column set separately so missing columns keep their stored values
+        upserts_by_columns = {}
+        for data in all_ticker_data:
+            if data and data.get('ticker'):
+                columns = tuple(col for col in CACHE_COLUMNS if col in data)
+                upserts_by_columns.setdefault(columns, []).append(
+                    tuple(data.get(col) for col in columns))
+
+        data_to_upsert = [row for rows in upserts_by_columns.values() for row in rows]
+        if not data_to_upsert: return 0
+
+        logging.info(f"Executing SQLite UPSERT for {len(data_to_upsert)} records...")
+        for columns, rows in upserts_by_columns.items():
+            placeholders = ', '.join(['?'] * len(columns))
+            update_cols = [f"{col}=excluded.{col}" for col in columns
+                           if col not in ('ticker', 'field_fetched_at')]
+            if 'field_fetched_at' in columns:
+                update_cols.append(
+                    "field_fetched_at=json_patch(COALESCE(field_fetched_at, '{}'), excluded.field_fetched_at)")
+            sql = f""" INSERT INTO {DB_TABLE_NAME} ({', '.join(columns)}) VALUES ({placeholders})
+                        ON CONFLICT(ticker) DO UPDATE SET {', '.join(update_cols)} """
+            cursor.executemany(sql, rows)
+        conn.commit()
+        logging.info(f"SQLite Update Committed {len(data_to_upsert)} records.")
+
+        tickers = [data['ticker'] for data in all_ticker_data if data and data.get('ticker')]
+        bump_data_version(conn, tickers)
+
+        # keep yesterday's values: append the refreshed rows (as now stored,
+        # including columns a partial refresh did not touch) to the history
+        if snapshot:
+            record_snapshot(_stored_rows(cursor, tickers), conn=conn)
+        return len(data_to_upsert)
+    except Exception as e:
+        logging.error(f"SQLite update failed: {e}", exc_info=True)
+        if conn: conn.rollback()
+        return 0
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def write_batch(rows, snapshot=True):
+    """
+    Pipeline write step: the local SQLite cache always (freshness planning and
+    history live there), mirrored into the shared store when METRICS_BACKEND
+    is not sqlite.
+    """
+    written = update_sqlite_table(rows, snapshot=snapshot)
+    backend = get_metrics_backend()
+    if written and backend.name != 'sqlite':
+        backend.upsert_rows(rows)
+    return written
+
+
+def run_ingestion(job_name, universe, source=FMP_SOURCE, api_budget=INGEST_API_BUDGET,
+                  max_workers=FETCH_WORKERS, batch_size=WRITE_BATCH_SIZE):
+    """
+    Refreshes `universe` from `source`: plans the stale groups within the
+    API budget, then runs the checkpointed fetch -> normalise -> write
+    pipeline. Returns the pipeline stats, or None if nothing was stale.
+    """
+    if not universe:
+        logging.error(f"{job_name}: empty universe. Aborting.")
+        return None
+    logging.info(f"{job_name}: targeting {len(universe)} tickers via {source.name}.")
+
+    conn = get_sqlite_connection()
+    try:
+        ensure_db_table_exists(conn)
+        plan = plan_refresh(conn, universe, api_budget, source)
+    finally:
+        conn.close()
+    if not plan:
+        logging.info(f"{job_name}: cache is fresh, nothing to refresh.")
+        return None
+    groups_by_ticker = dict(plan)
+
+    # the day's history partition is rewritten once for the whole run, not per batch
+    written_tickers = []
+
+    def write(rows):
+        written = write_batch(rows, snapshot=False)
+        if written:
+            written_tickers.extend(row['ticker'] for row in rows)
+        return written
+
+    try:
+        stats = run_pipeline(
+            [ticker for ticker, _ in plan],
+            fetch_fn=lambda ticker: source.fetch(ticker, groups_by_ticker[ticker]),
+            normalise_fn=source.normalise,
+            write_fn=write,
+            job_name=job_name,
+            max_workers=max_workers,
+            batch_size=batch_size,
+            rate_limiter=get_rate_limiter(source),
+            tokens_per_fetch=lambda ticker: source.cost(groups_by_ticker[ticker]))
+    finally:
+        record_history(written_tickers)
+    logging.info(f"{job_name} stats: {json.dumps(stats)}")
+    return stats
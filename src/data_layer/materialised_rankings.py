@@ -0,0 +1,225 @@
+# materialised_rankings.py
+# Precomputed /api/rank results for every (goal, risk, sector).
+#
+# Scores only depend on a company's own metrics, so when the store changes
+# just the tickers in the backend's change log (data_version.py) are
+# rescored and re-slotted into each ranking. Lookups are a slice of a
+# pre-sorted list; the data version is re-checked at most every
+# RANKINGS_CHECK_SECONDS.
+#
+# scoring='percentile' is served from one PercentileIndex per sector: a
+# changed ticker is re-slotted in O(log n) and everyone else's percentile
+# is read off the index, so nothing is rescanned in the store.
+import bisect
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from .backends import get_metrics_backend, percentile_weights
+from .data_access import RANKING_COLUMNS
+from .schema import NUMERIC_COLUMNS
+from ..profiles import InvestmentGoal, RiskTolerance, get_profile_metrics
+from ..ranking_engine import PercentileIndex, build_page
+from ..screener_scoring import calculate_scores_batch
+
+RANKINGS_CHECK_SECONDS = float(os.getenv('RANKINGS_CHECK_SECONDS', '2'))
+ALL_SECTORS = 'all'
+PROFILES = [(goal.value, risk.value) for goal in InvestmentGoal for risk in RiskTolerance]
+# metric -> higher_better for every metric a profile scores on; every
+# profile agrees on the direction, so one index per sector serves them all
+PERCENTILE_METRICS = {
+    metric: cfg['higher_better']
+    for goal, risk in PROFILES
+    for metric, cfg in get_profile_metrics(goal, risk).items()
+    if metric in NUMERIC_COLUMNS
+}
+
+
+def _sort_key(row):
+    return (-(row.get('overall_score') or 0), row.get('ticker') or '')
+
+
+def _sector_key(row):
+    return (row.get('sector') or '').lower()
+
+
+class MaterialisedRankings:
+    """In-process ranking tables for every profile and sector, kept at the store's data version."""
+
+    def __init__(self, backend=None, check_seconds=RANKINGS_CHECK_SECONDS):
+        self.backend = backend
+        self.check_seconds = check_seconds
+        self.data_version = None
+        self.refreshed_at = None
+        # (goal, risk) -> {ticker: ranked row}
+        self._rows = {}
+        # (goal, risk, sector) -> ([sort keys], [rows]) in rank order
+        self._tables = {}
+        # ticker -> metric row, and sector -> PercentileIndex over those rows
+        self._companies = {}
+        self._percentiles = {}
+        # (goal, risk, sector) -> percentile-ranked rows, until the next change
+        self._percentile_tables = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _backend(self):
+        return self.backend or get_metrics_backend()
+
+    def _current_version(self):
+        # the version of the store the rows come from, not of the local cache
+        return self._backend().get_data_version()[0]
+
+    def _score(self, companies):
+        """{(goal, risk): [row with scores]} for the given metric rows."""
+        scored = {}
+        for goal, risk in PROFILES:
+            scores = calculate_scores_batch(companies, goal=goal, risk=risk)
+            scored[(goal, risk)] = [{**company, **s} for company, s in zip(companies, scores)]
+        return scored
+
+    def _insert(self, profile, row):
+        for sector in (ALL_SECTORS, _sector_key(row)):
+            keys, rows = self._tables.setdefault((*profile, sector), ([], []))
+            key = _sort_key(row)
+            i = bisect.bisect_left(keys, key)
+            keys.insert(i, key)
+            rows.insert(i, row)
+
+    def _remove(self, profile, row):
+        for sector in (ALL_SECTORS, _sector_key(row)):
+            keys, rows = self._tables[(*profile, sector)]
+            i = bisect.bisect_left(keys, _sort_key(row))
+            del keys[i]
+            del rows[i]
+
+    def _index_add(self, row):
+        for sector in (ALL_SECTORS, _sector_key(row)):
+            index = self._percentiles.setdefault(sector, PercentileIndex(PERCENTILE_METRICS))
+            index.update(row['ticker'], row)
+
+    def _index_remove(self, row):
+        for sector in (ALL_SECTORS, _sector_key(row)):
+            self._percentiles[sector].remove(row['ticker'])
+
+    def _rebuild(self, version):
+        companies = self._backend().get_all_metrics_for_ranking()
+        self._rows = {}
+        self._tables = {}
+        self._companies = {row['ticker']: row for row in companies}
+        by_sector = {ALL_SECTORS: companies}
+        for row in companies:
+            by_sector.setdefault(_sector_key(row), []).append(row)
+        self._percentiles = {sector: PercentileIndex.from_rows(rows, PERCENTILE_METRICS)
+                             for sector, rows in by_sector.items()}
+        for profile, rows in self._score(companies).items():
+            self._rows[profile] = {row['ticker']: row for row in rows}
+            by_sector = {}
+            for row in rows:
+                by_sector.setdefault(ALL_SECTORS, []).append(row)
+                by_sector.setdefault(_sector_key(row), []).append(row)
+            for sector, sector_rows in by_sector.items():
+                sector_rows.sort(key=_sort_key)
+                self._tables[(*profile, sector)] = ([_sort_key(r) for r in sector_rows], sector_rows)
+        logging.info(f"Materialised rankings rebuilt: {len(companies)} companies at version {version}.")
+
+    def _apply_changes(self, tickers, version):
+        # same shape as get_all_metrics_for_ranking rows
+        fresh = {row['ticker']: {col: row[col] for col in RANKING_COLUMNS if col in row}
+                 for row in self._backend().get_metrics_for_comparison(tickers)
+                 if row.get('company_name') is not None}
+        scored = self._score(list(fresh.values()))
+        for ticker in tickers:
+            old = self._companies.pop(ticker, None)
+            if old is not None:
+                self._index_remove(old)
+        for ticker, row in fresh.items():
+            self._companies[ticker] = row
+            self._index_add(row)
+        for profile in PROFILES:
+            profile_rows = self._rows.setdefault(profile, {})
+            for ticker in tickers:
+                old = profile_rows.pop(ticker, None)
+                if old is not None:
+                    self._remove(profile, old)
+            for row in scored[profile]:
+                profile_rows[row['ticker']] = row
+                self._insert(profile, row)
+        logging.info(f"Materialised rankings: rescored {len(tickers)} changed tickers, now version {version}.")
+
+    def refresh(self, force=False):
+        """Catches up with the store; incremental when the change log allows it."""
+        with self._lock:
+            version = self._current_version()
+            self._checked_at = time.monotonic()
+            if not force and version == self.data_version:
+                return False
+            changed = None
+            if not force and self.data_version is not None:
+                changed = self._backend().get_changed_tickers(self.data_version)
+            if changed is None:
+                self._rebuild(version)
+            elif changed:
+                self._apply_changes(changed, version)
+            self._percentile_tables = {}
+            self.data_version = version
+            self.refreshed_at = datetime.now(timezone.utc).isoformat()
+            return True
+
+    def lookup(self, goal, risk, sector=None, limit=20, offset=0):
+        """
+        One page of the precomputed ranking plus its freshness stamp, or None
+        for a (goal, risk) that is not materialised.
+        """
+        if (goal, risk) not in PROFILES:
+            return None
+        if self.data_version is None or time.monotonic() - self._checked_at >= self.check_seconds:
+            self.refresh()
+        sector = (sector or ALL_SECTORS).lower()
+        with self._lock:
+            _, rows = self._tables.get((goal, risk, sector), ([], []))
+            page = build_page(rows[offset:offset + limit], len(rows), offset, limit)
+            page['data_version'] = self.data_version
+            page['refreshed_at'] = self.refreshed_at
+        return page
+
+
+    def _percentile_table(self, goal, risk, sector):
+        key = (goal, risk, sector)
+        if key not in self._percentile_tables:
+            index = self._percentiles.get(sector)
+            weights = percentile_weights(goal, risk, PERCENTILE_METRICS)
+            scores = index.scores({m: w for m, (w, _) in weights.items()}) if index else {}
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            self._percentile_tables[key] = [
+                {**self._companies[ticker], 'profile_score': score} for ticker, score in ranked]
+        return self._percentile_tables[key]
+
+    def percentile_lookup(self, goal, risk, sector=None, limit=20, offset=0):
+        """
+        One page ranked by percentile scores (as backends.rank_by_percentile,
+        percentiles within the sector), or None for an unknown (goal, risk).
+        """
+        if (goal, risk) not in PROFILES:
+            return None
+        if self.data_version is None or time.monotonic() - self._checked_at >= self.check_seconds:
+            self.refresh()
+        sector = (sector or ALL_SECTORS).lower()
+        with self._lock:
+            rows = self._percentile_table(goal, risk, sector)
+            page = build_page(rows[offset:offset + limit], len(rows), offset, limit)
+            page['data_version'] = self.data_version
+            page['refreshed_at'] = self.refreshed_at
+        return page
+
+
+_MATERIALISED = None
+
+
+def get_materialised_rankings():
+    global _MATERIALISED
+    if _MATERIALISED is None:
+        _MATERIALISED = MaterialisedRankings()
+    return _MATERIALISED
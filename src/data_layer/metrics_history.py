@@ -0,0 +1,386 @@
+# metrics_history.py
+# Append-only, date-partitioned history of the stock_metrics_cache columns.
+#
+# Every snapshot date is stored as ONE partition row: tickers, sectors and
+# company names are dictionary-encoded to int32 ids and the numeric metrics
+# are packed into a float32 matrix (byte-shuffled, then zlib-compressed).
+# A daily S&P 100 snapshot is ~2-3KB, so years of history stay small.
+import bisect
+import json
+import logging
+import sqlite3
+import zlib
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from .database import get_sqlite_connection
+from .schema import NUMERIC_COLUMNS
+
+HISTORY_TABLE_NAME = "stock_metrics_history"
+SYMBOLS_TABLE_NAME = "stock_metrics_history_symbols"
+
+# numeric columns of stock_metrics_cache that are tracked over time
+HISTORY_METRIC_COLUMNS = NUMERIC_COLUMNS
+# text columns that are dictionary-encoded
+HISTORY_SYMBOL_KINDS = ['ticker', 'sector', 'company_name']
+
+
+def ensure_history_tables_exist(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SYMBOLS_TABLE_NAME} (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            UNIQUE(kind, value)
+        )""")
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {HISTORY_TABLE_NAME} (
+            snapshot_date TEXT PRIMARY KEY,
+            n_rows INTEGER NOT NULL,
+            columns TEXT NOT NULL,
+            ticker_ids BLOB NOT NULL,
+            sector_ids BLOB NOT NULL,
+            name_ids BLOB NOT NULL,
+            metrics BLOB NOT NULL
+        )""")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def _to_iso_date(value):
+    if value is None:
+        return datetime.now(timezone.utc).date().isoformat()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return date.fromisoformat(str(value)).isoformat()
+
+
+def _encode_symbols(cursor, kind, values):
+    """Maps text values to stable int ids, inserting unseen ones. None -> -1."""
+    distinct = {v for v in values if v is not None}
+    if distinct:
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {SYMBOLS_TABLE_NAME} (kind, value) VALUES (?, ?)",
+            [(kind, v) for v in distinct])
+    lookup = _load_symbols(cursor, kind, reverse=True)
+    return np.array([lookup.get(v, -1) for v in values], dtype=np.int32)
+
+
+def _load_symbols(cursor, kind, reverse=False):
+    cursor.execute(
+        f"SELECT id, value FROM {SYMBOLS_TABLE_NAME} WHERE kind = ?", (kind,))
+    rows = cursor.fetchall()
+    if reverse:
+        return {row[1]: row[0] for row in rows}
+    return {row[0]: row[1] for row in rows}
+
+
+def _pack_matrix(matrix):
+    """float32 matrix -> byte-shuffled, zlib-compressed bytes."""
+    raw = np.ascontiguousarray(matrix, dtype=np.float32).view(np.uint8)
+    shuffled = raw.reshape(-1, 4).T.copy()
+    return zlib.compress(shuffled.tobytes(), 6)
+
+
+def _unpack_matrix(blob, n_rows, n_cols):
+    shuffled = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+    raw = shuffled.reshape(4, -1).T.copy()
+    return raw.view(np.float32).reshape(n_rows, n_cols)
+
+
+def _decode_partition(row):
+    n_rows = row['n_rows']
+    columns = json.loads(row['columns'])
+    return {
+        'columns': columns,
+        'ticker_ids': np.frombuffer(row['ticker_ids'], dtype=np.int32),
+        'sector_ids': np.frombuffer(row['sector_ids'], dtype=np.int32),
+        'name_ids': np.frombuffer(row['name_ids'], dtype=np.int32),
+        'metrics': _unpack_matrix(row['metrics'], n_rows, len(columns)),
+    }
+
+
+def _partition_rows(partition, symbols):
+    """Expands a decoded partition into {ticker: row_dict}."""
+    rows = {}
+    columns = partition['columns']
+    tickers, sectors, names = symbols['ticker'], symbols['sector'], symbols['company_name']
+    for i, ticker_id in enumerate(partition['ticker_ids']):
+        ticker = tickers.get(int(ticker_id))
+        if ticker is None:
+            continue
+        row = {
+            'ticker': ticker,
+            'company_name': names.get(int(partition['name_ids'][i])),
+            'sector': sectors.get(int(partition['sector_ids'][i])),
+        }
+        values = partition['metrics'][i]
+        for j, col in enumerate(columns):
+            row[col] = None if np.isnan(values[j]) else float(values[j])
+        rows[ticker] = row
+    return rows
+
+
+def record_snapshot(all_ticker_data, snapshot_date=None, conn=None):
+    """
+    Appends the given rows to the history partition for snapshot_date
+    (defaults to today, UTC). Rows for tickers already in that day's partition
+    are replaced, other tickers in the partition are kept. Every call
+    rewrites the whole partition, so batched writers should record once per
+    run (see ingestion.run_ingestion), not once per batch.
+    """
+    rows = [d for d in (all_ticker_data or []) if d and d.get('ticker')]
+    if not rows:
+        return 0
+    snapshot_date = _to_iso_date(snapshot_date)
+
+    own_conn = conn is None
+    cursor = None
+    try:
+        if own_conn:
+            conn = get_sqlite_connection()
+        ensure_history_tables_exist(conn)
+        cursor = conn.cursor()
+        # set on the cursor, so a connection passed in keeps its own row factory
+        cursor.row_factory = sqlite3.Row
+
+        cursor.execute(
+            f"SELECT * FROM {HISTORY_TABLE_NAME} WHERE snapshot_date = ?",
+            (snapshot_date,))
+        existing = cursor.fetchone()
+        merged = {}
+        if existing is not None:
+            symbols = {kind: _load_symbols(cursor, kind) for kind in HISTORY_SYMBOL_KINDS}
+            merged = _partition_rows(_decode_partition(existing), symbols)
+        for data in rows:
+            merged[data['ticker']] = data
+
+        ordered = [merged[t] for t in sorted(merged)]
+        matrix = np.array(
+            [[np.nan if d.get(col) is None else float(d[col])
+              for col in HISTORY_METRIC_COLUMNS] for d in ordered],
+            dtype=np.float32).reshape(len(ordered), len(HISTORY_METRIC_COLUMNS))
+        ticker_ids = _encode_symbols(cursor, 'ticker', [d['ticker'] for d in ordered])
+        sector_ids = _encode_symbols(cursor, 'sector', [d.get('sector') for d in ordered])
+        name_ids = _encode_symbols(cursor, 'company_name', [d.get('company_name') for d in ordered])
+
+        cursor.execute(
+            f"""INSERT OR REPLACE INTO {HISTORY_TABLE_NAME}
+                (snapshot_date, n_rows, columns, ticker_ids, sector_ids, name_ids, metrics)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (snapshot_date, len(ordered), json.dumps(HISTORY_METRIC_COLUMNS),
+             ticker_ids.tobytes(), sector_ids.tobytes(), name_ids.tobytes(),
+             _pack_matrix(matrix)))
+        conn.commit()
+        logging.info(f"History snapshot {snapshot_date}: {len(rows)} rows written ({len(ordered)} in partition).")
+        return len(rows)
+    except Exception as e:
+        logging.error(f"Failed to record history snapshot: {e}", exc_info=True)
+        if conn:
+            conn.rollback()
+        return 0
+    finally:
+        if cursor:
+            cursor.close()
+        if own_conn and conn:
+            conn.close()
+
+
+def get_history_dates(conn=None) -> list[str]:
+    """Returns all snapshot dates in ascending order."""
+    own_conn = conn is None
+    try:
+        if own_conn:
+            conn = get_sqlite_connection()
+        ensure_history_tables_exist(conn)
+        rows = conn.execute(
+            f"SELECT snapshot_date FROM {HISTORY_TABLE_NAME} ORDER BY snapshot_date").fetchall()
+        return [row[0] for row in rows]
+    finally:
+        if own_conn and conn:
+            conn.close()
+
+
+def get_metrics_as_of(as_of_date, sector_filter: str = None, conn=None) -> list[dict]:
+    """
+    Returns one row per ticker with its latest snapshot on or before as_of_date,
+    shaped like get_all_metrics_for_ranking so it can be ranked directly.
+    """
+    as_of_date = _to_iso_date(as_of_date)
+    own_conn = conn is None
+    cursor = None
+    try:
+        if own_conn:
+            conn = get_sqlite_connection()
+        ensure_history_tables_exist(conn)
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        symbols = {kind: _load_symbols(cursor, kind) for kind in HISTORY_SYMBOL_KINDS}
+        total_tickers = len(symbols['ticker'])
+
+        # walk partitions newest first until every known ticker is resolved
+        cursor.execute(
+            f"""SELECT * FROM {HISTORY_TABLE_NAME} WHERE snapshot_date <= ?
+                ORDER BY snapshot_date DESC""", (as_of_date,))
+        resolved = {}
+        for row in cursor:
+            for ticker, data in _partition_rows(_decode_partition(row), symbols).items():
+                if ticker not in resolved:
+                    data['snapshot_date'] = row['snapshot_date']
+                    resolved[ticker] = data
+            if len(resolved) >= total_tickers:
+                break
+
+        results = [d for d in resolved.values() if d.get('company_name') is not None]
+        if sector_filter and sector_filter.lower() != 'all':
+            results = [d for d in results
+                       if (d.get('sector') or '').lower() == sector_filter.lower()]
+        logging.info(f"Fetched {len(results)} history records as of {as_of_date}.")
+        return results
+    except Exception as e:
+        logging.error(f"Error in get_metrics_as_of: {e}", exc_info=True)
+        return []
+    finally:
+        if cursor:
+            cursor.close()
+        if own_conn and conn:
+            conn.close()
+
+
+def get_history_panel(start_date=None, end_date=None, conn=None) -> dict:
+    """
+    The history as dense arrays for vectorised replays (e.g. backtest.py):
+    {'dates': [...], 'tickers': [...], 'sectors': [...],
+     'columns': HISTORY_METRIC_COLUMNS,
+     'values': float64 (n_dates, n_tickers, n_columns),
+     'listed': bool (n_dates, n_tickers)}.
+    Each date holds every ticker's latest row on or before it, exactly what
+    get_metrics_as_of returns for that date; 'listed' marks tickers it
+    would include (seen by then, with a company name).
+    """
+    own_conn = conn is None
+    cursor = None
+    try:
+        if own_conn:
+            conn = get_sqlite_connection()
+        ensure_history_tables_exist(conn)
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        symbols = {kind: _load_symbols(cursor, kind) for kind in HISTORY_SYMBOL_KINDS}
+
+        # partitions before start_date still seed the as-of rows at start_date
+        sql = f"SELECT * FROM {HISTORY_TABLE_NAME}"
+        params: list = []
+        if end_date is not None:
+            sql += " WHERE snapshot_date <= ?"
+            params.append(_to_iso_date(end_date))
+        cursor.execute(sql + " ORDER BY snapshot_date", params)
+        partitions = [(row['snapshot_date'], _decode_partition(row)) for row in cursor]
+
+        ticker_ids = sorted({int(t) for _, p in partitions for t in p['ticker_ids']
+                             if int(t) in symbols['ticker']},
+                            key=lambda t: symbols['ticker'][t])
+        position = {ticker_id: j for j, ticker_id in enumerate(ticker_ids)}
+        n_dates, n_tickers = len(partitions), len(ticker_ids)
+        columns = list(HISTORY_METRIC_COLUMNS)
+        values = np.full((n_dates, n_tickers, len(columns)), np.nan)
+        seen = np.zeros((n_dates, n_tickers), dtype=bool)
+        named = np.zeros((n_dates, n_tickers), dtype=bool)
+        sector_ids = np.full(n_tickers, -1)
+        for i, (_, partition) in enumerate(partitions):
+            keep = np.array([int(t) in position for t in partition['ticker_ids']], dtype=bool)
+            cols = np.array([j for j, c in enumerate(columns) if c in partition['columns']], dtype=int)
+            src = [partition['columns'].index(columns[j]) for j in cols]
+            where = np.array([position[int(t)] for t in partition['ticker_ids'][keep]], dtype=int)
+            values[i, where[:, None], cols[None, :]] = partition['metrics'][keep][:, src]
+            seen[i, where] = True
+            named[i, where] = partition['name_ids'][keep] >= 0
+            sector_ids[where] = partition['sector_ids'][keep]
+
+        # forward-fill whole rows: each cell points at the ticker's latest partition
+        latest = np.where(seen, np.arange(n_dates)[:, None], 0)
+        np.maximum.accumulate(latest, axis=0, out=latest)
+        ever_seen = np.logical_or.accumulate(seen, axis=0)
+        tickers_axis = np.arange(n_tickers)[None, :]
+        values = np.where(ever_seen[..., None], values[latest, tickers_axis], np.nan)
+        listed = ever_seen & named[latest, tickers_axis]
+
+        dates = [d for d, _ in partitions]
+        first = 0
+        if start_date is not None:
+            first = bisect.bisect_left(dates, _to_iso_date(start_date))
+        return {
+            'dates': dates[first:],
+            'tickers': [symbols['ticker'][t] for t in ticker_ids],
+            'sectors': [symbols['sector'].get(int(s)) for s in sector_ids],
+            'columns': columns,
+            'values': values[first:],
+            'listed': listed[first:],
+        }
+    finally:
+        if cursor:
+            cursor.close()
+        if own_conn and conn:
+            conn.close()
+
+
+def get_metric_trend(ticker: str, metric: str, start_date=None, end_date=None,
+                     conn=None) -> list[dict]:
+    """Returns [{'date', 'value'}] for one ticker/metric across snapshots."""
+    if metric not in HISTORY_METRIC_COLUMNS:
+        raise ValueError(f"Unknown history metric: {metric}")
+    # bad dates are the caller's error, so they are raised before the catch-all below
+    bounds = []
+    for name, value, op in (('start_date', start_date, '>='), ('end_date', end_date, '<=')):
+        if value is None:
+            continue
+        try:
+            bounds.append((op, _to_iso_date(value)))
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD)") from None
+    own_conn = conn is None
+    cursor = None
+    try:
+        if own_conn:
+            conn = get_sqlite_connection()
+        ensure_history_tables_exist(conn)
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        ticker_id = _load_symbols(cursor, 'ticker', reverse=True).get(ticker)
+        if ticker_id is None:
+            return []
+
+        sql = f"SELECT * FROM {HISTORY_TABLE_NAME} WHERE 1=1"
+        params: list = []
+        for op, day in bounds:
+            sql += f" AND snapshot_date {op} ?"
+            params.append(day)
+        sql += " ORDER BY snapshot_date"
+        cursor.execute(sql, params)
+
+        trend = []
+        for row in cursor:
+            partition = _decode_partition(row)
+            if metric not in partition['columns']:
+                continue
+            hits = np.nonzero(partition['ticker_ids'] == ticker_id)[0]
+            if hits.size == 0:
+                continue
+            value = partition['metrics'][hits[0], partition['columns'].index(metric)]
+            trend.append({
+                'date': row['snapshot_date'],
+                'value': None if np.isnan(value) else float(value)
+            })
+        return trend
+    except Exception as e:
+        logging.error(f"Error in get_metric_trend: {e}", exc_info=True)
+        return []
+    finally:
+        if cursor:
+            cursor.close()
+        if own_conn and conn:
+            conn.close()
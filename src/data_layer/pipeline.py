@@ -0,0 +1,257 @@
+# pipeline.py
+# Staged ingestion pipeline: fetch (bounded worker pool behind a rate limiter)
+# -> normalise -> streaming batched writes, with a per-ticker checkpoint table
+# so an interrupted run resumes where it stopped.
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+
+from .database import get_sqlite_connection
+
+RUNS_TABLE_NAME = "ingestion_runs"
+CHECKPOINT_TABLE_NAME = "ingestion_checkpoint"
+
+
+class RateLimiter:
+    """Thread-safe token bucket: at most `rate` tokens per second, `burst` at once."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_for = (tokens - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+class StageStats:
+    """Per-stage counters: items ok/failed and time spent."""
+
+    def __init__(self, stages):
+        self._lock = threading.Lock()
+        self.stages = {name: {'ok': 0, 'failed': 0, 'seconds': 0.0} for name in stages}
+        self.started = time.monotonic()
+
+    def record(self, stage, seconds, ok=1, failed=0):
+        with self._lock:
+            entry = self.stages[stage]
+            entry['ok'] += ok
+            entry['failed'] += failed
+            entry['seconds'] += seconds
+
+    def summary(self):
+        wall = max(time.monotonic() - self.started, 1e-9)
+        result = {'wall_seconds': round(wall, 2)}
+        for name, entry in self.stages.items():
+            result[name] = {
+                'ok': entry['ok'],
+                'failed': entry['failed'],
+                'busy_seconds': round(entry['seconds'], 2),
+                'per_second': round(entry['ok'] / wall, 2),
+            }
+        return result
+
+
+def ensure_checkpoint_tables_exist(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RUNS_TABLE_NAME} (
+            run_id TEXT PRIMARY KEY,
+            job_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            stats TEXT
+        )""")
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE_NAME} (
+            run_id TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (run_id, ticker)
+        )""")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def start_or_resume_run(conn, job_name):
+    """Returns (run_id, done_tickers), resuming the job's last unfinished run."""
+    ensure_checkpoint_tables_exist(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"""SELECT run_id FROM {RUNS_TABLE_NAME}
+                WHERE job_name = ? AND status = 'running'
+                ORDER BY started_at DESC LIMIT 1""", (job_name,))
+        row = cursor.fetchone()
+        if row:
+            run_id = row[0]
+            cursor.execute(
+                f"SELECT ticker FROM {CHECKPOINT_TABLE_NAME} WHERE run_id = ? AND status = 'done'",
+                (run_id,))
+            done = {r[0] for r in cursor.fetchall()}
+            logging.info(f"Resuming run {run_id} for {job_name}: {len(done)} tickers already done.")
+            return run_id, done
+
+        run_id = uuid.uuid4().hex
+        cursor.execute(
+            f"INSERT INTO {RUNS_TABLE_NAME} (run_id, job_name, status, started_at) VALUES (?, ?, 'running', ?)",
+            (run_id, job_name, _now_iso()))
+        conn.commit()
+        logging.info(f"Started run {run_id} for {job_name}.")
+        return run_id, set()
+    finally:
+        cursor.close()
+
+
+def mark_checkpoints(conn, run_id, entries):
+    """entries: iterable of (ticker, status, error)."""
+    now = _now_iso()
+    conn.executemany(
+        f"""INSERT INTO {CHECKPOINT_TABLE_NAME} (run_id, ticker, status, error, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(run_id, ticker) DO UPDATE SET
+                status=excluded.status, error=excluded.error, updated_at=excluded.updated_at""",
+        [(run_id, ticker, status, error, now) for ticker, status, error in entries])
+    conn.commit()
+
+
+def finish_run(conn, run_id, summary):
+    conn.execute(
+        f"UPDATE {RUNS_TABLE_NAME} SET status = 'complete', finished_at = ?, stats = ? WHERE run_id = ?",
+        (_now_iso(), json.dumps(summary), run_id))
+    conn.commit()
+
+
+def run_pipeline(tickers, fetch_fn, normalise_fn, write_fn, job_name,
+                 max_workers=4, batch_size=25, rate_limiter=None,
+                 tokens_per_fetch=1, conn_factory=get_sqlite_connection):
+    """
+    Runs fetch -> normalise -> write over `tickers`.
+
+    fetch_fn(ticker) -> raw payload (may raise); called from worker threads.
+    normalise_fn(ticker, raw) -> row dict or None; called on the main thread.
+    write_fn(rows) -> number of rows written; called once per batch.
+    tokens_per_fetch: rate-limiter cost of one fetch, or a callable(ticker).
+
+    At most 2 * max_workers fetches are in flight and at most batch_size
+    normalised rows are buffered, so memory stays flat for any universe size.
+    Tickers are checkpointed after their batch is written; failed tickers are
+    retried on the next run. Returns the per-stage stats summary.
+    """
+    stats = StageStats(['fetch', 'normalise', 'write'])
+    conn = conn_factory()
+    run_id, done = start_or_resume_run(conn, job_name)
+    pending = [t for t in tickers if t not in done]
+    logging.info(f"{job_name}: {len(pending)} tickers to process ({len(done)} resumed as done).")
+
+    def fetch_one(ticker):
+        if rate_limiter is not None:
+            tokens = tokens_per_fetch(ticker) if callable(tokens_per_fetch) else tokens_per_fetch
+            rate_limiter.acquire(tokens)
+        start = time.monotonic()
+        try:
+            return ticker, fetch_fn(ticker), None, time.monotonic() - start
+        except Exception as e:
+            return ticker, None, e, time.monotonic() - start
+
+    batch = []
+    failures = []
+
+    def flush():
+        if not batch and not failures:
+            return
+        entries = list(failures)
+        if batch:
+            start = time.monotonic()
+            try:
+                written = write_fn(batch) or 0
+            except Exception as e:
+                logging.error(f"{job_name}: batch write failed: {e}", exc_info=True)
+                written = 0
+            ok = written == len(batch)
+            stats.record('write', time.monotonic() - start,
+                         ok=len(batch) if ok else 0, failed=0 if ok else len(batch))
+            status, error = ('done', None) if ok else ('failed', 'write failed')
+            entries.extend((row['ticker'], status, error) for row in batch)
+        mark_checkpoints(conn, run_id, entries)
+        batch.clear()
+        failures.clear()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            ticker_iter = iter(pending)
+            in_flight = set()
+            max_in_flight = max_workers * 2
+
+            def top_up():
+                for ticker in ticker_iter:
+                    in_flight.add(executor.submit(fetch_one, ticker))
+                    if len(in_flight) >= max_in_flight:
+                        break
+
+            top_up()
+            while in_flight:
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    in_flight.discard(future)
+                    ticker, raw, error, elapsed = future.result()
+                    if error is not None or raw is None:
+                        stats.record('fetch', elapsed, ok=0, failed=1)
+                        logging.warning(f"-> Fetch failed for {ticker}: {error}")
+                        failures.append((ticker, 'failed', str(error or 'no data')))
+                        continue
+                    stats.record('fetch', elapsed)
+
+                    start = time.monotonic()
+                    try:
+                        row = normalise_fn(ticker, raw)
+                    except Exception as e:
+                        logging.error(f"Failed normalising {ticker}: {e}", exc_info=True)
+                        row = None
+                    if row is None:
+                        stats.record('normalise', time.monotonic() - start, ok=0, failed=1)
+                        failures.append((ticker, 'failed', 'normalise failed'))
+                        continue
+                    stats.record('normalise', time.monotonic() - start)
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        flush()
+                top_up()
+        flush()
+        summary = stats.summary()
+        finish_run(conn, run_id, summary)
+        logging.info(f"{job_name} finished: {summary}")
+        return summary
+    except BaseException:
+        # keep whatever was already normalised; the run stays 'running' so
+        # the next invocation resumes from the checkpoint table
+        logging.warning(f"{job_name} interrupted, flushing {len(batch)} buffered rows.")
+        flush()
+        raise
+    finally:
+        conn.close()
@@ -0,0 +1,39 @@
+# schema.py
+# Single source of truth for the stock_metrics_cache columns. Ingestion,
+# freshness tracking, the history store and readers all derive from this.
+
+DB_TABLE_NAME = "stock_metrics_cache"
+
+# column -> SQLite type and how long a fetched value stays fresh
+COLUMN_SPEC = {
+    'company_name':      {'type': 'TEXT', 'ttl_hours': 24},
+    'sector':            {'type': 'TEXT', 'ttl_hours': 24},
+    'market_cap':        {'type': 'REAL', 'ttl_hours': 24},
+    'current_price':     {'type': 'REAL', 'ttl_hours': 24},
+    # Valuation
+    'pe_ratio':          {'type': 'REAL', 'ttl_hours': 24},
+    'ev_ebitda':         {'type': 'REAL', 'ttl_hours': 24 * 7},
+    # Health
+    'roe':               {'type': 'REAL', 'ttl_hours': 24},
+    'dividend_yield':    {'type': 'REAL', 'ttl_hours': 24},
+    'payout_ratio':      {'type': 'REAL', 'ttl_hours': 24},
+    'debt_equity_ratio': {'type': 'REAL', 'ttl_hours': 24},
+    'current_ratio':     {'type': 'REAL', 'ttl_hours': 24},
+    # Growth
+    'revenue_growth':    {'type': 'REAL', 'ttl_hours': 24 * 30},
+    'earnings_growth':   {'type': 'REAL', 'ttl_hours': 24 * 30},
+    'ocf_growth':        {'type': 'REAL', 'ttl_hours': 24 * 30},
+}
+
+# bookkeeping columns written alongside every refresh
+FRESHNESS_COLUMNS = {
+    'fetched_at':       'TEXT',
+    'field_fetched_at': 'TEXT',  # JSON {column: iso timestamp}
+}
+
+# columns screening filters/sorts on most; indexed in every store
+INDEXED_COLUMNS = ['market_cap', 'pe_ratio', 'dividend_yield']
+
+TEXT_COLUMNS = [col for col, spec in COLUMN_SPEC.items() if spec['type'] == 'TEXT']
+NUMERIC_COLUMNS = [col for col, spec in COLUMN_SPEC.items() if spec['type'] == 'REAL']
+CACHE_COLUMNS = ['ticker'] + list(COLUMN_SPEC) + list(FRESHNESS_COLUMNS)
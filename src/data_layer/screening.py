@@ -0,0 +1,238 @@
+# screening.py
+# Threshold screening over stock_metrics_cache, e.g. "P/E <= 20 and
+# dividend yield >= 2%, Technology or Energy, biggest first".
+#
+# A request is parsed into a query dict once, then either compiled to
+# parameterised SQL (filters, sort, limit and projection all run in the
+# store) or evaluated with vectorised masks over an in-memory snapshot
+# (used for point-in-time history rows).
+import logging
+
+import pandas as pd
+
+from .data_access import RANKING_COLUMNS
+from .schema import DB_TABLE_NAME, NUMERIC_COLUMNS, TEXT_COLUMNS
+
+# columns predicates may use: numeric ones take ranges, text ones take sets
+RANGE_COLUMNS = list(NUMERIC_COLUMNS)
+SET_COLUMNS = ['ticker'] + list(TEXT_COLUMNS)
+DEFAULT_SCREEN_LIMIT = 50
+MAX_SCREEN_LIMIT = 500
+
+
+def _parse_number(column, value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{column}' bounds must be numbers, got {value!r}")
+
+
+def _parse_set_values(column, values):
+    if isinstance(values, str):
+        values = values.split(',')
+    if values is not None and not isinstance(values, list):
+        raise ValueError(f"'{column}' values must be a list or a comma-separated string")
+    values = [str(v).strip() for v in values or [] if str(v).strip()]
+    if not values:
+        raise ValueError(f"'{column}' needs at least one value")
+    return [v.upper() for v in values] if column == 'ticker' else [v.lower() for v in values]
+
+
+def _parse_filter(spec):
+    if not isinstance(spec, dict):
+        raise ValueError(f"Each filter must be an object, got {spec!r}")
+    column = spec.get('column')
+    if column in RANGE_COLUMNS:
+        low = spec.get('min')
+        high = spec.get('max')
+        if low is None and high is None:
+            raise ValueError(f"'{column}' filter needs 'min' and/or 'max'")
+        low = None if low is None else _parse_number(column, low)
+        high = None if high is None else _parse_number(column, high)
+        return (column, 'range', (low, high))
+    if column in SET_COLUMNS:
+        return (column, 'in', _parse_set_values(column, spec.get('in')))
+    raise ValueError(f"Cannot filter on '{column}'")
+
+
+def parse_screen_request(payload: dict) -> dict:
+    """
+    Validates a screen request and returns the query dict.
+
+    {"filters": [{"column": "pe_ratio", "max": 20},
+                 {"column": "dividend_yield", "min": 0.02},
+                 {"column": "sector", "in": ["Technology", "Energy"]}],
+     "sort": "market_cap", "order": "desc", "limit": 50, "offset": 0,
+     "columns": ["ticker", "company_name", "pe_ratio"]}
+
+    Bounds are inclusive and rows with a NULL in a filtered column never
+    match. Raises ValueError on anything not in the schema whitelist.
+    """
+    payload = payload or {}
+    if not isinstance(payload, dict):
+        raise ValueError("Screen request must be a JSON object")
+    specs = payload.get('filters') or []
+    if not isinstance(specs, list):
+        raise ValueError("filters must be a list")
+    filters = [_parse_filter(spec) for spec in specs]
+
+    sort = payload.get('sort') or 'market_cap'
+    if sort not in RANKING_COLUMNS:
+        raise ValueError(f"Cannot sort on '{sort}'")
+    order = (payload.get('order') or 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+
+    try:
+        limit = int(payload.get('limit', DEFAULT_SCREEN_LIMIT))
+        offset = int(payload.get('offset', 0))
+    except (TypeError, ValueError):
+        raise ValueError("limit and offset must be integers")
+    if limit < 1 or offset < 0:
+        raise ValueError("limit must be >= 1 and offset >= 0")
+
+    columns = payload.get('columns') or list(RANKING_COLUMNS)
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(',') if c.strip()]
+    if not isinstance(columns, list):
+        raise ValueError("columns must be a list or a comma-separated string")
+    unknown = [c for c in columns if c not in RANKING_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    if 'ticker' not in columns:
+        columns = ['ticker'] + columns
+
+    return {
+        'filters': filters,
+        'sort': sort,
+        'descending': order == 'desc',
+        'limit': min(limit, MAX_SCREEN_LIMIT),
+        'offset': offset,
+        'columns': list(dict.fromkeys(columns)),
+    }
+
+
+def parse_screen_args(args) -> dict:
+    """
+    Query-string form of parse_screen_request:
+    ?pe_ratio=..20&dividend_yield=0.02..&sector=Technology,Energy
+     &sort=-market_cap&limit=50&offset=0&columns=ticker,pe_ratio
+    """
+    filters = []
+    for column in RANGE_COLUMNS:
+        value = args.get(column)
+        if value is None:
+            continue
+        low, sep, high = value.partition('..')
+        if not sep:
+            raise ValueError(f"'{column}' must be a range like 10..20, 10.. or ..20")
+        filters.append({'column': column, 'min': low or None, 'max': high or None})
+    for column in SET_COLUMNS:
+        value = args.get(column)
+        if value is not None:
+            filters.append({'column': column, 'in': value})
+
+    payload = {'filters': filters}
+    sort = args.get('sort')
+    if sort:
+        payload['order'] = 'desc' if sort.startswith('-') else 'asc'
+        payload['sort'] = sort.lstrip('-')
+    for key in ('limit', 'offset', 'columns'):
+        if args.get(key) is not None:
+            payload[key] = args.get(key)
+    return parse_screen_request(payload)
+
+
+def missing_columns(query, available) -> list:
+    """
+    Filter/sort columns the store (e.g. an older cache) lacks. Projected
+    columns that are missing are simply left out instead.
+    """
+    needed = [f[0] for f in query['filters']] + [query['sort']]
+    return sorted({c for c in needed if c not in available})
+
+
+def compile_screen_sql(query, placeholder='?'):
+    """
+    Compiles a query to (sql, params). Identifiers only ever come from the
+    schema whitelist; every value is a bound parameter. A COUNT(*) window
+    carries the total match count in column _total.
+    """
+    where = ["company_name IS NOT NULL"]
+    params = []
+    for column, kind, value in query['filters']:
+        if kind == 'range':
+            low, high = value
+            if low is not None:
+                where.append(f"{column} >= {placeholder}")
+                params.append(low)
+            if high is not None:
+                where.append(f"{column} <= {placeholder}")
+                params.append(high)
+        else:
+            marks = ', '.join([placeholder] * len(value))
+            target = column if column == 'ticker' else f"LOWER({column})"
+            where.append(f"{target} IN ({marks})")
+            params.extend(value)
+
+    direction = 'DESC' if query['descending'] else 'ASC'
+    sql = f"""
+        SELECT {', '.join(query['columns'])}, COUNT(*) OVER () AS _total
+        FROM {DB_TABLE_NAME}
+        WHERE {' AND '.join(where)}
+        ORDER BY {query['sort']} IS NULL, {query['sort']} {direction}, ticker
+        LIMIT {placeholder} OFFSET {placeholder}
+    """
+    params.extend([query['limit'], query['offset']])
+    return sql, params
+
+
+def screen_result(rows, query, total=None):
+    """Response shape shared by the SQL and snapshot paths."""
+    if total is None:
+        total = rows[0].pop('_total', len(rows)) if rows else 0
+        for row in rows:
+            row.pop('_total', None)
+    return {
+        'total': total,
+        'offset': query['offset'],
+        'limit': query['limit'],
+        'companies': rows,
+    }
+
+
+def screen_rows(query, rows):
+    """Evaluates a query with vectorised masks over in-memory row dicts."""
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return screen_result([], query, total=0)
+    missing = missing_columns(query, df.columns)
+    if missing:
+        raise ValueError(f"Columns not available: {', '.join(missing)}")
+
+    mask = df['company_name'].notna().to_numpy(copy=True)
+    for column, kind, value in query['filters']:
+        if kind == 'range':
+            values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+            low, high = value
+            # NaN compares False, so rows missing the value drop out
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        else:
+            text = df[column].astype('string')
+            text = text.str.upper() if column == 'ticker' else text.str.lower()
+            mask &= text.isin(value).fillna(False).to_numpy(dtype=bool)
+
+    matched = df.loc[mask]
+    total = int(mask.sum())
+    ordered = matched.sort_values(
+        by=[query['sort'], 'ticker'],
+        ascending=[not query['descending'], True],
+        na_position='last', kind='mergesort')
+    page = ordered.iloc[query['offset']:query['offset'] + query['limit']]
+    page = page[[c for c in query['columns'] if c in page.columns]]
+    page = page.astype(object).where(page.notna(), None)
+    logging.debug(f"Snapshot screen matched {total} of {len(df)} rows.")
+    return screen_result(page.to_dict('records'), query, total=total)
@@ -0,0 +1,30 @@
+# sector_stats.py
+# Per-sector mean/std of every numeric metric over the whole store, for
+# sector-neutral ranking (ranking_engine scoring='sector'). Computed in one
+# grouped pass and cached until the store's data version changes, so
+# ranking any subset or sector reuses the universe-wide statistics.
+import logging
+import threading
+
+from .backends import get_metrics_backend
+from .schema import NUMERIC_COLUMNS
+from ..ranking_engine import compute_sector_stats
+
+_CACHE = {'version': None, 'stats': None}
+_LOCK = threading.Lock()
+
+
+def get_sector_stats(backend=None) -> dict:
+    """compute_sector_stats over the current store, recomputed only on a new data version."""
+    backend = backend or get_metrics_backend()
+    # the version of the store the rows come from, not of the local cache
+    version = backend.get_data_version()[0]
+    with _LOCK:
+        if _CACHE['version'] != version or _CACHE['stats'] is None:
+            rows = backend.get_all_metrics_for_ranking()
+            _CACHE['stats'] = compute_sector_stats(rows, NUMERIC_COLUMNS)
+            _CACHE['version'] = version
+            logging.info(
+                f"Sector stats: {len(_CACHE['stats']['sectors'])} sectors over "
+                f"{len(rows)} companies at version {version}.")
+        return _CACHE['stats']
@@ -0,0 +1,91 @@
+# downsample.py
+# Thins long price / indicator series down to about as many points as a
+# chart has pixels, before they are serialised.
+#
+# 'lttb' (largest triangle three buckets) keeps the first and last bar and,
+# from each of max_points-2 equal buckets in between, the bar forming the
+# largest triangle with the bar kept before it and the next bucket's mean.
+# 'minmax' keeps every bucket's lowest and highest bar, so spikes survive.
+# Bars are picked on close and kept whole, so every field and indicator
+# column of a ticker stays aligned.
+import numpy as np
+
+from src.prices_helper import bar_field, optional_bar_column
+from src.resample import epoch_seconds
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+# fewest points worth asking for: first, last and one bucket's min and max
+MIN_POINTS = 4
+
+
+def lttb_indices(x, y, max_points) -> np.ndarray:
+    """Sorted indices of at most max_points points of (x, y) chosen by LTTB."""
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x[0]
+    y = np.asarray(y, dtype=np.float64)
+    # max_points-2 buckets over the inner points 1..n-2
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    kept = 0
+    # each bucket's pick depends on the previous one, so step through them
+    for bucket in range(max_points - 2):
+        begin, end = edges[bucket], edges[bucket + 1]
+        # twice the triangle area, up to sign
+        area = np.abs((x[kept] - mean_x[bucket + 1]) * (y[begin:end] - y[kept])
+                      - (x[kept] - x[begin:end]) * (mean_y[bucket + 1] - y[kept]))
+        kept = begin + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[bucket + 1] = kept
+    return selected
+
+
+def minmax_indices(y, max_points) -> np.ndarray:
+    """Sorted indices of the first, last, and each bucket's min and max point."""
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    size = -(-n // ((max_points - 2) // 2))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    # NaN (gaps and padding) never wins unless a bucket has nothing else
+    lowest = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highest = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lowest, highest]))
+
+
+def downsample_indices(times, close, max_points, method='lttb') -> np.ndarray:
+    """Indices of the bars to keep, in time order (times in epoch seconds)."""
+    if method == 'minmax':
+        return minmax_indices(close, max_points)
+    return lttb_indices(times, close, max_points)
+
+
+def downsample_bars(bars, max_points, method='lttb') -> list:
+    """At most max_points of a ticker's bars (dicts or Alpaca Bars), picked on close."""
+    if len(bars) <= max_points:
+        return bars
+    indices = downsample_indices(epoch_seconds(bar_field(bars, 'timestamp')),
+                                 optional_bar_column(bars, 'close'), max_points, method)
+    return [bars[i] for i in indices.tolist()]
+
+
+def downsample_columns(data, max_points, method='lttb') -> dict:
+    """indicator_columns-shaped data cut to at most max_points rows, picked on close."""
+    timestamps = data['timestamp']
+    if len(timestamps) <= max_points:
+        return data
+    indices = downsample_indices(epoch_seconds(timestamps), data['columns']['close'],
+                                 max_points, method)
+    return {
+        'timestamp': [timestamps[i] for i in indices.tolist()],
+        'columns': {name: np.asarray(values)[indices] for name, values in data['columns'].items()},
+    }
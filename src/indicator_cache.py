@@ -0,0 +1,232 @@
+# indicator_cache.py
+# Memoised SMA / EMA / RSI / MACD that extend with new bars instead of
+# recomputing the whole window.
+#
+# Entries are keyed on (symbol, timeframe, indicator, parameters) and hold
+# the outputs so far plus the streaming state needed to continue them (the
+# last period-1 closes for SMA, the running EMA, Wilder's average gain and
+# loss for RSI, the three EMAs of MACD). The state is kept as of BEFORE the
+# last cached bar, because that bar may still be forming: a later request
+# replays it with its final values and then the new bars, O(new bars).
+#
+# The kernels follow TA-Lib's defaults and seeding (EMA seeded with the SMA
+# of its first period values, MACD's fast EMA seeded at the slow lookback).
+# An entry is only extended for a request that starts on the same first
+# bar and agrees with every cached close before the forming one, so a warm
+# answer is always the one a cold computation of that window would give;
+# anything else (a moved window start, a revised bar) is recomputed.
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# TA-Lib abstract defaults for the indicators with streaming state
+STREAMING_INDICATORS = {
+    'SMA': {'timeperiod': 30},
+    'EMA': {'timeperiod': 30},
+    'RSI': {'timeperiod': 14},
+    'MACD': {'fastperiod': 12, 'slowperiod': 26, 'signalperiod': 9},
+}
+MAX_CACHE_ENTRIES = 2048
+# longer series are computed but not cached
+MAX_CACHED_BARS = 50_000
+
+_CACHE = OrderedDict()
+_LOCK = threading.Lock()
+
+
+class StreamingSMA:
+    def __init__(self, timeperiod=30):
+        self.period = timeperiod
+        self.tail = np.zeros(0)
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        window = np.concatenate([self.tail, values])
+        sums = np.concatenate([[0.0], np.cumsum(window)])
+        out = np.full(len(values), np.nan)
+        # out[j] is the mean of window[ends[j] - period + 1 : ends[j] + 1]
+        ends = np.arange(len(self.tail), len(window))
+        full = ends >= self.period - 1
+        out[full] = (sums[ends[full] + 1] - sums[ends[full] + 1 - self.period]) / self.period
+        self.tail = window[max(len(window) - (self.period - 1), 0):]
+        return out
+
+
+class StreamingEMA:
+    """EMA seeded with the mean of its first period values, after `skip` ignored values."""
+
+    def __init__(self, timeperiod=30, skip=0):
+        self.period = timeperiod
+        self.k = 2.0 / (timeperiod + 1)
+        self.skip = skip
+        self.seed = []
+        self.value = None
+
+    def extend(self, values):
+        out = np.full(len(values), np.nan)
+        value, k = self.value, self.k
+        for i, x in enumerate(np.asarray(values, dtype=np.float64).tolist()):
+            if value is not None:
+                value = (x - value) * k + value
+                out[i] = value
+            elif self.skip:
+                self.skip -= 1
+            else:
+                self.seed.append(x)
+                if len(self.seed) == self.period:
+                    value = sum(self.seed) / self.period
+                    out[i] = value
+                    self.seed = []
+        self.value = value
+        return out
+
+
+class StreamingRSI:
+    """Wilder's RSI: simple averages of the first period changes, then smoothing."""
+
+    def __init__(self, timeperiod=14):
+        self.period = timeperiod
+        self.prev = None
+        self.gains = []
+        self.losses = []
+        self.avg_gain = None
+        self.avg_loss = None
+
+    def extend(self, values):
+        out = np.full(len(values), np.nan)
+        n = self.period
+        prev, avg_gain, avg_loss = self.prev, self.avg_gain, self.avg_loss
+        for i, x in enumerate(np.asarray(values, dtype=np.float64).tolist()):
+            if prev is None:
+                prev = x
+                continue
+            change, prev = x - prev, x
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            if avg_gain is None:
+                self.gains.append(gain)
+                self.losses.append(loss)
+                if len(self.gains) < n:
+                    continue
+                avg_gain, avg_loss = sum(self.gains) / n, sum(self.losses) / n
+                self.gains, self.losses = [], []
+            else:
+                avg_gain = (avg_gain * (n - 1) + gain) / n
+                avg_loss = (avg_loss * (n - 1) + loss) / n
+            total = avg_gain + avg_loss
+            out[i] = 100.0 * avg_gain / total if total else 0.0
+        self.prev, self.avg_gain, self.avg_loss = prev, avg_gain, avg_loss
+        return out
+
+
+class StreamingMACD:
+    """MACD line, signal and histogram, NaN until the signal line starts (like TA-Lib)."""
+
+    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9):
+        fastperiod, slowperiod = sorted((fastperiod, slowperiod))
+        self.fast = StreamingEMA(fastperiod, skip=slowperiod - fastperiod)
+        self.slow = StreamingEMA(slowperiod)
+        self.signal = StreamingEMA(signalperiod)
+
+    def extend(self, values):
+        line = self.fast.extend(values) - self.slow.extend(values)
+        valid = ~np.isnan(line)
+        signal = np.full(len(line), np.nan)
+        signal[valid] = self.signal.extend(line[valid])
+        line[np.isnan(signal)] = np.nan
+        return line, signal, line - signal
+
+
+STREAMING_CLASSES = {'SMA': StreamingSMA, 'EMA': StreamingEMA, 'RSI': StreamingRSI, 'MACD': StreamingMACD}
+
+
+def _as_tuple(output):
+    return output if isinstance(output, tuple) else (output,)
+
+
+def _compute(indicator, params, close):
+    """(outputs, state before the last bar) over close from scratch."""
+    state = STREAMING_CLASSES[indicator](**params)
+    head = _as_tuple(state.extend(close[:-1]))
+    before_last = copy.deepcopy(state)
+    last = _as_tuple(state.extend(close[-1:]))
+    return [np.concatenate([h, t]) for h, t in zip(head, last)], before_last
+
+
+def _extend(entry, times, close):
+    """Outputs for (times, close) from a cache entry, or None if they don't line up."""
+    cached_times = entry['times']
+    anchor = len(cached_times) - 1
+    # same first bar, reaching the last cached one after as many bars as the
+    # cache has, and no revision to any cached close but the forming last one
+    if (times[0] != cached_times[0] or anchor >= len(times)
+            or times[anchor] != cached_times[-1]
+            or not np.array_equal(close[:anchor], entry['close'][:-1], equal_nan=True)):
+        return None
+    state = copy.deepcopy(entry['state'])
+    middle = _as_tuple(state.extend(close[anchor:-1]))
+    before_last = copy.deepcopy(state)
+    last = _as_tuple(state.extend(close[-1:]))
+    outputs = [np.concatenate([cached[:-1], m, l])
+               for cached, m, l in zip(entry['outputs'], middle, last)]
+    return {'times': times, 'close': close.copy(), 'outputs': outputs, 'state': before_last}
+
+
+def streaming_indicator(symbol, timeframe, indicator, times, close) -> list:
+    """
+    Output arrays (one per TA-Lib output) of a STREAMING_INDICATORS entry
+    for one symbol's bars (epoch-second times, closes), served from and
+    stored in the cache.
+    """
+    params = STREAMING_INDICATORS[indicator]
+    key = (symbol, timeframe, indicator, tuple(sorted(params.items())))
+    times = np.asarray(times, dtype=np.int64)
+    close = np.asarray(close, dtype=np.float64)
+    if not len(close):
+        return [np.zeros(0) for _ in _as_tuple(STREAMING_CLASSES[indicator](**params).extend([]))]
+
+    with _LOCK:
+        entry = _CACHE.get(key)
+    extended = _extend(entry, times, close) if entry is not None else None
+    if extended is None:
+        outputs, state = _compute(indicator, params, close)
+        extended = {'times': times, 'close': close.copy(), 'outputs': outputs, 'state': state}
+    result = list(extended['outputs'])
+
+    with _LOCK:
+        if len(times) > MAX_CACHED_BARS:
+            _CACHE.pop(key, None)
+            return result
+        _CACHE[key] = extended
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > MAX_CACHE_ENTRIES:
+            _CACHE.popitem(last=False)
+    return result
+
+
+def cached_indicator_outputs(symbol_times, inputs_by_ticker, indicators, timeframe, compute) -> dict:
+    """
+    compute_indicators-shaped {ticker: {column: array}}: STREAMING_INDICATORS
+    come from the cache (symbol_times gives each ticker's bar epoch
+    seconds), everything else from compute(inputs_by_ticker, others).
+    Columns stay in request order.
+    """
+    others = [indicator for indicator in indicators if indicator not in STREAMING_INDICATORS]
+    computed = compute(inputs_by_ticker, others) if others else {}
+    outputs = {}
+    for ticker, inputs in inputs_by_ticker.items():
+        columns = {}
+        for indicator in indicators:
+            if indicator in STREAMING_INDICATORS:
+                result = streaming_indicator(ticker, timeframe, indicator,
+                                             symbol_times[ticker], inputs['close'])
+                if len(result) == 1:
+                    columns[indicator] = result[0]
+                else:
+                    columns.update({f"{indicator}_{i}": output for i, output in enumerate(result)})
+            else:
+                columns.update({name: values for name, values in computed.get(ticker, {}).items()
+                                if name == indicator or name.startswith(f"{indicator}_")})
+        outputs[ticker] = columns
+    return outputs
@@ -0,0 +1,176 @@
+# indicator_executor.py
+# Computes indicators for many tickers at once, across cores when it pays.
+#
+# Every ticker's OHLCV inputs are packed into ONE shared-memory block
+# (len(BAR_FIELDS) rows x all bars, tickers side by side), so workers read
+# them as zero-copy views instead of unpickling per task. (ticker, indicator)
+# tasks are batched onto one long-lived process pool and each output comes
+# back as a float64 array, multi-output indicators split into NAME_0,
+# NAME_1, ... columns. Small requests and single-core hosts run in-process.
+# Without TA-Lib installed, indicators with a NumPy kernel
+# (indicator_kernels.KERNELS) skip all that: they run in-process over a
+# (ticker x time) matrix per bar count.
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.indicator_kernels import KERNELS
+from src.prices_helper import BAR_FIELDS, talib_calculate_indicators
+from src.prices_helper import abstract as talib_abstract
+
+# below this many (ticker, indicator) tasks the pool costs more than it saves
+MIN_PARALLEL_TASKS = 16
+# task batches per worker, to even out uneven indicator costs
+BATCHES_PER_WORKER = 4
+# the pool is never resized: requests that want fewer workers submit fewer batches
+POOL_WORKERS = os.cpu_count() or 1
+
+_POOL = {'executor': None}
+_POOL_LOCK = threading.Lock()
+
+
+def output_columns(indicator, result) -> dict:
+    """{column name: float64 array} of one indicator result, {} if it failed."""
+    if result is None:
+        return {}
+    if isinstance(result, np.ndarray) and result.ndim == 1:
+        return {indicator: np.array(result, dtype=np.float64)}
+    return {f"{indicator}_{index}": np.array(output, dtype=np.float64)
+            for index, output in enumerate(result)}
+
+
+def indicator_outputs(inputs, indicators, calculate=talib_calculate_indicators) -> dict:
+    """output_columns of every indicator for one ticker's inputs, in order."""
+    columns = {}
+    for indicator in indicators:
+        columns.update(output_columns(indicator, calculate(inputs, indicator)))
+    return columns
+
+
+def kernel_outputs(inputs_by_ticker, indicators) -> dict:
+    """
+    {ticker: {column name: float64 array}} of KERNELS indicators, each one
+    computed in a single call for all tickers with the same bar count.
+    """
+    by_length = {}
+    for ticker, inputs in inputs_by_ticker.items():
+        by_length.setdefault(len(inputs['close']), []).append(ticker)
+    outputs = {ticker: {} for ticker in inputs_by_ticker}
+    for tickers in by_length.values():
+        for indicator in indicators:
+            kernel, fields = KERNELS[indicator]
+            result = kernel(*(np.stack([inputs_by_ticker[ticker][field] for ticker in tickers])
+                              for field in fields))
+            for row, ticker in enumerate(tickers):
+                row_result = tuple(r[row] for r in result) if isinstance(result, tuple) else result[row]
+                outputs[ticker].update(output_columns(indicator, row_result))
+    return outputs
+
+
+def _get_pool():
+    with _POOL_LOCK:
+        if _POOL['executor'] is None:
+            _POOL['executor'] = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+        return _POOL['executor']
+
+
+def _reset_pool(executor):
+    """Drops a broken pool, unless another request already replaced it."""
+    with _POOL_LOCK:
+        if _POOL['executor'] is executor:
+            executor.shutdown(wait=False)
+            _POOL['executor'] = None
+
+
+def _run_batch(shm_name, shape, bounds, tasks, calculate):
+    # pool workers share the parent's resource tracker, which forgets the
+    # block when the parent unlinks it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    block = inputs = None
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        results = []
+        for ticker_index, indicator in tasks:
+            begin, end = bounds[ticker_index]
+            inputs = {field: block[row, begin:end] for row, field in enumerate(BAR_FIELDS)}
+            results.append(output_columns(indicator, calculate(inputs, indicator)))
+        return results
+    finally:
+        # views into the block must be gone before it can be closed
+        block = inputs = None
+        shm.close()
+
+
+def _batches(tasks, count):
+    size = -(-len(tasks) // count)
+    return [tasks[i:i + size] for i in range(0, len(tasks), size)]
+
+
+def compute_indicators(inputs_by_ticker, indicators, max_workers=None,
+                       calculate=talib_calculate_indicators) -> dict:
+    """
+    {ticker: {column name: float64 array}} for every ticker's inputs (see
+    prices_helper.prepare_inputs) and every indicator, columns in request
+    order. Without TA-Lib, KERNELS indicators are computed batched; the
+    other (ticker, indicator) tasks are spread over max_workers processes
+    (default: all cores), and calculate must be a picklable module function.
+    """
+    # looping TA-Lib's C functions over tickers beats the batched kernels
+    batched = [] if talib_abstract is not None else [
+        indicator for indicator in indicators if indicator in KERNELS]
+    if batched:
+        others = [indicator for indicator in indicators if indicator not in KERNELS]
+        computed = kernel_outputs(inputs_by_ticker, batched)
+        if others:
+            for ticker, columns in compute_indicators(inputs_by_ticker, others,
+                                                      max_workers, calculate).items():
+                computed[ticker].update(columns)
+        return {ticker: {name: columns[name] for indicator in indicators for name in columns
+                         if name == indicator or name.startswith(f"{indicator}_")}
+                for ticker, columns in computed.items()}
+
+    tickers = list(inputs_by_ticker)
+    tasks = [(index, indicator) for index in range(len(tickers)) for indicator in indicators]
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1 or (max_workers is None and len(tasks) < MIN_PARALLEL_TASKS):
+        return {ticker: indicator_outputs(inputs_by_ticker[ticker], indicators, calculate)
+                for ticker in tickers}
+
+    lengths = [len(inputs_by_ticker[ticker]['close']) for ticker in tickers]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    bounds = list(zip(offsets[:-1], offsets[1:]))
+    shape = (len(BAR_FIELDS), max(offsets[-1], 1))
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        for ticker, (begin, end) in zip(tickers, bounds):
+            for row, field in enumerate(BAR_FIELDS):
+                block[row, begin:end] = inputs_by_ticker[ticker][field]
+        del block
+
+        # fewer batches than pool workers keeps the rest of the pool free
+        count = workers * BATCHES_PER_WORKER if workers >= POOL_WORKERS else workers
+        batches = _batches(tasks, count)
+        executor = _get_pool()
+        try:
+            futures = [executor.submit(_run_batch, shm.name, shape, bounds, batch, calculate)
+                       for batch in batches]
+            results = [columns for future in futures for columns in future.result()]
+        except (BrokenProcessPool, RuntimeError) as e:
+            # RuntimeError: the pool was shut down under this request
+            logging.warning(f"Indicator pool unavailable ({e}); computing in-process.")
+            _reset_pool(executor)
+            return compute_indicators(inputs_by_ticker, indicators, 1, calculate)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    outputs = {ticker: {} for ticker in tickers}
+    for (ticker_index, _), columns in zip(tasks, results):
+        outputs[tickers[ticker_index]].update(columns)
+    return outputs
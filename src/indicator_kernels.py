@@ -0,0 +1,345 @@
+# indicator_kernels.py
+# TA-Lib-compatible indicators in pure NumPy, batched over tickers.
+#
+# Every kernel takes 1-D series (one ticker) or 2-D (ticker x time)
+# matrices, one row per ticker, and returns outputs of the same shape with
+# TA-Lib's warm-up NaNs, lookbacks, seeding and defaults. Rows must share
+# the time axis; tickers with different bar counts are computed in
+# separate calls (see indicator_executor.kernel_outputs). A NaN bar turns
+# a smoothed series NaN from that bar on, never before it.
+#
+# Window indicators are cumulative sums, or reductions over period shifted
+# slices of the whole matrix. Exponential smoothing (EMA, Wilder) is a
+# linear recurrence, solved a block of bars at a time with one matrix
+# product per block. Only
+# KAMA, ADX and SAR, whose updates depend on the previous value, step
+# through time, and then for every ticker at once.
+import numpy as np
+
+# TA-Lib's TA_IS_ZERO / TA_IS_ZERO_OR_NEG tolerance
+EPSILON = 1e-8
+# bars per matrix product in _recurrence
+RECURRENCE_BLOCK = 64
+
+
+def _matrices(*series):
+    """float64 (ticker x time) views of the inputs, and whether they were 1-D."""
+    matrices = [np.atleast_2d(np.asarray(values, dtype=np.float64)) for values in series]
+    return matrices, np.ndim(series[0]) == 1
+
+
+def _shaped(outputs, vector):
+    if isinstance(outputs, tuple):
+        return tuple(output[0] if vector else output for output in outputs)
+    return outputs[0] if vector else outputs
+
+
+def _nans(like):
+    return np.full(like.shape, np.nan)
+
+
+def _rolling_sum(x, period):
+    """Sums of the last period values, for windows ending at index period-1 onwards."""
+    sums = np.cumsum(x, axis=1)
+    return np.concatenate([sums[:, period - 1:period], sums[:, period:] - sums[:, :-period]], axis=1)
+
+
+def _rolling(x, period, ufunc):
+    """ufunc-reduction of the last period values, by combining period shifted slices."""
+    size = x.shape[1] - period + 1
+    out = x[:, period - 1:].copy()
+    for lag in range(1, period):
+        ufunc(out, x[:, period - 1 - lag:period - 1 - lag + size], out=out)
+    return out
+
+
+def _rolling_variance(x, period, mean):
+    """Population variance of the last period values around their (rolling) mean."""
+    size = x.shape[1] - period + 1
+    total = np.zeros_like(mean)
+    for lag in range(period):
+        deviation = x[:, lag:lag + size] - mean
+        total += deviation * deviation
+    return total / period
+
+
+def _recurrence(b, decay):
+    """
+    y[:, t] = decay * y[:, t-1] + b[:, t], starting from y = 0 before the first
+    bar. A NaN makes y NaN from that bar on, as the sequential scan would.
+    """
+    ticks = np.arange(RECURRENCE_BLOCK)
+    lags = ticks[:, None] - ticks[None, :]
+    # weights[j, i] = decay ** (j - i): bar i's contribution to bar j of a block
+    weights = np.where(lags >= 0, decay ** np.maximum(lags, 0), 0.0).T
+    carry_weights = decay ** (ticks + 1)
+    # 0 * NaN is NaN, so a NaN inside a block product would also poison the
+    # bars before it: solve with NaNs zeroed, then blank each row from its first NaN
+    missing = np.isnan(b)
+    if missing.any():
+        b = np.where(missing, 0.0, b)
+    y = np.empty_like(b)
+    carry = np.zeros(len(b))
+    for begin in range(0, b.shape[1], RECURRENCE_BLOCK):
+        block = b[:, begin:begin + RECURRENCE_BLOCK]
+        size = block.shape[1]
+        y[:, begin:begin + size] = block @ weights[:size, :size] + carry[:, None] * carry_weights[:size]
+        carry = y[:, begin + size - 1]
+    if missing.any():
+        y[np.maximum.accumulate(missing, axis=1)] = np.nan
+    return y
+
+
+def _ema(x, period, seed_index):
+    """EMA seeded at seed_index with the mean of the period values ending there, NaN before."""
+    out = _nans(x)
+    if seed_index >= x.shape[1]:
+        return out
+    k = 2.0 / (period + 1)
+    b = np.zeros((len(x), x.shape[1] - seed_index))
+    b[:, 0] = x[:, seed_index - period + 1:seed_index + 1].mean(axis=1)
+    b[:, 1:] = k * x[:, seed_index + 1:]
+    out[:, seed_index:] = _recurrence(b, 1.0 - k)
+    return out
+
+
+def _wilder(terms, period, seed_index, seed):
+    """Wilder's running sum (prev - prev/period + term) from seed at seed_index, NaN before."""
+    out = _nans(terms)
+    if seed_index >= terms.shape[1]:
+        return out
+    b = terms[:, seed_index:].copy()
+    b[:, 0] = seed
+    out[:, seed_index:] = _recurrence(b, 1.0 - 1.0 / period)
+    return out
+
+
+def SMA(close, timeperiod=30):
+    (x,), vector = _matrices(close)
+    out = _nans(x)
+    if x.shape[1] >= timeperiod:
+        out[:, timeperiod - 1:] = _rolling_sum(x, timeperiod) / timeperiod
+    return _shaped(out, vector)
+
+
+def EMA(close, timeperiod=30):
+    (x,), vector = _matrices(close)
+    return _shaped(_ema(x, timeperiod, timeperiod - 1), vector)
+
+
+def DEMA(close, timeperiod=30):
+    (x,), vector = _matrices(close)
+    single = _ema(x, timeperiod, timeperiod - 1)
+    double = _ema(single, timeperiod, 2 * (timeperiod - 1))
+    return _shaped(2.0 * single - double, vector)
+
+
+def KAMA(close, timeperiod=30):
+    (x,), vector = _matrices(close)
+    out = _nans(x)
+    n = x.shape[1]
+    if n <= timeperiod:
+        return _shaped(out, vector)
+    fastest, slowest = 2.0 / 3.0, 2.0 / 31.0
+    # efficiency ratio: net change over the period against the path travelled
+    volatility = _rolling_sum(np.abs(np.diff(x, axis=1)), timeperiod)
+    change = x[:, timeperiod:] - x[:, :-timeperiod]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where((volatility <= change) | (np.abs(volatility) < EPSILON),
+                         1.0, np.abs(change / volatility))
+    smoothing = (ratio * (fastest - slowest) + slowest) ** 2
+    kama = x[:, timeperiod - 1]
+    for step, t in enumerate(range(timeperiod, n)):
+        kama = (x[:, t] - kama) * smoothing[:, step] + kama
+        out[:, t] = kama
+    return _shaped(out, vector)
+
+
+def RSI(close, timeperiod=14):
+    (x,), vector = _matrices(close)
+    out = _nans(x)
+    if x.shape[1] <= timeperiod:
+        return _shaped(out, vector)
+    change = np.diff(x, axis=1)
+    averages = []
+    for moves in (np.maximum(change, 0.0), np.maximum(-change, 0.0)):
+        b = moves[:, timeperiod - 1:] / timeperiod
+        b[:, 0] = moves[:, :timeperiod].mean(axis=1)
+        averages.append(_recurrence(b, (timeperiod - 1) / timeperiod))
+    gain, loss = averages
+    total = gain + loss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[:, timeperiod:] = np.where(np.abs(total) < EPSILON, 0.0, 100.0 * gain / total)
+    return _shaped(out, vector)
+
+
+def MACD(close, fastperiod=12, slowperiod=26, signalperiod=9):
+    """(macd, signal, hist), all NaN until the signal line starts."""
+    (x,), vector = _matrices(close)
+    fastperiod, slowperiod = sorted((fastperiod, slowperiod))
+    # both EMAs start at the slow lookback, like TA-Lib
+    line = _ema(x, fastperiod, slowperiod - 1) - _ema(x, slowperiod, slowperiod - 1)
+    signal = _ema(line, signalperiod, slowperiod + signalperiod - 2)
+    line[np.isnan(signal)] = np.nan
+    return _shaped((line, signal, line - signal), vector)
+
+
+def BBANDS(close, timeperiod=20, nbdevup=2.0, nbdevdn=2.0):
+    """(upper, middle, lower) bands around the SMA, population standard deviations apart."""
+    (x,), vector = _matrices(close)
+    upper, middle, lower = _nans(x), _nans(x), _nans(x)
+    if x.shape[1] >= timeperiod:
+        mean = _rolling(x, timeperiod, np.add) / timeperiod
+        variance = _rolling_variance(x, timeperiod, mean)
+        deviation = np.where(variance < EPSILON, 0.0, np.sqrt(variance))
+        middle[:, timeperiod - 1:] = mean
+        upper[:, timeperiod - 1:] = mean + nbdevup * deviation
+        lower[:, timeperiod - 1:] = mean - nbdevdn * deviation
+    return _shaped((upper, middle, lower), vector)
+
+
+def MIDPOINT(close, timeperiod=14):
+    (x,), vector = _matrices(close)
+    out = _nans(x)
+    if x.shape[1] >= timeperiod:
+        out[:, timeperiod - 1:] = (_rolling(x, timeperiod, np.maximum)
+                                   + _rolling(x, timeperiod, np.minimum)) / 2.0
+    return _shaped(out, vector)
+
+
+def MIDPRICE(high, low, timeperiod=14):
+    (high, low), vector = _matrices(high, low)
+    out = _nans(high)
+    if high.shape[1] >= timeperiod:
+        out[:, timeperiod - 1:] = (_rolling(high, timeperiod, np.maximum)
+                                   + _rolling(low, timeperiod, np.minimum)) / 2.0
+    return _shaped(out, vector)
+
+
+def _directional(high, low, close, timeperiod):
+    """Wilder-smoothed +DI and -DI (0 where the true range is), valid from timeperiod."""
+    up = np.diff(high, axis=1)
+    down = -np.diff(low, axis=1)
+    plus_dm = np.where((up > 0) & (up > down), up, 0.0)
+    minus_dm = np.where((down > 0) & (down > up), down, 0.0)
+    true_range = np.maximum.reduce([high[:, 1:] - low[:, 1:],
+                                    np.abs(high[:, 1:] - close[:, :-1]),
+                                    np.abs(low[:, 1:] - close[:, :-1])])
+    # the sums start with the first period-1 moves, then smooth in the rest
+    smoothed = [_wilder(terms, timeperiod, timeperiod - 2, terms[:, :timeperiod - 1].sum(axis=1))
+                for terms in (plus_dm, minus_dm, true_range)]
+    plus, minus, true_range = (np.concatenate([np.full((len(high), 1), np.nan), s], axis=1)
+                               for s in smoothed)
+    zero = np.abs(true_range) < EPSILON
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = np.where(zero, 0.0, 100.0 * plus / true_range)
+        minus_di = np.where(zero, 0.0, 100.0 * minus / true_range)
+    plus_di[:, :timeperiod] = np.nan
+    minus_di[:, :timeperiod] = np.nan
+    return plus_di, minus_di, zero
+
+
+def PLUS_DI(high, low, close, timeperiod=14):
+    (high, low, close), vector = _matrices(high, low, close)
+    if high.shape[1] <= timeperiod:
+        return _shaped(_nans(high), vector)
+    return _shaped(_directional(high, low, close, timeperiod)[0], vector)
+
+
+def MINUS_DI(high, low, close, timeperiod=14):
+    (high, low, close), vector = _matrices(high, low, close)
+    if high.shape[1] <= timeperiod:
+        return _shaped(_nans(high), vector)
+    return _shaped(_directional(high, low, close, timeperiod)[1], vector)
+
+
+def ADX(high, low, close, timeperiod=14):
+    (high, low, close), vector = _matrices(high, low, close)
+    out = _nans(high)
+    n, first = high.shape[1], 2 * timeperiod - 1
+    if n <= first:
+        return _shaped(out, vector)
+    plus_di, minus_di, flat = _directional(high, low, close, timeperiod)
+    total = plus_di + minus_di
+    # DX only counts where the true range and the DI sum are non-zero
+    valid = ~flat & (np.abs(total) >= EPSILON)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dx = np.where(valid, 100.0 * np.abs(plus_di - minus_di) / total, 0.0)
+    adx = dx[:, timeperiod:first + 1].sum(axis=1) / timeperiod
+    out[:, first] = adx
+    for t in range(first + 1, n):
+        adx = np.where(valid[:, t], (adx * (timeperiod - 1) + dx[:, t]) / timeperiod, adx)
+        out[:, t] = adx
+    return _shaped(out, vector)
+
+
+def SAR(high, low, acceleration=0.02, maximum=0.2):
+    """Parabolic SAR, starting long unless the second bar's -DM says otherwise."""
+    (high, low), vector = _matrices(high, low)
+    out = _nans(high)
+    if high.shape[1] < 2:
+        return _shaped(out, vector)
+    acceleration = min(acceleration, maximum)
+    up, down = high[:, 1] - high[:, 0], low[:, 0] - low[:, 1]
+    is_long = ~((down > 0) & (down > up))
+    extreme = np.where(is_long, high[:, 1], low[:, 1])
+    sar = np.where(is_long, low[:, 0], high[:, 0])
+    factor = np.full(len(high), acceleration)
+    prev_high, prev_low = high[:, 1], low[:, 1]
+    for t in range(1, high.shape[1]):
+        new_high, new_low = high[:, t], low[:, t]
+        # a bar through the SAR reverses: the SAR jumps to the old extreme
+        reverse = np.where(is_long, new_low <= sar, new_high >= sar)
+        sar = np.where(reverse, extreme, sar)
+        sar = np.where(reverse & is_long, np.maximum.reduce([sar, prev_high, new_high]), sar)
+        sar = np.where(reverse & ~is_long, np.minimum.reduce([sar, prev_low, new_low]), sar)
+        is_long = is_long ^ reverse
+        out[:, t] = sar
+        new_extreme = np.where(is_long, new_high > extreme, new_low < extreme)
+        factor = np.where(reverse, acceleration,
+                          np.where(new_extreme, np.minimum(factor + acceleration, maximum), factor))
+        extreme = np.where(reverse | new_extreme, np.where(is_long, new_high, new_low), extreme)
+        sar = sar + factor * (extreme - sar)
+        sar = np.where(is_long, np.minimum.reduce([sar, prev_low, new_low]),
+                       np.maximum.reduce([sar, prev_high, new_high]))
+        prev_high, prev_low = new_high, new_low
+    return _shaped(out, vector)
+
+
+def VWAP(high, low, close, volume, timeperiod=None):
+    """
+    Volume-weighted typical price ((high + low + close) / 3), cumulative
+    from the first bar like TA-Lib's VWAP, or over the last timeperiod bars.
+    """
+    (high, low, close, volume), vector = _matrices(high, low, close, volume)
+    weighted = (high + low + close) / 3.0 * volume
+    out = _nans(high)
+    if timeperiod is None:
+        price, shares, start = np.cumsum(weighted, axis=1), np.cumsum(volume, axis=1), 0
+    elif high.shape[1] >= timeperiod:
+        price, shares = _rolling_sum(weighted, timeperiod), _rolling_sum(volume, timeperiod)
+        start = timeperiod - 1
+    else:
+        return _shaped(out, vector)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[:, start:] = np.where(shares > 0, price / shares, np.nan)
+    return _shaped(out, vector)
+
+
+# TA-Lib abstract names -> (kernel, input fields in argument order)
+KERNELS = {
+    'SMA': (SMA, ('close',)),
+    'EMA': (EMA, ('close',)),
+    'DEMA': (DEMA, ('close',)),
+    'KAMA': (KAMA, ('close',)),
+    'RSI': (RSI, ('close',)),
+    'MACD': (MACD, ('close',)),
+    'BBANDS': (BBANDS, ('close',)),
+    'MIDPOINT': (MIDPOINT, ('close',)),
+    'MIDPRICE': (MIDPRICE, ('high', 'low')),
+    'PLUS_DI': (PLUS_DI, ('high', 'low', 'close')),
+    'MINUS_DI': (MINUS_DI, ('high', 'low', 'close')),
+    'ADX': (ADX, ('high', 'low', 'close')),
+    'SAR': (SAR, ('high', 'low')),
+    'VWAP': (VWAP, ('high', 'low', 'close', 'volume')),
+}
@@ -18,68 +18,45 @@ import logging
 # webdev stuff
 from datetime import datetime, timezone, timedelta, date
 import numpy as np
+import pandas as pd
 
 # alpaca  imports
-from alpaca.data.historical import CryptoHistoricalDataClient, StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest, CryptoBarsRequest
 from alpaca.data.timeframe import TimeFrame
 # API keys
 from src.config import ALPACA_SECRET_KEY, ALPACA_PUBLIC_KEY, FMP_API_KEY
+from src.alpaca_clients import fetch_bars_planned, iter_bars_planned
+from src.indicator_executor import compute_indicators, indicator_outputs
+from src.indicator_cache import cached_indicator_outputs
 # helper functions
 from src.prices_helper import *
+from src.resample import resample_bars, epoch_seconds, RESOLUTION_SECONDS
+from src.data_layer.bar_store import load_bars, bar_records, records_to_bars
 
 # usage
-# params bars: List<Bar> min, hour, day
-# agg_numer: int
-# e.g. 5 minunte
-
-
-def agg_bars(stock_data, agg_number):
-    # helper func takes a bar array and dict key
-    # sends all of that dict's keys values into a array
-    def key_to_array(tmp_bars, key):
-        values = []
-        for bar in tmp_bars:
-            values.append(float(bar[key]))
-        return values
-
-    if agg_number <= 1:
-        return stock_data
-
-    stock_data_dict = {}
-    companies = stock_data.keys()
-    for company_name in companies:
-        bars = stock_data[company_name]
-
-        tmp_bar_arr = []
-        agged_bars = []
-        for bar in bars:
-            bar = bar.__dict__
-            tmp_bar_arr.append(bar)
-
-            if len(tmp_bar_arr) == agg_number:
-                highs = key_to_array(tmp_bar_arr, "high")
-                lows = key_to_array(tmp_bar_arr, "low")
-                volumes = key_to_array(tmp_bar_arr, "volume")
-                trade_counts = key_to_array(tmp_bar_arr, "trade_count")
-
-                agged_bar = {
-                    "symbol": tmp_bar_arr[0]["symbol"],
-                    "timestamp": tmp_bar_arr[-1]["timestamp"],
-                    "open": tmp_bar_arr[0]["open"],
-                    "high": max(highs),
-                    "low": min(lows),
-                    "close": tmp_bar_arr[-1]["close"],
-                    "volume": sum(volumes),
-                    "trade_count": sum(trade_counts),
-                    "vwap": tmp_bar_arr[-1]["vwap"]
-                }
-
-                agged_bars.append(agged_bar)
-                tmp_bar_arr = []
-            # aggregation done
-        stock_data_dict[company_name] = agged_bars
-    return stock_data_dict
+# bucket: '5m', '15m', '4h', '1w' (see resample.parse_bucket)
+# agg_number: int, e.g. 5 at min resolution -> 5 minute buckets
+
+
+def fetch_alpaca_bars(tickers, resolution, start, end=None):
+    """
+    {ticker: [Bar]} straight from Alpaca for start..end (crypto or stocks,
+    not mixed), planned into parallel chunks on the shared clients.
+    """
+    is_crypto = validate_crypto_trading_pairs(tickers) is True
+    return fetch_bars_planned(tickers, resolution, start, end, crypto=is_crypto)
+
+
+def fetch_bars(tickers, resolution, start, end=None):
+    """
+    {ticker: [bar dicts]} for start..end (end defaults to now), served from
+    the local bar store; only ranges it does not cover yet hit Alpaca.
+    """
+    def fetch(symbols, gap_start, gap_end):
+        # a gap reaching the present is left open-ended for Alpaca
+        if end is None and gap_end >= datetime.now(timezone.utc) - timedelta(minutes=1):
+            gap_end = None
+        return fetch_alpaca_bars(symbols, resolution, gap_start, gap_end)
+    return load_bars(tickers, resolution, start, fetch, end=end)
 
 
 def get_prices(tickers, resolution, **kwargs):
@@ -94,125 +71,130 @@ def get_prices(tickers, resolution, **kwargs):
     try:
         if end_date is not None and start_date is not None:
             end_date = date.fromisoformat(str(end_date))
-            print(type(end_date))
-        else:
-            start_day = datetime.now(tz=timezone.utc) - timedelta(days=period)
-        is_crypto = validate_crypto_trading_pairs(tickers)
-
-        # crypto data
-        if is_crypto is True:
-            client = CryptoHistoricalDataClient(
-                ALPACA_PUBLIC_KEY, ALPACA_SECRET_KEY)
-            # start and end dates
-            if end_date is not None and start_date is not None:
-                params = CryptoBarsRequest(
-                    symbol_or_symbols=tickers,
-                    start=start_date,
-                    end=end_date,
-                    timeframe=get_resolution(resolution),
-                    limit=10000000)
-            # time period from NOW till a certain number of days in the past
-            else:
-                params = CryptoBarsRequest(
-                    symbol_or_symbols=tickers,
-                    start=start_day,
-                    timeframe=get_resolution(resolution),
-                    limit=10000000)
-            res = client.get_crypto_bars(params)
-        # stocks data
-        else:
-            client = StockHistoricalDataClient(
-                ALPACA_PUBLIC_KEY, ALPACA_SECRET_KEY)
-            # start and end dates
-            if end_date is not None and start_date is not None:
-                params = StockBarsRequest(
-                    symbol_or_symbols=tickers,
-                    start=start_date,
-                    end=end_date,
-                    timeframe=get_resolution(resolution),
-                    limit=10000000)
-            # time period from NOW till a certain number of days in the past
-            else:
-                params = StockBarsRequest(
-                    symbol_or_symbols=tickers,
-                    start=start_day,
-                    timeframe=get_resolution(resolution),
-                    limit=10000000)
-            res = client.get_stock_bars(params)
-        # unwrap data
-        res_iter = iter(res)
-        (_, unwrapped_res) = next(res_iter)
-        return unwrapped_res
+            return fetch_bars(tickers, resolution, start_date, end_date)
+        # time period from NOW till a certain number of days in the past
+        start_day = datetime.now(tz=timezone.utc) - timedelta(days=period)
+        return fetch_bars(tickers, resolution, start_day)
     except Exception as e:
         logging.error(f"Error: Error processcing params: %s", e)
         return e
 
 
+def stream_prices(tickers, resolution, start_date, end_date=None):
+    """
+    Yields (ticker, [bar dicts]) one Alpaca page at a time, in time order
+    per ticker, for start_date <= timestamp < end_date (end None = up to
+    now). Pages come straight from Alpaca, not the bar store, and only a
+    few are held at once however long the range is.
+    """
+    start = pd.Timestamp(start_date, tz='UTC').to_pydatetime()
+    # Alpaca's end is inclusive
+    end = (pd.Timestamp(end_date, tz='UTC').to_pydatetime() - timedelta(seconds=1)
+           if end_date is not None else None)
+    is_crypto = validate_crypto_trading_pairs(tickers) is True
+    for _, page in iter_bars_planned(tickers, resolution, start, end, crypto=is_crypto):
+        for ticker, bars in page.items():
+            if bars:
+                yield ticker, records_to_bars(ticker, bar_records(bars))
+
+
+def fetch_indicator_bars(tickers, period, resolution, agg_number=None, bucket=None):
+    """
+    {ticker: bars} for the last `period` days, resampled into time buckets
+    of `bucket` (e.g. '15m', see resample.parse_bucket) or of agg_number
+    resolution units (agg_number=5 at 'min' -> 5-minute buckets).
+    """
+    start_day = datetime.now(tz=timezone.utc) - timedelta(days=period)
+    unwrapped_res = fetch_bars(tickers, resolution, start_day)
+    if bucket is None and agg_number is not None and agg_number > 1:
+        bucket = agg_number * RESOLUTION_SECONDS.get(resolution, RESOLUTION_SECONDS['min'])
+    if bucket is not None:
+        unwrapped_res = resample_bars(unwrapped_res, bucket)
+    return unwrapped_res
+
+
+def indicator_outputs_for(unwrapped_res, inputs, indicators, resolution, agg_number=None, bucket=None):
+    """
+    compute_indicators over inputs ({ticker: arrays}), with SMA/EMA/RSI/MACD
+    extended from the indicator cache instead of recomputed.
+    """
+    times = {ticker: epoch_seconds(bar_field(unwrapped_res[ticker], 'timestamp')) for ticker in inputs}
+    timeframe = f"{resolution}:{bucket or agg_number or 1}"
+    return cached_indicator_outputs(times, inputs, indicators, timeframe, compute_indicators)
+
+
 def get_indicators(tickers, indicators, period, resolution, **kwargs):
     # try:
     # strips the json file, creates a list of tickers
     # call alpaca to retrieve market data
     agg_number = kwargs.get('agg_number', None)
-    is_crypto = validate_crypto_trading_pairs(tickers)
-    start_day = datetime.now(tz=timezone.utc) - timedelta(days=period)
-
-    if is_crypto is True:
-        client = CryptoHistoricalDataClient(ALPACA_PUBLIC_KEY, ALPACA_SECRET_KEY)
-        params = CryptoBarsRequest(symbol_or_symbols=tickers, start=start_day,
-                                    timeframe=get_resolution(resolution), limit=10000000)
-        res = client.get_crypto_bars(params)
-
-    else:
-        client = StockHistoricalDataClient(ALPACA_PUBLIC_KEY, ALPACA_SECRET_KEY)
-        params = StockBarsRequest(symbol_or_symbols=tickers, start=start_day,
-                                    timeframe=get_resolution(resolution), limit=10000000)
-        res = client.get_stock_bars(params)
-
-    # unwrap data
-    res_iter = iter(res)
-    (_, unwrapped_res) = next(res_iter)
-    if agg_number is not None:
-        unwrapped_res = agg_bars(unwrapped_res, agg_number)
+    bucket = kwargs.get('bucket', None)
+    unwrapped_res = fetch_indicator_bars(tickers, period, resolution, agg_number, bucket)
     # the return dict
-    stock_data = {}
     dfs = {'stock_data': {}, 'timestamp': datetime.now(timezone.utc)}
+    inputs = {ticker: prepare_inputs(unwrapped_res[ticker]) for ticker in tickers}
+    # calc results using talib, across cores for big requests
+    outputs = indicator_outputs_for(
+        unwrapped_res, {ticker: arrays for ticker, arrays in inputs.items() if arrays is not None},
+        indicators, resolution, agg_number, bucket)
     for ticker in tickers:
         # stock data
         bars = unwrapped_res[ticker]
-        inputs = prepare_inputs(bars)
-        if not isinstance(bars[0], dict):
+        if bars and not isinstance(bars[0], dict):
             bars = [bar.__dict__.copy() for bar in bars]
-        # calc results using talib
-        # new array of empty bars
-        for indicator in indicators:
-            calculation_result = talib_calculate_indicators(inputs, indicator)
-            processed_result = process_output(calculation_result)
-            for i, element in enumerate(processed_result):
-                if isinstance(element, tuple):
-                    new_element = []
-                    for x in element:
-                        if not np.isnan(x):
-                            new_element.append(float(x))
-                        else:
-                            new_element.append("null")
-                    element = new_element
-                else:
-                    if np.isnan(element):
-                        element = "null"
-                    else:
-                        element = float(element)
-                # TODO: make this into different indicator
-                if isinstance(element, list):
-                    for index, e in enumerate(element):
-                        bars[i][str(indicator) + '_' + str(index)] = e
-                else:
-                    bars[i][indicator] = element
-            stock_data[ticker] = bars
-        dfs['stock_data'] = stock_data
+        # one column per indicator output (e.g. BBANDS_0), "null" where NaN
+        for name, values in outputs.get(ticker, {}).items():
+            for bar, value in zip(bars, nullable_list(values, null="null")):
+                bar[name] = value
+        dfs['stock_data'][ticker] = bars
     return dfs
 
     # except Exception as e:
     #     logging.error(f"Error: Error processcing params: %s", e)
     #     return e
 
+
+# numeric bar fields carried into the columnar response besides indicators
+COLUMNAR_BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap')
+
+
+def indicator_columns(bars, indicators, outputs=None):
+    """
+    One ticker's bars and indicator outputs as columns:
+    {'timestamp': [datetime], 'columns': {name: float64 ndarray}}, NaN where
+    an indicator has no value. Multi-output indicators get one column per
+    output, named like the bars response (e.g. BBANDS_0). outputs are the
+    already computed indicator columns, if any (see compute_indicators).
+    """
+    inputs = prepare_inputs(bars)
+    if inputs is None:
+        raise ValueError("bars could not be converted to arrays")
+    if outputs is None:
+        outputs = indicator_outputs(inputs, indicators)
+    columns = {}
+    for field in COLUMNAR_BAR_FIELDS:
+        if field in inputs:
+            columns[field] = inputs[field]
+        else:
+            columns[field] = optional_bar_column(bars, field)
+    columns.update(outputs)
+    return {
+        'timestamp': bar_field(bars, 'timestamp'),
+        'columns': columns,
+    }
+
+
+def get_indicator_columns(tickers, indicators, period, resolution, agg_number=None, bucket=None):
+    """get_indicators in columnar form, see indicator_columns."""
+    unwrapped_res = fetch_indicator_bars(tickers, period, resolution, agg_number, bucket)
+    inputs = {ticker: prepare_inputs(unwrapped_res[ticker]) for ticker in tickers}
+    if any(arrays is None for arrays in inputs.values()):
+        raise ValueError("bars could not be converted to arrays")
+    outputs = indicator_outputs_for(unwrapped_res, inputs, indicators, resolution, agg_number, bucket)
+    return {
+        'timestamp': datetime.now(timezone.utc),
+        'stock_data': {ticker: indicator_columns(unwrapped_res[ticker], indicators, outputs[ticker])
+                       for ticker in tickers},
+    }
+
 # %%
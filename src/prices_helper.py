@@ -2,10 +2,15 @@
 
 import json
 import logging
+from operator import attrgetter, itemgetter
 from urllib.request import urlopen
 import numpy as np
-# from talib import abstract
+try:
+    from talib import abstract
+except ImportError:
+    abstract = None
 from alpaca.data.timeframe import TimeFrame
+from src.indicator_kernels import KERNELS
 
 # stock_client = StockHistoricalDataClient("api-key",  "secret-key")
 
@@ -43,6 +48,10 @@ def talib_calculate_indicators(inputs, indicator):
     :return: ndarray of len(inputs)
     """
 
+    if abstract is None and indicator in KERNELS:
+        # TA-Lib isn't installed: use the pure NumPy version
+        kernel, fields = KERNELS[indicator]
+        return kernel(*(inputs[field] for field in fields))
     try:
         generic_function = abstract.Function(indicator)
         res = generic_function(inputs)
@@ -52,6 +61,71 @@ def talib_calculate_indicators(inputs, indicator):
         return
 
 
+# OHLCV fields TA-Lib's abstract functions read, and the keys live websocket
+# bars use for them
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+LIVE_BAR_KEYS = {'open': 'o', 'high': 'h', 'low': 'l', 'close': 'c', 'volume': 'v'}
+
+
+def _bar_column(values, count):
+    return np.fromiter(values, dtype=np.float64, count=count)
+
+
+def bars_to_arrays(stock_bars, keys=None):
+    """
+    Columnar OHLCV arrays from bars in one pass per field, no per-bar
+    reallocation. Every array is a C-contiguous float64 that TA-Lib takes
+    without copying.
+
+    :param stock_bars: a list of bar dicts or alpaca Bar objects, or a
+        DataFrame (e.g. BarSet.df for one symbol) whose float64 columns are
+        returned as views, not copies
+    :param keys: {field: key in each bar}, defaults to the field names
+    :return: dict of ndarrays {open, high, low, close, volume}
+    """
+    keys = keys or {field: field for field in BAR_FIELDS}
+    if hasattr(stock_bars, 'columns'):
+        return {field: np.ascontiguousarray(stock_bars[key].to_numpy(dtype=np.float64, copy=False))
+                for field, key in keys.items()}
+
+    stock_bars = stock_bars if isinstance(stock_bars, (list, tuple)) else list(stock_bars)
+    getter = _bar_getter(stock_bars)
+    return {field: _bar_column(map(getter(key), stock_bars), len(stock_bars))
+            for field, key in keys.items()}
+
+
+def _bar_getter(stock_bars):
+    return attrgetter if stock_bars and not isinstance(stock_bars[0], dict) else itemgetter
+
+
+def bar_field(stock_bars, key):
+    """List of one field across bars (dicts or alpaca Bar objects), in one map."""
+    return list(map(_bar_getter(stock_bars)(key), stock_bars))
+
+
+def bar_value(bar, key):
+    """A field of a bar dict or alpaca Bar object, None if absent."""
+    return bar.get(key) if isinstance(bar, dict) else getattr(bar, key, None)
+
+
+def optional_bar_column(stock_bars, key):
+    """float64 column of one bar field; None or absent (e.g. a missing vwap) -> NaN."""
+    try:
+        return _bar_column(map(_bar_getter(stock_bars)(key), stock_bars), len(stock_bars))
+    except (TypeError, KeyError, AttributeError):
+        return _bar_column(
+            (np.nan if (value := bar_value(bar, key)) is None else value for bar in stock_bars),
+            len(stock_bars))
+
+
+def nullable_list(values, null=None) -> list:
+    """float array -> list with `null` where NaN, without a per-value isnan."""
+    as_list = values.tolist()
+    for i in np.flatnonzero(np.isnan(values)).tolist():
+        as_list[i] = null
+    return as_list
+
+
 # helper to generate a inputs dictionary
 def prepare_inputs(stock_bars):
     """
@@ -63,35 +137,7 @@ def prepare_inputs(stock_bars):
     """
 
     try:
-        # init everything
-        open = np.array([])
-        high = np.array([])
-        low = np.array([])
-        close = np.array([])
-        volume = np.array([])
-
-        for bar in stock_bars:
-            if not isinstance(bar, dict):
-                tmp = bar.__dict__
-            else:
-                tmp = bar
-            # init inputs dict
-            open = np.append(open, tmp['open'])
-            high = np.append(high, tmp['high'])
-            low = np.append(low, tmp['low'])
-            close = np.append(close, tmp['close'])
-            volume = np.append(volume, tmp['volume'])
-
-        # place into input dict
-        inputs = {
-            'open': np.array(open),
-            'high': np.array(high),
-            'low': np.array(low),
-            'close': np.array(close),
-            'volume': np.array(volume)
-        }
-
-        return inputs
+        return bars_to_arrays(stock_bars)
     except Exception as e:
         logging.error(f"Error: error processcing inputs for talib: %s", e)
         return
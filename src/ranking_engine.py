@@ -1,4 +1,9 @@
+import base64
+import bisect
+import json
 import logging
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 # Assumes profiles.py is in the same core/ directory
 from .profiles import get_profile_metrics, InvestmentGoal, RiskTolerance
@@ -23,6 +28,297 @@ def normalise_metric(value, all_values, higher_better=True):
     return max(0.0, min(1.0, normalised))
 
 
+def normalise_columns(values: np.ndarray, higher_better: np.ndarray) -> np.ndarray:
+    """
+    Vectorised normalise_metric over an (n_companies, n_metrics) matrix:
+    min/max once per column, NaN -> 0.5, constant or empty columns -> 0.5,
+    lower-is-better columns flipped. A stack of matrices
+    (..., n_companies, n_metrics) is normalised matrix by matrix.
+    """
+    values = np.asarray(values, dtype=float)
+    normalised = np.full(values.shape, 0.5)
+    if values.size == 0:
+        return normalised
+    valid = ~np.isnan(values)
+    has_values = valid.any(axis=-2, keepdims=True)
+    mins = np.min(np.where(valid, values, np.inf), axis=-2, keepdims=True)
+    maxs = np.max(np.where(valid, values, -np.inf), axis=-2, keepdims=True)
+    spread = maxs - mins
+    scored = has_values & (spread > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scaled = (values - mins) / np.where(scored, spread, 1.0)
+    scaled = np.where(higher_better, scaled, 1.0 - scaled)
+    use = valid & scored
+    normalised[use] = np.clip(scaled[use], 0.0, 1.0)
+    return normalised
+
+
+def percentile_columns(values: np.ndarray, higher_better: np.ndarray) -> np.ndarray:
+    """
+    Percentile rank per column, like SQL PERCENT_RANK: share of the other
+    valid values that are worse (0 worst .. 1 best). NaN and columns with
+    fewer than two values -> 0.5. Outliers only move their own rank.
+    """
+    values = np.asarray(values, dtype=float)
+    ranks = np.full(values.shape, 0.5)
+    for j in range(values.shape[1] if values.ndim == 2 else 0):
+        column = values[:, j]
+        valid = ~np.isnan(column)
+        ordered = np.sort(column[valid])
+        n = len(ordered)
+        if n < 2:
+            continue
+        if higher_better[j]:
+            worse = np.searchsorted(ordered, column[valid], side='left')
+        else:
+            worse = n - np.searchsorted(ordered, column[valid], side='right')
+        ranks[valid, j] = worse / (n - 1)
+    return ranks
+
+
+# sector z-scores are clipped to +-ZSCORE_CLIP before mapping onto 0..1
+ZSCORE_CLIP = 3.0
+
+
+def sector_key(sector) -> str:
+    return (sector or '').strip().lower()
+
+
+def sector_statistics(values: np.ndarray, groups: np.ndarray, n_groups: int):
+    """
+    Per-group (counts, means, stds) of every column, each an
+    (n_groups, n_metrics) array, from one bincount over all (group, metric)
+    cells at once. NaN values are ignored; empty cells have NaN mean/std.
+    """
+    values = np.asarray(values, dtype=float)
+    n_metrics = values.shape[1]
+    valid = ~np.isnan(values)
+    cells = (np.asarray(groups)[:, None] * n_metrics + np.arange(n_metrics)).ravel()
+    size = n_groups * n_metrics
+
+    def grouped_sum(weights):
+        return np.bincount(cells, weights=weights.ravel(), minlength=size).reshape(n_groups, n_metrics)
+
+    counts = grouped_sum(valid.astype(float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = grouped_sum(np.where(valid, values, 0.0)) / counts
+        centred = np.where(valid, values - means[groups], 0.0)
+        stds = np.sqrt(grouped_sum(centred * centred) / counts)
+    return counts, means, stds
+
+
+def compute_sector_stats(company_data_list, columns) -> dict:
+    """
+    {'sectors': [sector keys], 'columns': [...], 'counts', 'means', 'stds'}
+    over the given rows, for sector_zscore_columns.
+    """
+    sectors, groups = np.unique(
+        np.array([sector_key(row.get('sector')) for row in company_data_list], dtype=str),
+        return_inverse=True)
+    values = pd.DataFrame(company_data_list, columns=list(columns)).apply(
+        pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    counts, means, stds = sector_statistics(values, groups, len(sectors))
+    return {'sectors': sectors.tolist(), 'columns': list(columns),
+            'counts': counts, 'means': means, 'stds': stds}
+
+
+def sector_zscore_columns(values, groups, higher_better, means, stds) -> np.ndarray:
+    """
+    Winsorised z-score of each value against its own group's mean/std,
+    clipped to +-ZSCORE_CLIP and mapped to 0 worst .. 1 best. NaN values,
+    single-company groups and zero-spread groups -> 0.5.
+    """
+    values = np.asarray(values, dtype=float)
+    group_means, group_stds = means[groups], stds[groups]
+    usable = ~np.isnan(values) & (group_stds > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.clip((values - group_means) / group_stds, -ZSCORE_CLIP, ZSCORE_CLIP)
+    z = np.where(higher_better, z, -z)
+    return np.where(usable, (z + ZSCORE_CLIP) / (2 * ZSCORE_CLIP), 0.5)
+
+
+def weighted_profile_scores(values, higher_better, weights, scoring='minmax',
+                            normalised=None) -> np.ndarray:
+    """
+    0-100 profile score per company: normalised metrics . weights / sum(weights).
+    scoring='percentile' normalises by percentile rank instead of min-max;
+    pre-normalised values (e.g. sector z-scores) can be passed directly.
+    """
+    weights = np.asarray(weights, dtype=float)
+    total_weight = weights.sum()
+    if total_weight <= 0:
+        return np.full(np.shape(values)[:-1], 50.0)
+    if normalised is None:
+        normalise = percentile_columns if scoring == 'percentile' else normalise_columns
+        normalised = normalise(values, higher_better)
+    return normalised @ weights / total_weight * 100.0
+
+
+class PercentileIndex:
+    """
+    Per-metric sorted arrays of the universe's values, so one ticker's
+    percentile is two bisects and a single-ticker update re-slots only that
+    ticker's values instead of rescoring everyone. Everyone else's
+    percentile follows automatically, because it is read off the index.
+    """
+
+    def __init__(self, metrics: dict):
+        # metric -> higher_better
+        self.metrics = dict(metrics)
+        self._sorted = {metric: [] for metric in self.metrics}
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, ticker):
+        return ticker in self._values
+
+    @classmethod
+    def from_rows(cls, rows, metrics: dict):
+        index = cls(metrics)
+        for row in rows:
+            index._values[row['ticker']] = {m: _valid_number(row.get(m)) for m in index.metrics}
+        for metric in index.metrics:
+            index._sorted[metric] = sorted(
+                v[metric] for v in index._values.values() if v[metric] is not None)
+        return index
+
+    def update(self, ticker, values: dict):
+        """Sets (or adds) a ticker's metric values; metrics not given keep their value."""
+        current = self._values.setdefault(ticker, {m: None for m in self.metrics})
+        for metric, value in values.items():
+            if metric not in self.metrics:
+                continue
+            value = _valid_number(value)
+            ordered = self._sorted[metric]
+            old = current[metric]
+            if old is not None:
+                del ordered[bisect.bisect_left(ordered, old)]
+            if value is not None:
+                bisect.insort(ordered, value)
+            current[metric] = value
+
+    def remove(self, ticker):
+        current = self._values.pop(ticker, None)
+        for metric, old in (current or {}).items():
+            if old is not None:
+                ordered = self._sorted[metric]
+                del ordered[bisect.bisect_left(ordered, old)]
+
+    def percentile(self, ticker, metric) -> float:
+        value = self._values[ticker][metric]
+        ordered = self._sorted[metric]
+        n = len(ordered)
+        if value is None or n < 2:
+            return 0.5
+        if self.metrics[metric]:
+            worse = bisect.bisect_left(ordered, value)
+        else:
+            worse = n - bisect.bisect_right(ordered, value)
+        return worse / (n - 1)
+
+    def score(self, ticker, weights: dict) -> float:
+        """0-100 weighted percentile score of one ticker, O(metrics * log n)."""
+        used = {m: w for m, w in weights.items() if m in self.metrics}
+        total_weight = sum(used.values())
+        if total_weight <= 0:
+            return 50.0
+        return sum(self.percentile(ticker, m) * w for m, w in used.items()) / total_weight * 100.0
+
+    def scores(self, weights: dict) -> dict:
+        """{ticker: score} for the whole universe, searchsorted per metric."""
+        tickers = list(self._values)
+        used = {m: w for m, w in weights.items() if m in self.metrics}
+        total_weight = sum(used.values())
+        if total_weight <= 0:
+            return {t: 50.0 for t in tickers}
+        totals = np.zeros(len(tickers))
+        for metric, weight in used.items():
+            ordered = np.asarray(self._sorted[metric], dtype=float)
+            n = len(ordered)
+            raw = np.array([self._values[t][metric] for t in tickers], dtype=float)
+            ranks = np.full(len(tickers), 0.5)
+            valid = ~np.isnan(raw)
+            if n >= 2:
+                if self.metrics[metric]:
+                    worse = np.searchsorted(ordered, raw[valid], side='left')
+                else:
+                    worse = n - np.searchsorted(ordered, raw[valid], side='right')
+                ranks[valid] = worse / (n - 1)
+            totals += ranks * weight
+        return dict(zip(tickers, (totals / total_weight * 100.0).tolist()))
+
+
+def _valid_number(value):
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(value) else value
+
+
+def select_top_k(scores, k, offset=0, tie_keys=None) -> np.ndarray:
+    """
+    Indices of rows offset..offset+k of the ranking by score (desc, NaN last),
+    ties broken by tie_keys (asc), then position, so pages never overlap.
+    Only the first offset+k rows are partitioned out and sorted.
+    """
+    scores = np.asarray(scores, dtype=float)
+    n = len(scores)
+    end = min(n, offset + k)
+    if k <= 0 or offset >= n:
+        return np.array([], dtype=int)
+    keyed = np.where(np.isnan(scores), -np.inf, scores)
+    if end < n:
+        # everything scoring >= the end-th best, so boundary ties are kept
+        threshold = -np.partition(-keyed, end - 1)[end - 1]
+        candidates = np.flatnonzero(keyed >= threshold)
+    else:
+        candidates = np.arange(n)
+    sort_keys = [candidates]
+    if tie_keys is not None:
+        sort_keys.append(np.asarray(tie_keys)[candidates])
+    sort_keys.append(-keyed[candidates])
+    order = candidates[np.lexsort(sort_keys)]
+    return order[offset:end]
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """Offset from a next_cursor value; ValueError if it is not one."""
+    try:
+        offset = int(json.loads(base64.urlsafe_b64decode(cursor.encode()))['offset'])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def build_page(companies, total, offset, limit) -> dict:
+    """Pagination envelope for one page of ranked companies."""
+    next_offset = offset + len(companies)
+    return {
+        'companies': companies,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'next_cursor': encode_cursor(next_offset) if next_offset < total else None,
+    }
+
+
+def page_of(rows, scores, limit, offset=0, tie_keys=None) -> dict:
+    """One page of rows ranked by scores, with pagination fields."""
+    picked = select_top_k(scores, limit, offset, tie_keys)
+    return build_page([rows[i] for i in picked], len(rows), offset, limit)
+
+
 def generate_recommendation_summary(
         metrics: dict,
         profile_config: dict) -> str:
@@ -79,11 +375,178 @@ def generate_recommendation_summary(
     return summary.strip()
 
 
+# metric -> (higher_better it applies to, weak below / strong below, strong above / weak above)
+SUMMARY_THRESHOLDS = {
+    'pe_ratio': (False, 15, 35),
+    'roe': (True, 0.08, 0.20),
+    'revenue_growth': (True, 0.03, 0.15),
+}
+
+
+@lru_cache(maxsize=64)
+def _summary_metrics(config_items: tuple) -> tuple:
+    """Top-3 weighted metrics for a profile, with their threshold rule (or None)."""
+    top = sorted(config_items, key=lambda item: item[1], reverse=True)[:3]
+    rules = []
+    for key, _, higher_better in top:
+        rule = SUMMARY_THRESHOLDS.get(key)
+        rules.append((key, rule if rule and rule[0] == higher_better else None))
+    return tuple(rules)
+
+
+def recommendation_summaries(rows: pd.DataFrame, profile_config: dict) -> list:
+    """
+    generate_recommendation_summary for every row of a (page) DataFrame:
+    top metrics are resolved once per profile, strength/caution flags are
+    vectorised comparisons, and text is only built for flagged rows.
+    """
+    config_items = tuple(
+        (key, cfg['weight'], cfg['higher_better'])
+        for key, cfg in profile_config.items() if key in rows.columns)
+    strengths = [[] for _ in range(len(rows))]
+    cautions = [[] for _ in range(len(rows))]
+    for key, rule in _summary_metrics(config_items):
+        if rule is None:
+            continue
+        higher_better, low, high = rule
+        values = pd.to_numeric(rows[key], errors='coerce').to_numpy(dtype=float)
+        if higher_better:
+            strong, weak = values > high, values < low
+        else:
+            strong, weak = values < low, values > high
+        label = key.replace('_', ' ').title().lower()
+        as_percent = 'growth' in key or 'yield' in key or 'roe' in key
+        for flags, bucket in ((strong, strengths), (weak, cautions)):
+            for i in np.flatnonzero(flags):
+                fmt_val = f"{values[i] * 100:.0f}%" if as_percent else f"{values[i]:.1f}"
+                bucket[i].append(f"{label} ({fmt_val})")
+
+    summaries = []
+    for row_strengths, row_cautions in zip(strengths, cautions):
+        summary = ""
+        if row_strengths:
+            summary += f"Strengths: {', '.join(row_strengths[:2])}. "
+        if row_cautions:
+            summary += f"Cautions: {', '.join(row_cautions[:1])}. "
+        summaries.append(summary.strip() or "Overall profile appears neutral based on key metrics.")
+    return summaries
+
+
+def _score_profile(goal, risk, company_data_list, sector, scoring='minmax', sector_stats=None):
+    """Filtered DataFrame with profile_score, plus the metric config used."""
+    profile_metrics_config = get_profile_metrics(goal, risk)
+    if not profile_metrics_config:
+        return None, None
+
+    df = pd.DataFrame(company_data_list)
+    if df.empty:
+        return None, None
+
+    if sector and sector.lower() != 'all' and 'sector' in df.columns:
+        df = df[df['sector'].str.lower() == sector.lower()].copy()
+        if df.empty:
+            return None, None
+
+    # Ensure metrics used for scoring are numeric
+    metrics_to_score = list(profile_metrics_config.keys())
+    for metric in metrics_to_score:
+        if metric in df.columns:
+            df[metric] = pd.to_numeric(df[metric], errors='coerce')
+        else:
+            logging.warning(
+                f"Metric '{metric}' needed for scoring not in data, ignoring.")
+            # Remove from config if not available
+            profile_metrics_config.pop(metric, None)
+
+    if not profile_metrics_config:  # Check if any metrics are left after filtering
+        logging.error(
+            "No valid metrics found in data for selected profile.")
+        return None, None
+
+    # One pass per metric column instead of per value
+    scored_metrics = [m for m in profile_metrics_config if m in df.columns]
+    values = df[scored_metrics].to_numpy(dtype=float)
+    higher_better = np.array([profile_metrics_config[m]['higher_better'] for m in scored_metrics])
+    normalised = None
+    if scoring == 'sector':
+        normalised = _sector_normalised(df, values, scored_metrics, higher_better, sector_stats)
+    df['profile_score'] = weighted_profile_scores(
+        values, higher_better,
+        np.array([profile_metrics_config[m]['weight'] for m in scored_metrics]),
+        scoring=scoring, normalised=normalised)
+    return df.reset_index(drop=True), profile_metrics_config
+
+
+def _sector_normalised(df, values, metrics, higher_better, sector_stats=None):
+    """Sector z-scores against sector_stats, or against the rows themselves."""
+    keys = df['sector'].map(sector_key) if 'sector' in df.columns else pd.Series([''] * len(df))
+    if sector_stats is None:
+        sectors, groups = np.unique(keys.to_numpy(dtype=str), return_inverse=True)
+        _, means, stds = sector_statistics(values, groups, len(sectors))
+        return sector_zscore_columns(values, groups, higher_better, means, stds)
+
+    # sectors/metrics the cached stats lack get NaN stats, i.e. score 0.5
+    sectors = sector_stats['sectors']
+    position = {s: i for i, s in enumerate(sectors)}
+    groups = keys.map(lambda k: position.get(k, len(sectors))).to_numpy(dtype=int)
+    nan_row = np.full((1, len(metrics)), np.nan)
+    columns = [sector_stats['columns'].index(m) if m in sector_stats['columns'] else None for m in metrics]
+
+    def pick(stat):
+        picked = np.column_stack(
+            [stat[:, c] if c is not None else np.full(len(sectors), np.nan) for c in columns]
+        ) if metrics else np.empty((len(sectors), 0))
+        return np.vstack([picked.reshape(len(sectors), len(metrics)), nan_row])
+
+    return sector_zscore_columns(values, groups, higher_better,
+                                 pick(sector_stats['means']), pick(sector_stats['stds']))
+
+
+def rank_companies_page(
+        goal: InvestmentGoal,
+        risk: RiskTolerance,
+        company_data_list: list,
+        sector: str = None,
+        limit: int = 20,
+        offset: int = 0,
+        scoring: str = 'minmax',
+        sector_stats: dict = None) -> dict:
+    """
+    Like rank_companies but returns one page ({'companies', 'total',
+    'offset', 'limit', 'next_cursor'}); only that page is sorted,
+    summarised and converted to dicts. scoring='percentile' ranks by
+    per-metric percentile instead of min-max, so one outlier cannot
+    compress everyone else's scores. scoring='sector' scores each company
+    against its own sector (sector_stats from compute_sector_stats, or
+    the rows passed in), so cross-sector rankings compare like with like.
+    """
+    empty = build_page([], 0, offset, limit)
+    if not company_data_list:
+        return empty
+    try:
+        df, profile_metrics_config = _score_profile(
+            goal, risk, company_data_list, sector, scoring, sector_stats)
+        if df is None:
+            return empty
+        tie_keys = df['ticker'].astype(str).to_numpy() if 'ticker' in df.columns else None
+        picked = select_top_k(df['profile_score'].to_numpy(), limit, offset, tie_keys)
+        page = df.iloc[picked].copy()
+        page['recommendation_summary'] = recommendation_summaries(page, profile_metrics_config)
+        return build_page(page.to_dict('records'), len(df), offset, limit)
+    except Exception as e:
+        logging.exception(f"Ranking calculation failed")
+        return empty
+
+
 def rank_companies(
         goal: InvestmentGoal,
         risk: RiskTolerance,
         company_data_list: list,
-        sector: str = None):
+        sector: str = None,
+        limit: int = None,
+        offset: int = 0,
+        scoring: str = 'minmax',
+        sector_stats: dict = None):
     """Calculates dynamic scores, adds summary, and ranks companies."""
     if not company_data_list:
         return []
@@ -92,68 +555,7 @@ def rank_companies(
         f"Goal={goal.value}, Risk={risk.value}, "
         f"Sector={sector or 'All'}"
     )
-    try:
-        profile_metrics_config = get_profile_metrics(goal, risk)
-        if not profile_metrics_config:
-            return []
-
-        df = pd.DataFrame(company_data_list)
-        if df.empty:
-            return []
-
-        if sector and sector.lower() != 'all' and 'sector' in df.columns:
-            df = df[df['sector'].str.lower() == sector.lower()].copy()
-            if df.empty:
-                return []
-
-        # Ensure metrics used for scoring are numeric
-        metrics_to_score = list(profile_metrics_config.keys())
-        for metric in metrics_to_score:
-            if metric in df.columns:
-                df[metric] = pd.to_numeric(df[metric], errors='coerce')
-            else:
-                logging.warning(
-                    f"Metric '{metric}' needed for scoring not in data, ignoring.")
-                # Remove from config if not available
-                profile_metrics_config.pop(metric, None)
-
-        if not profile_metrics_config:  # Check if any metrics are left after filtering
-            logging.error(
-                "No valid metrics found in data for selected profile.")
-            return []
-
-        # Recalculate value ranges based on filtered data
-        metric_value_ranges = {metric: df[metric].dropna().tolist(
-        ) for metric in profile_metrics_config if metric in df.columns}
-
-        df['profile_score'] = 0.0
-        total_weight_applied = 0.0
-        for metric, config in profile_metrics_config.items():
-            if metric in df.columns:
-                weight = config['weight']
-                higher_better = config['higher_better']
-                all_vals = metric_value_ranges.get(metric, [])
-                norm_scores = df[metric].apply(
-                    lambda x: normalise_metric(x, all_vals, higher_better))
-                df['profile_score'] += norm_scores.fillna(0.5) * weight
-                total_weight_applied += weight
-
-        if total_weight_applied > 0:
-            df['profile_score'] = (
-                df['profile_score'] / total_weight_applied) * 100.0
-        else:
-            df['profile_score'] = 50.0
-
-        df['recommendation_summary'] = df.apply(
-            lambda row: generate_recommendation_summary(
-                row.to_dict(), profile_metrics_config), axis=1)
-
-        ranked_df = df.sort_values(
-            by='profile_score',
-            ascending=False,
-            na_position='last')
-        return ranked_df.to_dict('records')
-
-    except Exception as e:
-        logging.exception(f"Ranking calculation failed")
-        return []
+    if limit is None:
+        limit = len(company_data_list)
+    return rank_companies_page(
+        goal, risk, company_data_list, sector, limit, offset, scoring, sector_stats)['companies']
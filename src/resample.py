@@ -0,0 +1,147 @@
+# resample.py
+# Time-bucket resampling of OHLCV bars, e.g. 1-minute bars into 5m / 15m /
+# 4h buckets or daily bars into weeks.
+#
+# Every ticker's bars are flattened into one set of columns, sorted by
+# (ticker, time), and each (ticker, bucket) run is reduced with NumPy
+# reduceat: first open, max high, min low, last close, summed volume and
+# trade count, and volume-weighted VWAP. Buckets are aligned to the UTC
+# epoch (weeks start on Monday); gaps simply produce no bucket and the last
+# bucket may be partial (the bar still forming).
+import re
+from datetime import datetime
+from operator import attrgetter
+
+import numpy as np
+import pandas as pd
+
+from src.prices_helper import bar_field, optional_bar_column
+
+BUCKET_UNIT_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+RESOLUTION_SECONDS = {'min': 60, 'hour': 3600, 'day': 86400}
+# 1970-01-01 was a Thursday, so weekly buckets are shifted 4 days to start on Mondays
+WEEK_ORIGIN_SECONDS = 4 * 86400
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+RESAMPLED_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap')
+
+
+def parse_bucket(bucket) -> int:
+    """Bucket width in seconds from '5m', '15m', '4h', '1d', '1w' (or seconds as an int)."""
+    if isinstance(bucket, (int, np.integer)) and not isinstance(bucket, bool):
+        seconds = int(bucket)
+    else:
+        match = re.fullmatch(r'\s*(\d+)\s*([mhdw])\s*', str(bucket or '').lower())
+        if not match:
+            raise ValueError(f"bucket must look like 5m, 15m, 4h, 1d or 1w, got {bucket!r}")
+        seconds = int(match.group(1)) * BUCKET_UNIT_SECONDS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError("bucket must be longer than zero")
+    return seconds
+
+
+def epoch_seconds(timestamps) -> np.ndarray:
+    """
+    UTC epoch seconds of bar timestamps. datetimes are read field by field
+    (ordinal day, h/m/s) and shifted by their zone's offset, looked up once
+    when every bar shares one fixed-offset zone (naive ones are taken as
+    UTC); several times faster than pandas parsing datetime objects.
+    Anything else goes through pd.to_datetime.
+    """
+    count = len(timestamps)
+    if not count or not all(issubclass(kind, datetime) for kind in set(map(type, timestamps))):
+        index = pd.DatetimeIndex(pd.to_datetime(list(timestamps), utc=True))
+        return index.as_unit('s').asi8
+    days = np.fromiter(map(datetime.toordinal, timestamps), dtype=np.int64, count=count)
+    hms = np.array(list(map(attrgetter('hour', 'minute', 'second'), timestamps)),
+                   dtype=np.int64).reshape(count, 3)
+    seconds = (days - EPOCH_ORDINAL) * 86400 + hms @ np.array([3600, 60, 1])
+
+    zones = set(map(attrgetter('tzinfo'), timestamps))
+    if zones == {None}:
+        return seconds
+    # utcoffset(None) is only defined for fixed-offset zones (UTC, +05:00, ...)
+    offset = next(iter(zones)).utcoffset(None) if len(zones) == 1 else None
+    if offset is not None:
+        seconds -= int(offset.total_seconds())
+    else:
+        offsets = list(map(datetime.utcoffset, timestamps))
+        seconds -= np.fromiter((o.total_seconds() if o else 0 for o in offsets),
+                               dtype=np.int64, count=count)
+    return seconds
+
+
+def bucket_starts(epoch_seconds, bucket_seconds) -> np.ndarray:
+    """Start (epoch seconds) of the bucket each timestamp falls in."""
+    origin = WEEK_ORIGIN_SECONDS if bucket_seconds % BUCKET_UNIT_SECONDS['w'] == 0 else 0
+    return (np.asarray(epoch_seconds) - origin) // bucket_seconds * bucket_seconds + origin
+
+
+def resample_columns(codes, epoch_seconds, columns, bucket_seconds) -> dict:
+    """
+    Reduces flat bar columns (any number of tickers, any order) into time
+    buckets. codes are int ticker ids per bar; columns maps each of
+    RESAMPLED_FIELDS to a float array (NaN vwap falls back to close).
+    Returns {'codes', 'bucket_start', field...} arrays, one entry per
+    non-empty (ticker, bucket), sorted by ticker then time.
+    """
+    codes = np.asarray(codes)
+    epoch_seconds = np.asarray(epoch_seconds, dtype=np.int64)
+    order = np.lexsort((epoch_seconds, codes))
+    codes, epoch_seconds = codes[order], epoch_seconds[order]
+    starts = bucket_starts(epoch_seconds, bucket_seconds)
+    if len(order) == 0:
+        return {'codes': codes, 'bucket_start': starts,
+                **{field: np.zeros(0) for field in RESAMPLED_FIELDS}}
+
+    new_group = np.empty(len(order), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (codes[1:] != codes[:-1]) | (starts[1:] != starts[:-1])
+    first = np.flatnonzero(new_group)
+    last = np.append(first[1:], len(order)) - 1
+
+    column = {field: np.asarray(columns[field], dtype=np.float64)[order] for field in RESAMPLED_FIELDS}
+    volume = np.nan_to_num(column['volume'])
+    bar_vwap = np.where(np.isnan(column['vwap']), column['close'], column['vwap'])
+    bucket_volume = np.add.reduceat(volume, first)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vwap = np.add.reduceat(bar_vwap * volume, first) / bucket_volume
+    # zero-volume buckets have no volume weights; use the last bar's vwap
+    vwap = np.where(bucket_volume > 0, vwap, bar_vwap[last])
+    return {
+        'codes': codes[first],
+        'bucket_start': starts[first],
+        'open': column['open'][first],
+        'high': np.maximum.reduceat(column['high'], first),
+        'low': np.minimum.reduceat(column['low'], first),
+        'close': column['close'][last],
+        'volume': bucket_volume,
+        'trade_count': np.add.reduceat(np.nan_to_num(column['trade_count']), first),
+        'vwap': vwap,
+    }
+
+
+def resample_bars(stock_data, bucket) -> dict:
+    """
+    {ticker: [bars]} -> {ticker: [bar dicts]} in time buckets of `bucket`
+    (see parse_bucket); all tickers are reduced in one pass. Bar dicts have
+    symbol, timestamp (the bucket start, UTC) and RESAMPLED_FIELDS.
+    """
+    bucket_seconds = parse_bucket(bucket)
+    tickers = list(stock_data)
+    all_bars = [bar for ticker in tickers for bar in stock_data[ticker]]
+    codes = np.repeat(np.arange(len(tickers)), [len(stock_data[t]) for t in tickers])
+    times = epoch_seconds(bar_field(all_bars, 'timestamp'))
+    columns = {field: optional_bar_column(all_bars, field) for field in RESAMPLED_FIELDS}
+    reduced = resample_columns(codes, times, columns, bucket_seconds)
+
+    bucket_times = pd.to_datetime(reduced['bucket_start'], unit='s', utc=True).to_pydatetime()
+    values = {field: reduced[field].tolist() for field in RESAMPLED_FIELDS}
+    bounds = np.searchsorted(reduced['codes'], np.arange(len(tickers) + 1))
+    resampled = {}
+    for code, ticker in enumerate(tickers):
+        begin, end = bounds[code], bounds[code + 1]
+        resampled[ticker] = [
+            {'symbol': ticker, 'timestamp': bucket_times[i],
+             **{field: values[field][i] for field in RESAMPLED_FIELDS}}
+            for i in range(begin, end)]
+    return resampled
@@ -0,0 +1,122 @@
+# response_formats.py
+# Encoders for columnar indicator results (see prices.get_indicator_columns).
+#
+# 'columnar' is plain JSON: one array per field, real nulls for NaN, encoded
+# once. 'msgpack' ships every column as its raw little-endian float64 buffer
+# (timestamps as int64 epoch milliseconds), so clients can wrap them in a
+# Float64Array without parsing numbers. 'arrow' is an Arrow IPC stream
+# (needs pyarrow). The default 'bars' format is left to the route as before.
+# Streamed price pages (prices.stream_prices) go out as NDJSON lines.
+import json
+
+import msgpack
+import numpy as np
+import pandas as pd
+
+from src.prices_helper import nullable_list
+
+RESPONSE_FORMATS = ('bars', 'columnar', 'msgpack', 'arrow')
+CONTENT_TYPES = {
+    'columnar': 'application/json',
+    'msgpack': 'application/x-msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def _epoch_ms(timestamps) -> np.ndarray:
+    if not len(timestamps):
+        return np.zeros(0, dtype='<i8')
+    index = pd.DatetimeIndex(pd.to_datetime(list(timestamps), utc=True))
+    return index.as_unit('ms').asi8.astype('<i8')
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else (None if value is None else str(value))
+
+
+def encode_columnar_json(result) -> bytes:
+    payload = {
+        'timestamp': _iso(result['timestamp']),
+        'stock_data': {
+            ticker: {
+                'timestamp': [_iso(t) for t in data['timestamp']],
+                'columns': {name: nullable_list(values) for name, values in data['columns'].items()},
+            }
+            for ticker, data in result['stock_data'].items()
+        },
+    }
+    return json.dumps(payload, allow_nan=False, separators=(',', ':')).encode()
+
+
+def _buffer(values, dtype) -> dict:
+    values = np.ascontiguousarray(values, dtype=dtype)
+    return {'dtype': dtype, 'length': len(values), 'data': values.tobytes()}
+
+
+def encode_msgpack(result) -> bytes:
+    payload = {
+        'timestamp': _iso(result['timestamp']),
+        'stock_data': {
+            ticker: {
+                'timestamp': _buffer(_epoch_ms(data['timestamp']), '<i8'),
+                'columns': {name: _buffer(values, '<f8') for name, values in data['columns'].items()},
+            }
+            for ticker, data in result['stock_data'].items()
+        },
+    }
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def encode_arrow(result) -> bytes:
+    """One record batch per ticker, columns symbol, timestamp (ms, UTC) and the fields."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("arrow format needs pyarrow installed on the server")
+    batches = []
+    for ticker, data in result['stock_data'].items():
+        arrays = {
+            'symbol': pa.array([ticker] * len(data['timestamp']), type=pa.string()),
+            'timestamp': pa.array(_epoch_ms(data['timestamp']), type=pa.timestamp('ms', tz='UTC')),
+        }
+        for name, values in data['columns'].items():
+            arrays[name] = pa.array(values, from_pandas=True)
+        batches.append(pa.RecordBatch.from_pydict(arrays))
+    sink = pa.BufferOutputStream()
+    # tickers can carry different indicator columns, so unify to one schema
+    schema = pa.unify_schemas([b.schema for b in batches]) if batches else pa.schema([])
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(_conform(pa, batch, schema))
+    return sink.getvalue().to_pybytes()
+
+
+def _conform(pa, batch, schema):
+    """The batch with the shared schema's column order, null columns for missing ones."""
+    columns = [batch.column(name) if name in batch.schema.names
+               else pa.nulls(batch.num_rows, type=schema.field(name).type)
+               for name in schema.names]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def encode_ndjson_line(payload) -> bytes:
+    """One NDJSON line: compact JSON, ISO timestamps, then a newline."""
+    return json.dumps(payload, default=_iso, allow_nan=False, separators=(',', ':')).encode() + b'\n'
+
+
+def encode_bars_ndjson(ticker, bars) -> bytes:
+    """A page of one ticker's bar dicts as {"symbol": ..., "bars": [...]}."""
+    return encode_ndjson_line({'symbol': ticker, 'bars': bars})
+
+
+ENCODERS = {
+    'columnar': encode_columnar_json,
+    'msgpack': encode_msgpack,
+    'arrow': encode_arrow,
+}
+
+
+def encode_indicator_result(result, response_format):
+    """(body bytes, content type) for a non-default response format."""
+    return ENCODERS[response_format](result), CONTENT_TYPES[response_format]
@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 import numpy as np
 
 
@@ -25,11 +26,8 @@ def score_metric(value, range_vals, lower_is_better=False):
         return 1.0 + 4.0 * ((value - min_val) / (max_val - min_val))
 
 
-def calculate_scores(metrics, goal="value", risk="moderate"):
-    """Calculates component and overall scores (1-5 scale) adjusted for goal and risk."""
-    scores = {}
-    comp_scores = {'Valuation': [], 'Health': [], 'Growth': []}
-
+def _score_ranges(goal, risk):
+    """Scoring ranges [min, max] per metric, adjusted for goal and risk."""
     # Define base scoring ranges
     ranges = {
         # Valuation
@@ -73,7 +71,11 @@ def calculate_scores(metrics, goal="value", risk="moderate"):
         ranges['debt_equity_ratio'] = [0.6, 2.0]  # More tolerant of debt
         ranges['revenue_growth'] = [0.1, 0.25]    # Higher growth expectations
         ranges['earnings_growth'] = [0.1, 0.25]   # Higher growth expectations
+    return ranges
+
 
+def _component_weights(goal):
+    """Valuation/health/growth weightings for the investment goal."""
     # Component weightings based on investment goal
     weightings = {
         'value': {'valuation': 0.5, 'health': 0.3, 'growth': 0.2},
@@ -84,6 +86,16 @@ def calculate_scores(metrics, goal="value", risk="moderate"):
     # Get the appropriate weightings for this goal
     weights = weightings.get(
         goal, {'valuation': 0.33, 'health': 0.33, 'growth': 0.33})
+    return weights
+
+
+def calculate_scores(metrics, goal="value", risk="moderate"):
+    """Calculates component and overall scores (1-5 scale) adjusted for goal and risk."""
+    scores = {}
+    comp_scores = {'Valuation': [], 'Health': [], 'Growth': []}
+
+    ranges = _score_ranges(goal, risk)
+    weights = _component_weights(goal)
 
     # Calculate individual scores (1-5 scale)
     # Valuation metrics (lower is better)
@@ -205,3 +217,140 @@ def calculate_scores(metrics, goal="value", risk="moderate"):
         f"{final_scores} with goal={goal}, risk={risk}"
     )
     return final_scores
+
+
+# --- Batch scoring -------------------------------------------------------
+# (score key, metric, component, lower_is_better), in calculate_scores order
+SCORE_COLUMNS = [
+    ('pe_score', 'pe_ratio', 'valuation', True),
+    ('ev_ebitda_score', 'ev_ebitda', 'valuation', True),
+    ('div_yield_score', 'dividend_yield', 'health', False),
+    ('payout_score', 'payout_ratio', 'health', True),
+    ('debt_equity_score', 'debt_equity_ratio', 'health', True),
+    ('current_ratio_score', 'current_ratio', 'health', False),
+    ('rev_growth_score', 'revenue_growth', 'growth', False),
+    ('earn_growth_score', 'earnings_growth', 'growth', False),
+    ('ocf_growth_score', 'ocf_growth', 'growth', False),
+]
+COMPONENTS = ['valuation', 'health', 'growth']
+# scores boosted x1.2 (capped at 5) for each goal
+GOAL_BOOSTED_SCORES = {
+    'value': {'pe_score', 'ev_ebitda_score'},
+    'income': {'div_yield_score', 'payout_score'},
+    'growth': {'rev_growth_score', 'earn_growth_score', 'ocf_growth_score'},
+}
+DEFAULT_COMPONENT_SCORE = 2.5
+
+
+def _boost_low_score(score):
+    """The graduated boost calculate_scores gives final scores under 4.0."""
+    if score < 4.0:
+        boost_factor = 1.0 + max(0, (4.0 - score) * 0.15)
+        return min(5.0, round(score * boost_factor, 2))
+    return score
+
+
+# bounded: goal/risk can come straight from a query string
+@lru_cache(maxsize=64)
+def compile_scoring_table(goal, risk):
+    """
+    The (goal, risk) scoring rules as arrays, built once per profile:
+    per-metric [min, max], direction and goal boost, component membership,
+    component weights, and the Python-float constants calculate_scores
+    produces when a whole component (or every component) is missing.
+    """
+    ranges = _score_ranges(goal, risk)
+    weights = _component_weights(goal)
+    boosted = GOAL_BOOSTED_SCORES.get(goal, set())
+    component_weights = tuple(weights[c] for c in COMPONENTS)
+    total_weight = sum(component_weights)
+    default_overall = round(
+        sum(DEFAULT_COMPONENT_SCORE * w for w in component_weights) / total_weight,
+        2) if total_weight else DEFAULT_COMPONENT_SCORE
+    return {
+        'metrics': [metric for _, metric, _, _ in SCORE_COLUMNS],
+        'lows': np.array([ranges[m][0] for _, m, _, _ in SCORE_COLUMNS], dtype=float),
+        'highs': np.array([ranges[m][1] for _, m, _, _ in SCORE_COLUMNS], dtype=float),
+        'lower_is_better': np.array([lib for _, _, _, lib in SCORE_COLUMNS]),
+        'boosted': np.array([key in boosted for key, _, _, _ in SCORE_COLUMNS]),
+        'component_columns': [
+            [j for j, (_, _, comp, _) in enumerate(SCORE_COLUMNS) if comp == c]
+            for c in COMPONENTS],
+        'component_weights': component_weights,
+        'total_weight': total_weight,
+        'default_component': _boost_low_score(DEFAULT_COMPONENT_SCORE),
+        'default_overall': _boost_low_score(default_overall),
+    }
+
+
+def score_matrix(values, table):
+    """
+    Scores an (n_companies, len(SCORE_COLUMNS)) matrix (NaN = missing) with
+    the compiled table. Returns {'valuation_score', 'health_score',
+    'growth_score', 'overall_score'} arrays, each op mirroring calculate_scores.
+    """
+    values = np.asarray(values, dtype=float)
+    lows, highs = table['lows'], table['highs']
+    lower_is_better = table['lower_is_better']
+
+    # clipped linear interpolation, 1-5
+    with np.errstate(invalid='ignore'):
+        ascending = 1.0 + 4.0 * ((values - lows) / (highs - lows))
+        descending = 1.0 + 4.0 * ((highs - values) / (highs - lows))
+        scores = np.where(
+            lower_is_better,
+            np.where(values <= lows, 5.0, np.where(values >= highs, 1.0, descending)),
+            np.where(values >= highs, 5.0, np.where(values <= lows, 1.0, ascending)))
+        scores = np.where(table['boosted'], np.minimum(5.0, scores * 1.2), scores)
+    present = ~np.isnan(values)
+
+    # component means, summed column by column like np.mean over the list
+    components = []
+    component_present = []
+    for columns in table['component_columns']:
+        total = np.zeros(len(values))
+        count = np.zeros(len(values))
+        for j in columns:
+            total = total + np.where(present[:, j], scores[:, j], 0.0)
+            count = count + present[:, j]
+        has_any = count > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.round(total / count, 2)
+        components.append(np.where(has_any, mean, DEFAULT_COMPONENT_SCORE))
+        component_present.append(has_any)
+
+    weighted_sum = np.zeros(len(values))
+    for component, weight in zip(components, table['component_weights']):
+        weighted_sum = weighted_sum + component * weight
+    if table['total_weight']:
+        overall = np.round(weighted_sum / table['total_weight'], 2)
+    else:
+        overall = np.full(len(values), DEFAULT_COMPONENT_SCORE)
+
+    def boost(score):
+        boost_factor = 1.0 + np.maximum(0, (4.0 - score) * 0.15)
+        return np.where(score < 4.0, np.minimum(5.0, np.round(score * boost_factor, 2)), score)
+
+    result = {}
+    for name, component, has_any in zip(COMPONENTS, components, component_present):
+        result[f"{name}_score"] = np.where(has_any, boost(component), table['default_component'])
+    any_component = np.logical_or.reduce(component_present)
+    result['overall_score'] = np.where(any_component, boost(overall), table['default_overall'])
+    return result
+
+
+def calculate_scores_batch(companies, goal="value", risk="moderate"):
+    """
+    calculate_scores for a whole list of metric dicts at once; returns the
+    score dicts in the same order with identical values. None/NaN metrics
+    count as missing.
+    """
+    if not companies:
+        return []
+    table = compile_scoring_table(goal, risk)
+    values = np.array(
+        [[np.nan if (v := company.get(metric)) is None else v for metric in table['metrics']]
+         for company in companies], dtype=float)
+    scored = score_matrix(values, table)
+    columns = {key: array.tolist() for key, array in scored.items()}
+    return [{key: columns[key][i] for key in columns} for i in range(len(companies))]
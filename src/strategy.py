@@ -4,13 +4,18 @@ import json
 from datetime import datetime, timezone
 import asyncio
 import logging
-import numpy as np
-#import talib
-#import talib.abstract
+try:
+    import talib
+except ImportError:
+    # only the candlestick, APO and Hilbert transform strategies need it
+    talib = None
 import websockets
 from src.config import ALPACA_PUBLIC_KEY, ALPACA_SECRET_KEY
+from src.indicator_kernels import (
+    ADX, BBANDS, DEMA, EMA, KAMA, MACD, MIDPOINT, MIDPRICE, MINUS_DI, PLUS_DI,
+    RSI, SAR, SMA, VWAP)
 from src.prices import get_prices
-from src.prices_helper import prepare_inputs
+from src.prices_helper import prepare_inputs, bars_to_arrays, LIVE_BAR_KEYS
 # due to limitations on a free alpaca plan
 # we can only work with live data on 30 tickers
 # supported_companies = ['AAPL', 'NVDA', 'MSFT', 'AMZN', 'META', 'GOOGL', 'BRK.B',
@@ -29,11 +34,10 @@ supported_currencies = [
 
 
 def SMA_MOMENTUM_strategy(data):
-    sma = talib.abstract.SMA
     # moving avg momentum strat
     if len(data['open']) > 20:
-        sma10 = sma(data, timeperiod=10)
-        sma20 = sma(data, timeperiod=20)
+        sma10 = SMA(data['close'], timeperiod=10)
+        sma20 = SMA(data['close'], timeperiod=20)
 
         if sma10[-1] > sma20[-1]:
             return 'BUY'
@@ -43,11 +47,9 @@ def SMA_MOMENTUM_strategy(data):
 
 
 def BBANDS_strategy(data):
-    bbands = talib.abstract.BBANDS
-
     if data is None or len(data['close']) < 20:
         return "HOLD"
-    upper, _, lower = bbands(data, timeperiod=20)
+    upper, _, lower = BBANDS(data['close'], timeperiod=20)
     if data['close'][-1] > upper[-1]:
         return "SELL"
     if data['close'][-1] < lower[-1]:
@@ -56,11 +58,10 @@ def BBANDS_strategy(data):
 
 
 def EMA_strategy(data):
-    ema = talib.abstract.EMA
     if data is None or len(data['close']) < 20:
         return "HOLD"
 
-    ema_res = ema(data['close'], timeperiod=30)
+    ema_res = EMA(data['close'], timeperiod=30)
     if data['close'][-1] > ema_res[-1] * 1.01:
         return "BUY"
     if data['close'][-1] < ema_res[-1] * 0.99:
@@ -75,8 +76,7 @@ def VWAP_strategy(data):
     if data is None or len(data['close']) < 20:
         return "HOLD"
 
-    typical_price = data['high'] + data['low'] + data['close']
-    vwap = np.sum(typical_price * data['volume']) / np.sum(data['volume'])
+    vwap = VWAP(data['high'], data['low'], data['close'], data['volume'])[-1]
 
     latest_close = data['close'][-1]
 
@@ -129,7 +129,7 @@ def CDLADVANCEBLOCK_strategy(data):
 def DEMA_strategy(data):
     if data is None or len(data['close']) < 20:
         return "HOLD"
-    dema = talib.DEMA(data["close"], timeperiod=30)
+    dema = DEMA(data["close"], timeperiod=30)
     if data['close'][-1] > dema[-1]:
         return "BUY"
     if data['close'][-1] < dema[-1]:
@@ -218,7 +218,7 @@ def CDLINNECK_strategy(data):
 def MACD_strategy(data):
     if data is None or len(data['close']) < 24:
         return "HOLD"
-    _, _, macdhist = talib.MACD(
+    _, _, macdhist = MACD(
         data['close'], fastperiod=12, slowperiod=26, signalperiod=9)
     if macdhist[-1] > 0:
         return "BUY"
@@ -230,7 +230,7 @@ def MACD_strategy(data):
 def RSI_strategy(data):
     if data is None or len(data['close']) < 15:
         return "HOLD"
-    rsi = talib.RSI(data['close'], timeperiod=14)
+    rsi = RSI(data['close'], timeperiod=14)
     if rsi[-1] < 30:  # Oversold threshold
         return "BUY"
     if rsi[-1] > 70:  # Overbought threshold
@@ -241,13 +241,13 @@ def RSI_strategy(data):
 def ADX_strategy(data):
     if data is None or len(data['close']) < 27:
         return "HOLD"
-    adx = talib.ADX(data['high'], data['low'], data['close'], timeperiod=14)
-    plus_di = talib.PLUS_DI(
+    adx = ADX(data['high'], data['low'], data['close'], timeperiod=14)
+    plus_di = PLUS_DI(
         data['high'],
         data['low'],
         data['close'],
         timeperiod=14)
-    minus_di = talib.MINUS_DI(
+    minus_di = MINUS_DI(
         data['high'],
         data['low'],
         data['close'],
@@ -326,7 +326,7 @@ def HT_TRENDLINE_strategy(data):
 def KAMA_strategy(data):
     if data is None or len(data['close']) < 30:
         return "HOLD"
-    kama = talib.KAMA(data["close"], timeperiod=30)
+    kama = KAMA(data["close"], timeperiod=30)
     if data['close'][-1] > kama[-1]:
         return "BUY"
     if data['close'][-1] < kama[-1]:
@@ -337,7 +337,7 @@ def KAMA_strategy(data):
 def MA_strategy(data):
     if data is None or len(data['close']) < 30:
         return "HOLD"
-    ma = talib.MA(data["close"], timeperiod=30, matype=0)
+    ma = SMA(data["close"], timeperiod=30)
     if data['close'][-1] > ma[-1]:
         return "BUY"
     if data['close'][-1] < ma[-1]:
@@ -348,7 +348,7 @@ def MA_strategy(data):
 def MIDPOINT_strategy(data):
     if data is None or len(data['close']) < 14:
         return "HOLD"
-    midpoint = talib.MIDPOINT(data["close"], timeperiod=14)
+    midpoint = MIDPOINT(data["close"], timeperiod=14)
     if data['close'][-1] > midpoint[-1]:
         return "BUY"
     if data['close'][-1] < midpoint[-1]:
@@ -359,7 +359,7 @@ def MIDPOINT_strategy(data):
 def MIDPRICE_strategy(data):
     if data is None or len(data['close']) < 14:
         return "HOLD"
-    midprice = talib.MIDPRICE(data["high"], data["low"], timeperiod=14)
+    midprice = MIDPRICE(data["high"], data["low"], timeperiod=14)
     if data['close'][-1] > midprice[-1]:
         return "BUY"
     if data['close'][-1] < midprice[-1]:
@@ -370,7 +370,7 @@ def MIDPRICE_strategy(data):
 def SAR_strategy(data):
     if data is None or len(data['close']) < 2:
         return "HOLD"
-    sar = talib.SAR(data["high"], data["low"], acceleration=0.02, maximum=0.2)
+    sar = SAR(data["high"], data["low"], acceleration=0.02, maximum=0.2)
     if data['close'][-1] > sar[-1]:
         return "BUY"
     if data['close'][-1] < sar[-1]:
@@ -663,36 +663,12 @@ def prepare_inputs_live(stock_bars):
     takes in a dictionary of stock bars. and formats them for inputting into the TAlib
     abstract function
 
-    :param stock bars: a dictionary [{open,high,low,close,volume}]
+    :param stock bars: a dictionary [{o,h,l,c,v}]
     :return: dict of ndarrays with the following keyys {open:[],high:[],low:[],close:[],volume:[]}
     """
 
     try:
-        # init everything
-        open = np.array([])
-        high = np.array([])
-        low = np.array([])
-        close = np.array([])
-        volume = np.array([])
-
-        for bar in stock_bars:
-            # init inputs dict
-            open = np.append(open, bar['o'])
-            high = np.append(high, bar['h'])
-            low = np.append(low, bar['l'])
-            close = np.append(close, bar['c'])
-            volume = np.append(volume, bar['v'])
-
-        # place into input dict
-        inputs = {
-            'open': np.array(open),
-            'high': np.array(high),
-            'low': np.array(low),
-            'close': np.array(close),
-            'volume': np.array(volume)
-        }
-
-        return inputs
+        return bars_to_arrays(stock_bars, LIVE_BAR_KEYS)
     except Exception as e:
         logging.error(f"Error: error processcing inputs for talib: %s", e)
         return
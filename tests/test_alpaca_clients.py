@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from src import alpaca_clients
+from src.alpaca_clients import (
+    fetch_bars_planned, get_historical_client, iter_bars_planned, plan_bar_requests)
+
+START = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    monkeypatch.setattr(alpaca_clients, '_CLIENTS', {})
+    monkeypatch.setattr(alpaca_clients, 'ALPACA_PUBLIC_KEY', 'key')
+    monkeypatch.setattr(alpaca_clients, 'ALPACA_SECRET_KEY', 'secret')
+
+
+def test_plan_chunks_fit_a_page_and_cover_the_range():
+    symbols = [f"S{i}" for i in range(250)]
+    end = START + timedelta(days=3)
+    plan = plan_bar_requests(symbols, 'min', START, end, page_bars=10000, max_symbols=100)
+    groups = []
+    for group, chunk_start, chunk_end in plan:
+        if group not in groups:
+            groups.append(group)
+        minutes = (chunk_end - chunk_start).total_seconds() / 60
+        assert minutes * len(group) <= 10000
+    assert [len(g) for g in groups] == [100, 100, 50]
+    for group in groups:
+        chunks = [(s, e) for g, s, e in plan if g == group]
+        assert chunks[0][0] == START and chunks[-1][1] == end
+        # inclusive ends stop a second short of the next chunk
+        assert all(e + timedelta(seconds=1) == s for (_, e), (s, _) in zip(chunks, chunks[1:]))
+
+
+def test_small_requests_are_one_chunk():
+    plan = plan_bar_requests(['AAPL', 'MSFT'], 'day', START, START + timedelta(days=365))
+    assert plan == [(['AAPL', 'MSFT'], START, START + timedelta(days=365))]
+
+
+def test_chunks_merge_in_time_order(clients):
+    seen = []
+
+    def fake_chunk(client, crypto, resolution, chunk):
+        group, start, end = chunk
+        seen.append(chunk)
+        # the first chunk finishes last
+        time.sleep(0.05 if start == START else 0)
+        return {symbol: [(symbol, start)] for symbol in group}
+
+    end = START + timedelta(days=10)
+    merged = fetch_bars_planned(['AAPL', 'MSFT'], 'min', START, end, fetch_chunk=fake_chunk)
+    starts = [chunk_start for _, chunk_start, _ in sorted(seen, key=lambda c: c[1])]
+    assert len(starts) > 1
+    assert merged['AAPL'] == [('AAPL', s) for s in starts]
+    assert merged['MSFT'] == [('MSFT', s) for s in starts]
+
+
+def test_iter_keeps_a_bounded_number_of_chunks_in_flight(clients):
+    started = []
+    fake_chunk = lambda client, crypto, resolution, chunk: started.append(chunk) or {'AAPL': [chunk[1]]}
+    end = START + timedelta(days=60)
+    pages = iter_bars_planned(['AAPL'], 'min', START, end, max_workers=3, fetch_chunk=fake_chunk)
+    chunk, result = next(pages)
+    assert result == {'AAPL': [START]}
+    # the first page is out after a window of three requests, not all of them
+    time.sleep(0.05)
+    assert len(started) == 3
+    assert len(plan_bar_requests(['AAPL'], 'min', START, end)) > 3
+    pages.close()
+
+
+def test_open_ended_requests_leave_the_last_chunk_open(clients):
+    seen = []
+    fake_chunk = lambda client, crypto, resolution, chunk: seen.append(chunk) or {}
+    fetch_bars_planned(['BTC/USD'], 'min', START, crypto=True, fetch_chunk=fake_chunk)
+    ends = [end for _, _, end in sorted(seen, key=lambda c: c[1])]
+    assert ends[-1] is None and None not in ends[:-1]
+
+
+def test_clients_are_reused_per_market(clients):
+    stocks = get_historical_client()
+    assert get_historical_client() is stocks
+    assert get_historical_client(crypto=True) is not stocks
+    adapter = stocks._session.get_adapter('https://data.alpaca.markets')
+    assert adapter._pool_maxsize == alpaca_clients.MAX_WORKERS
@@ -0,0 +1,203 @@
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+import pytest
+from src.profiles import InvestmentGoal, RiskTolerance
+from src.ranking_engine import rank_companies
+from src.data_layer.ingestion import ensure_db_table_exists
+from src.data_layer.backends import (
+    SQLiteMetricsBackend, PostgresMetricsBackend, percentile_weights
+)
+from src.data_layer.data_version import CHANGE_LOG_TABLE_NAME, VERSION_TABLE_NAME
+
+ROWS = [
+    # ticker, sector, pe_ratio, dividend_yield, roe
+    ("AAA", "Technology", 10.0, 0.04, 0.30),
+    ("BBB", "Technology", 20.0, 0.02, 0.20),
+    ("CCC", "Technology", 30.0, None, 0.10),
+    ("DDD", "Energy", 15.0, 0.05, None),
+]
+
+
+def insert_rows(conn):
+    conn.executemany(
+        """INSERT INTO stock_metrics_cache (ticker, company_name, sector, pe_ratio, dividend_yield, roe)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        [(t, t, s, pe, dy, roe) for t, s, pe, dy, roe in ROWS])
+    conn.commit()
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    ensure_db_table_exists(conn)
+    insert_rows(conn)
+    return conn
+
+
+def test_weights_skip_metrics_the_store_lacks():
+    weights = percentile_weights(InvestmentGoal.VALUE, RiskTolerance.MODERATE, {'pe_ratio'})
+    assert list(weights) == ['pe_ratio']
+    assert weights['pe_ratio'][1] is False
+
+
+def test_sqlite_percentile_rank_orders_by_profile(conn):
+    ranked = SQLiteMetricsBackend().rank_by_percentile(
+        InvestmentGoal.VALUE, RiskTolerance.MODERATE, conn=conn, limit=10)['companies']
+    assert [r['ticker'] for r in ranked] == ["AAA", "DDD", "BBB", "CCC"]
+    # cheapest P/E (1.0, weight 0.4) but middle yield (0.5, weight 0.2)
+    assert ranked[0]['profile_score'] == pytest.approx((0.4 * 1.0 + 0.2 * 0.5) / 0.6 * 100)
+    assert all(0.0 <= r['profile_score'] <= 100.0 for r in ranked)
+
+
+def test_sqlite_percentile_rank_within_sector_and_limit(conn):
+    ranked = SQLiteMetricsBackend().rank_by_percentile(
+        InvestmentGoal.VALUE, RiskTolerance.MODERATE, sector_filter="technology",
+        conn=conn, limit=2)
+    assert [r['ticker'] for r in ranked['companies']] == ["AAA", "BBB"]
+    assert ranked['total'] == 3 and ranked['next_cursor'] is not None
+    assert '_total' not in ranked['companies'][0]
+
+
+def test_sqlite_percentile_rank_page_past_the_end_keeps_total(conn):
+    page = SQLiteMetricsBackend().rank_by_percentile(
+        InvestmentGoal.VALUE, RiskTolerance.MODERATE, conn=conn, limit=2, offset=10)
+    assert page['companies'] == [] and page['total'] == 4 and page['next_cursor'] is None
+
+
+def test_percentile_rank_agrees_with_ranking_engine_order(conn):
+    rows = [dict(zip(("ticker", "sector", "pe_ratio", "dividend_yield", "roe"), r)) for r in ROWS]
+    for row in rows:
+        row['company_name'] = row['ticker']
+    engine = [r['ticker'] for r in rank_companies(
+        InvestmentGoal.INCOME, RiskTolerance.MODERATE, rows)]
+    ranked = SQLiteMetricsBackend().rank_by_percentile(
+        InvestmentGoal.INCOME, RiskTolerance.MODERATE, conn=conn, limit=10)['companies']
+    # the extreme picks agree; middle positions may differ between min-max and percentiles
+    assert ranked[0]['ticker'] == engine[0]
+    assert ranked[-1]['ticker'] == engine[-1]
+
+
+
+@pytest.mark.parametrize("goal", list(InvestmentGoal))
+def test_engine_percentile_scoring_matches_store(conn, goal):
+    # every store column, so all-NULL metrics count as 0.5 on both sides
+    cursor = conn.execute("SELECT * FROM stock_metrics_cache")
+    names = [d[0] for d in cursor.description]
+    rows = [dict(zip(names, r)) for r in cursor.fetchall()]
+    engine = rank_companies(goal, RiskTolerance.MODERATE, rows, scoring='percentile')
+    ranked = SQLiteMetricsBackend().rank_by_percentile(
+        goal, RiskTolerance.MODERATE, conn=conn, limit=10)['companies']
+    assert [r['ticker'] for r in engine] == [r['ticker'] for r in ranked]
+    assert [r['profile_score'] for r in engine] == \
+        pytest.approx([r['profile_score'] for r in ranked])
+
+@pytest.fixture
+def pg_backend():
+    dsn = os.getenv("TEST_POSTGRES_DSN")
+    if not dsn:
+        pytest.skip("TEST_POSTGRES_DSN not set")
+    backend = PostgresMetricsBackend(dsn, minconn=1, maxconn=2)
+    with backend.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS stock_metrics_cache, metrics_data_version, metrics_change_log")
+    yield backend
+    backend.close()
+
+
+def test_postgres_upsert_and_rank(pg_backend):
+    rows = [{'ticker': t, 'company_name': t, 'sector': s, 'pe_ratio': pe,
+             'dividend_yield': dy, 'roe': roe, 'field_fetched_at': '{"pe_ratio": "2025-01-01"}'}
+            for t, s, pe, dy, roe in ROWS]
+    assert pg_backend.upsert_rows(rows) == 4
+    # partial refresh keeps untouched columns and merges stamps
+    assert pg_backend.upsert_rows([{'ticker': 'AAA', 'pe_ratio': 11.0,
+                                    'field_fetched_at': '{"roe": "2025-02-01"}'}]) == 1
+    stored = pg_backend.get_metrics_for_comparison(['AAA'])[0]
+    assert stored['pe_ratio'] == 11.0 and stored['roe'] == 0.30
+    assert '"pe_ratio"' in stored['field_fetched_at'] and '"roe"' in stored['field_fetched_at']
+    # every upsert is versioned in the same store
+    assert pg_backend.get_data_version()[0] == 2
+    assert pg_backend.get_changed_tickers(1) == ['AAA']
+    assert sorted(pg_backend.get_changed_tickers(0)) == ["AAA", "BBB", "CCC", "DDD"]
+
+    ranked = pg_backend.rank_by_percentile(InvestmentGoal.VALUE, RiskTolerance.MODERATE, limit=10)
+    assert [r['ticker'] for r in ranked['companies']] == ["AAA", "DDD", "BBB", "CCC"]
+    assert ranked['total'] == 4
+    assert len(pg_backend.get_all_metrics_for_ranking("Energy")) == 1
+
+
+class FreshSchemaCursor:
+    """psycopg2-style cursor over an empty database: using a table before creating it fails."""
+    TABLES = ('stock_metrics_cache', VERSION_TABLE_NAME, CHANGE_LOG_TABLE_NAME)
+
+    def __init__(self, created, statements):
+        self.created, self.statements = created, statements
+        self.description = []
+        self._one = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        created = re.match(r"\s*CREATE (?:TEMP )?TABLE IF NOT EXISTS (\w+)", sql)
+        if created:
+            self.created.add(created.group(1))
+        missing = [t for t in self.TABLES if t not in self.created and re.search(rf"\b{t}\b", sql)]
+        if missing:
+            raise RuntimeError(f'relation "{missing[0]}" does not exist')
+        self.statements.append(sql)
+        self._one = (1,) if 'RETURNING' in sql else (None,) if 'MIN(' in sql else None
+
+    def executemany(self, sql, seq):
+        self.execute(sql)
+
+    def copy_expert(self, sql, buf):
+        self.execute(sql)
+
+    def fetchone(self):
+        return self._one
+
+    def fetchall(self):
+        return []
+
+
+class FreshSchemaConnection:
+    def __init__(self):
+        self.created, self.statements = set(), []
+
+    def cursor(self):
+        return FreshSchemaCursor(self.created, self.statements)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def fresh_pg_backend():
+    backend = PostgresMetricsBackend.__new__(PostgresMetricsBackend)
+    backend._table_ready = False
+    conn = FreshSchemaConnection()
+
+    @contextmanager
+    def connection():
+        yield conn
+
+    backend.connection = connection
+    return backend, conn
+
+
+def test_postgres_version_reads_on_a_fresh_schema(fresh_pg_backend):
+    backend, _ = fresh_pg_backend
+    assert backend.get_data_version() == (0, None)
+    assert backend.get_changed_tickers(0) == []
+
+
+def test_postgres_first_upsert_creates_version_tables(fresh_pg_backend):
+    backend, conn = fresh_pg_backend
+    assert backend.upsert_rows([{'ticker': 'AAA', 'pe_ratio': 10.0}]) == 1
+    assert {VERSION_TABLE_NAME, CHANGE_LOG_TABLE_NAME} <= conn.created
+    assert any(sql.lstrip().startswith(f"INSERT INTO {VERSION_TABLE_NAME}") for sql in conn.statements)
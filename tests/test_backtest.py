@@ -0,0 +1,81 @@
+import sqlite3
+import numpy as np
+import pytest
+from src.backtest import (
+    profile_score_panel, top_k_returns, forward_returns, run_backtests, BACKTEST_PROFILES
+)
+from src.data_layer.metrics_history import record_snapshot, get_history_panel, get_metrics_as_of
+from src.profiles import InvestmentGoal, RiskTolerance
+from src.ranking_engine import rank_companies
+from src.screener_scoring import calculate_scores_batch
+
+DATES = ['2024-01-02', '2024-02-01', '2024-03-01', '2024-04-01', '2024-05-01']
+
+
+@pytest.fixture
+def conn():
+    rng = np.random.default_rng(5)
+    conn = sqlite3.connect(":memory:")
+    for i, day in enumerate(DATES):
+        rows = []
+        for t in range(25):
+            # some tickers skip snapshots, so as-of rows are carried forward
+            if (t + i) % 6 == 0 and i > 0:
+                continue
+            rows.append({
+                'ticker': f"T{t:02d}", 'company_name': f"Co {t}", 'sector': 'Tech' if t % 2 else 'Energy',
+                'current_price': float(rng.uniform(10, 200)),
+                'pe_ratio': None if t % 7 == 0 else float(rng.uniform(5, 40)),
+                'dividend_yield': float(rng.uniform(0, 0.06)),
+                'revenue_growth': float(rng.uniform(-0.1, 0.3)),
+                'earnings_growth': float(rng.uniform(-0.1, 0.3)),
+                'debt_equity_ratio': float(rng.uniform(0, 3)),
+            })
+        record_snapshot(rows, day, conn=conn)
+    return conn
+
+
+def test_panel_matches_as_of_rows(conn):
+    panel = get_history_panel(conn=conn)
+    for i, day in enumerate(panel['dates']):
+        as_of = {r['ticker']: r for r in get_metrics_as_of(day, conn=conn)}
+        listed = [t for t, ok in zip(panel['tickers'], panel['listed'][i]) if ok]
+        assert sorted(as_of) == listed
+        j, c = panel['tickers'].index('T03'), panel['columns'].index('pe_ratio')
+        assert panel['values'][i, j, c] == pytest.approx(as_of['T03']['pe_ratio'])
+
+
+@pytest.mark.parametrize("goal,risk", BACKTEST_PROFILES[::4])
+def test_scores_match_app_scoring_per_date(conn, goal, risk):
+    panel = get_history_panel(conn=conn)
+    profile = profile_score_panel(panel, goal, risk, 'profile')
+    screener = profile_score_panel(panel, goal, risk, 'screener')
+    for i, day in enumerate(panel['dates']):
+        rows = get_metrics_as_of(day, conn=conn)
+        ranked = rank_companies(InvestmentGoal(goal), RiskTolerance(risk), rows)
+        expected = {r['ticker']: r['profile_score'] for r in ranked}
+        got = {t: profile[i, j] for j, t in enumerate(panel['tickers']) if t in expected}
+        assert got == pytest.approx(expected)
+        overall = {r['ticker']: s['overall_score']
+                   for r, s in zip(rows, calculate_scores_batch(rows, goal, risk))}
+        got = {t: screener[i, j] for j, t in enumerate(panel['tickers']) if t in overall}
+        assert got == pytest.approx(overall)
+
+
+def test_top_k_returns_skips_ineligible_and_breaks_ties_by_order():
+    scores = np.array([[3.0, 3.0, np.nan, 1.0], [1.0, 2.0, 3.0, 4.0]])
+    returns = np.array([[0.1, 0.2, 0.5, np.nan], [0.0, 0.1, np.nan, 0.3]])
+    portfolio, benchmark, order, picked = top_k_returns(scores, returns, 2)
+    assert order[0].tolist() == [0, 1]
+    assert portfolio.tolist() == pytest.approx([0.15, 0.2])
+    assert benchmark.tolist() == pytest.approx([0.15, 0.4 / 3])
+    assert forward_returns(np.array([[10.0], [11.0]]))[0, 0] == pytest.approx(0.1)
+
+
+def test_process_pool_matches_in_process(conn):
+    profiles = BACKTEST_PROFILES[:3]
+    serial = run_backtests(profiles, top_k=5, max_workers=1, conn=conn)
+    pooled = run_backtests(profiles, top_k=5, max_workers=2, conn=conn)
+    assert serial == pooled
+    assert [len(r['periods']) for r in serial] == [len(DATES) - 1] * 3
+    assert all(len(p['holdings']) == 5 for r in serial for p in r['periods'])
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from src.data_layer.bar_store import (
+    add_range, load_bars, missing_ranges, read_bars, write_bars, bar_records)
+
+START = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+
+
+class FakeAlpaca:
+    """Serves minute bars for [start, end) and records every request."""
+
+    def __init__(self, version=0):
+        self.calls = []
+        self.version = version
+
+    def __call__(self, symbols, start, end):
+        self.calls.append((tuple(symbols), start, end))
+        minutes = int((end - start).total_seconds() // 60)
+        return {symbol: [{'symbol': symbol, 'timestamp': start + timedelta(minutes=i),
+                          'open': 1.0 + i, 'high': 2.0 + i, 'low': 0.5 + i,
+                          'close': 1.5 + i + self.version, 'volume': 100.0,
+                          'trade_count': 3.0, 'vwap': None}
+                         for i in range(minutes)]
+                for symbol in symbols}
+
+
+def test_missing_and_added_ranges():
+    coverage = [[10, 20], [30, 40]]
+    assert missing_ranges(coverage, 0, 50) == [(0, 10), (20, 30), (40, 50)]
+    assert missing_ranges(coverage, 12, 18) == []
+    assert missing_ranges([], 5, 6) == [(5, 6)]
+    assert add_range(coverage, 20, 30) == [[10, 40]]
+    assert add_range(coverage, 45, 50) == [[10, 20], [30, 40], [45, 50]]
+
+
+def test_repeat_request_is_served_from_disk(tmp_path):
+    fetch = FakeAlpaca()
+    now = START + timedelta(hours=2)
+    first = load_bars(['AAPL', 'MSFT'], 'min', START, fetch, root=tmp_path, now=now)
+    # both symbols share the gap, so one API call
+    assert len(fetch.calls) == 1 and fetch.calls[0][0] == ('AAPL', 'MSFT')
+    assert len(first['AAPL']) == 120
+
+    again = load_bars(['AAPL', 'MSFT'], 'min', START, fetch, root=tmp_path,
+                      now=now + timedelta(seconds=20))
+    assert len(fetch.calls) == 1
+    assert again['AAPL'] == first['AAPL']
+    assert again['AAPL'][0]['vwap'] is None
+
+
+def test_only_head_and_tail_gaps_are_fetched(tmp_path):
+    fetch = FakeAlpaca()
+    now = START + timedelta(hours=1)
+    load_bars(['AAPL'], 'min', START, fetch, root=tmp_path, now=now)
+    later = now + timedelta(minutes=30)
+    bars = load_bars(['AAPL'], 'min', START - timedelta(minutes=45), fetch, root=tmp_path, now=later)
+    head, tail = sorted(fetch.calls[1:], key=lambda call: call[1])
+    assert (head[1], head[2]) == (START - timedelta(minutes=45), START)
+    # the tail restarts after the last settled bar of the previous fetch
+    assert (tail[1], tail[2]) == (now - timedelta(minutes=2), later)
+    times = [bar['timestamp'] for bar in bars['AAPL']]
+    assert times == [START - timedelta(minutes=45) + timedelta(minutes=i) for i in range(135)]
+
+
+def test_just_closed_bar_is_not_frozen(tmp_path):
+    now = START + timedelta(hours=1, seconds=5)
+    load_bars(['AAPL'], 'min', START, FakeAlpaca(), root=tmp_path, now=now)
+    # the 15:29 bar closed 5s before the first fetch; a late print amends it
+    amended = FakeAlpaca(version=1)
+    later = now + timedelta(minutes=5)
+    bars = load_bars(['AAPL'], 'min', START, amended, root=tmp_path, now=later)['AAPL']
+    refetched_from = amended.calls[0][1]
+    assert refetched_from <= START + timedelta(minutes=59)
+    offset = int((START + timedelta(minutes=59) - refetched_from).total_seconds() // 60)
+    assert bars[59]['close'] == 1.5 + offset + amended.version
+
+
+def test_explicit_past_window_and_refetch_overwrites(tmp_path):
+    end = START + timedelta(minutes=30)
+    load_bars(['SPY'], 'min', START, FakeAlpaca(), end=end, root=tmp_path, now=START + timedelta(days=1))
+    newer = bar_records(FakeAlpaca(version=10)(['SPY'], START, START + timedelta(minutes=5))['SPY'])
+    write_bars('SPY', 'min', newer, root=tmp_path)
+    stored = read_bars('SPY', 'min', 0, 2**40, root=tmp_path)
+    assert len(stored) == 30
+    assert np.all(np.diff(stored['t']) == 60)
+    np.testing.assert_allclose(stored['close'][:5], np.arange(5) + 11.5)
+    np.testing.assert_allclose(stored['close'][5:], np.arange(5, 30) + 1.5)
+    # only the current generation of the data file is kept
+    assert len(list((tmp_path / 'min').glob('SPY-*.npy'))) == 1
+
+
+def test_empty_ranges_count_as_covered(tmp_path):
+    fetch = FakeAlpaca()
+    quiet = lambda symbols, start, end: fetch(symbols, start, start) or {}
+    end = START + timedelta(hours=1)
+    now = START + timedelta(days=1)
+    assert load_bars(['BTC/USD'], 'hour', START, quiet, end=end, root=tmp_path, now=now) == {'BTC/USD': []}
+    load_bars(['BTC/USD'], 'hour', START, quiet, end=end, root=tmp_path, now=now)
+    assert len(fetch.calls) == 1
+    assert (tmp_path / 'hour' / 'BTC_USD.json').exists()
+
+
+@pytest.mark.parametrize("resolution", ["min", "week"])
+def test_unknown_resolution_uses_minute_store(tmp_path, resolution):
+    load_bars(['AAPL'], resolution, START, FakeAlpaca(), end=START + timedelta(minutes=3),
+              root=tmp_path, now=START + timedelta(days=1))
+    assert len(read_bars('AAPL', 'min', 0, 2**40, root=tmp_path)) == 3
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from src.custom_profiles import (
+    validate_custom_profile, profile_hash, compile_custom_profile,
+    score_custom_matrix, rank_custom_profile
+)
+from src.ranking_engine import weighted_profile_scores
+
+PROFILE = {
+    'name': 'Cheap payers',
+    'metrics': {
+        'pe_ratio': {'weight': 2, 'higher_better': False},
+        'dividend_yield': {'weight': 1},
+    },
+}
+
+
+@pytest.mark.parametrize("payload,message", [
+    ({'metrics': {'pe_ratio': {'weight': 1}}}, "name"),
+    ({'name': 'x', 'metrics': {}}, "metrics"),
+    ({'name': 'x', 'metrics': {'website': {'weight': 1}}}, "Cannot score"),
+    ({'name': 'x', 'metrics': {'pe_ratio': {'weight': 0}}}, "> 0"),
+    ({'name': 'x', 'metrics': {'pe_ratio': {'weight': 'heavy'}}}, "number"),
+    ({'name': 'x', 'metrics': {'pe_ratio': {'weight': 1, 'range': [30, 5]}}}, "below"),
+    ({'name': 'x', 'metrics': {'pe_ratio': {'weight': 1, 'higher_better': 'no'}}}, "true or false"),
+    ({'name': 'x', 'normalise': 'zscore', 'metrics': {'pe_ratio': {'weight': 1}}}, "normalise"),
+    (['pe_ratio'], "JSON object"),
+])
+def test_invalid_profiles_are_rejected(payload, message):
+    with pytest.raises(ValueError, match=message):
+        validate_custom_profile(payload)
+
+
+def test_hash_and_compiled_table_ignore_order_and_name():
+    profile = validate_custom_profile(PROFILE)
+    reordered = validate_custom_profile({
+        'name': 'Renamed',
+        'metrics': {'dividend_yield': {'weight': 1.0, 'higher_better': True},
+                    'pe_ratio': {'higher_better': False, 'weight': 2.0}},
+    })
+    assert profile_hash(profile) == profile_hash(reordered)
+    assert compile_custom_profile(profile) is compile_custom_profile(reordered)
+    changed = validate_custom_profile({**PROFILE, 'normalise': 'percentile'})
+    assert profile_hash(changed) != profile_hash(profile)
+
+
+def test_unranged_profile_scores_like_builtin_kernel():
+    rng = np.random.default_rng(11)
+    values = rng.uniform(0, 40, (200, 2))
+    values[rng.random((200, 2)) < 0.1] = np.nan
+    compiled = compile_custom_profile(validate_custom_profile(PROFILE))
+    # compiled metrics are sorted: dividend_yield, pe_ratio
+    expected = weighted_profile_scores(values, np.array([True, False]), np.array([1.0, 2.0]))
+    assert score_custom_matrix(values, compiled) == pytest.approx(expected)
+
+
+def test_ranges_clip_and_flip():
+    compiled = compile_custom_profile(validate_custom_profile({
+        'name': 'PE band',
+        'metrics': {'pe_ratio': {'weight': 1, 'higher_better': False, 'range': [10, 20]}},
+    }))
+    values = np.array([[5.0], [10.0], [15.0], [20.0], [99.0], [np.nan]])
+    assert score_custom_matrix(values, compiled).tolist() == [100.0, 100.0, 50.0, 0.0, 0.0, 50.0]
+
+
+def test_rank_custom_profile_pages_within_sector():
+    companies = [{'ticker': f"T{i}", 'sector': 'Energy' if i % 2 else 'Technology',
+                  'pe_ratio': float(10 + i), 'dividend_yield': 0.01 * (i % 3)}
+                 for i in range(12)]
+    page = rank_custom_profile(validate_custom_profile(PROFILE), companies,
+                               sector='technology', limit=4)
+    assert page['total'] == 6
+    assert len(page['companies']) == 4
+    assert all(c['sector'] == 'Technology' for c in page['companies'])
+    scores = [c['profile_score'] for c in page['companies']]
+    assert scores == sorted(scores, reverse=True)
+    assert page['next_cursor'] is not None
@@ -0,0 +1,72 @@
+import math
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from src.downsample import (
+    downsample_bars, downsample_columns, lttb_indices, minmax_indices)
+from src.prices import indicator_columns
+
+START = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+
+
+def reference_lttb(x, y, threshold):
+    """LTTB as originally written: one bucket at a time, floor-sized buckets."""
+    n = len(y)
+    every = (n - 2) / (threshold - 2)
+    kept, out = 0, [0]
+    for i in range(threshold - 2):
+        begin, end = int(math.floor(i * every)) + 1, int(math.floor((i + 1) * every)) + 1
+        if i < threshold - 3:
+            next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+            mean_x, mean_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            mean_x, mean_y = x[-1], y[-1]
+        area = np.abs((x[kept] - mean_x) * (y[begin:end] - y[kept])
+                      - (x[kept] - x[begin:end]) * (mean_y - y[kept]))
+        kept = begin + int(np.argmax(area))
+        out.append(kept)
+    return out + [n - 1]
+
+
+def make_bars(n, seed=0):
+    close = 100 + np.random.default_rng(seed).normal(0, 1, n).cumsum()
+    return [{'symbol': 'AAPL', 'timestamp': START + timedelta(minutes=i), 'open': c, 'high': c + 1,
+             'low': c - 1, 'close': c, 'volume': 1000.0, 'trade_count': 10.0, 'vwap': c}
+            for i, c in enumerate(close.tolist())]
+
+
+@pytest.mark.parametrize("n,threshold", [(1000, 100), (12345, 777), (50, 10)])
+def test_lttb_matches_reference(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.uniform(0, 1e6, n))
+    y = rng.normal(0, 1, n).cumsum()
+    assert lttb_indices(x, y, threshold).tolist() == reference_lttb(x - x[0], y, threshold)
+
+
+def test_minmax_keeps_extremes_and_ends():
+    y = np.random.default_rng(1).normal(0, 1, 10_001).cumsum()
+    y[5000] = 1e3
+    indices = minmax_indices(y, 100)
+    assert len(indices) <= 100
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 5000 in indices and int(np.argmin(y)) in indices
+
+
+def test_short_series_are_untouched():
+    bars = make_bars(10)
+    assert downsample_bars(bars, 10) is bars
+    assert minmax_indices(np.arange(5.0), 10).tolist() == list(range(5))
+
+
+@pytest.mark.parametrize("method", ['lttb', 'minmax'])
+def test_bars_and_columns_pick_the_same_rows(method):
+    bars = make_bars(2000)
+    kept = downsample_bars(bars, 200, method)
+    assert 100 < len(kept) <= 200
+    assert kept[0] is bars[0] and kept[-1] is bars[-1]
+    data = indicator_columns(bars, [])
+    thinned = downsample_columns(data, 200, method)
+    assert thinned['timestamp'] == [bar['timestamp'] for bar in kept]
+    for name, values in thinned['columns'].items():
+        np.testing.assert_array_equal(values, [bar[name] for bar in kept])
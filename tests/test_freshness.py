@@ -0,0 +1,143 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from functools import partial
+import pytest
+import src.data_layer.ingestion as ingestion
+from src.data_layer.metrics_history import get_metrics_as_of
+from src.data_layer.pipeline import run_pipeline
+from src.data_layer.ingestion import FMP_SOURCE, YAHOO_SOURCE
+from src.data_layer.freshness import plan_refresh, field_timestamps
+
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.sqlite"
+
+    def connect():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr(ingestion, "get_sqlite_connection", connect)
+    conn = connect()
+    ingestion.ensure_db_table_exists(conn)
+    conn.close()
+    return path
+
+
+def insert(conn, ticker, age_hours_by_group, requests=0):
+    stamps = {}
+    for group, hours in age_hours_by_group.items():
+        stamps.update(field_timestamps(
+            FMP_SOURCE.groups[group], (NOW - timedelta(hours=hours)).isoformat()))
+    conn.execute(
+        "INSERT INTO stock_metrics_cache (ticker, company_name, field_fetched_at) VALUES (?, ?, ?)",
+        (ticker, ticker, json.dumps(stamps)))
+    if requests:
+        conn.execute(
+            "INSERT INTO ticker_request_stats (ticker, request_count) VALUES (?, ?)",
+            (ticker, requests))
+    conn.commit()
+
+
+def fresh_groups(**overrides):
+    ages = {group: 1 for group in FMP_SOURCE.groups}
+    ages.update(overrides)
+    return ages
+
+
+def test_only_stale_groups_are_planned(db_path):
+    conn = sqlite3.connect(db_path)
+    insert(conn, "FRESH", fresh_groups())
+    insert(conn, "PRICE", fresh_groups(profile=30, ratios=30))
+    insert(conn, "GROWTH", fresh_groups(growth=24 * 31))
+    plan = dict(plan_refresh(conn, ["FRESH", "PRICE", "GROWTH"], 100, FMP_SOURCE, now=NOW))
+    assert "FRESH" not in plan
+    assert plan["PRICE"] == ["profile", "ratios"]
+    # profile is always fetched alongside a stale group
+    assert plan["GROWTH"] == ["profile", "growth"]
+
+
+def test_missing_tickers_are_planned_with_all_groups(db_path):
+    conn = sqlite3.connect(db_path)
+    plan = plan_refresh(conn, ["NEW"], 100, FMP_SOURCE, now=NOW)
+    assert plan == [("NEW", list(FMP_SOURCE.groups))]
+    plan = plan_refresh(conn, ["NEW"], 100, YAHOO_SOURCE, now=NOW)
+    assert plan == [("NEW", ["info"])]
+
+
+def test_priority_uses_popularity_and_budget(db_path):
+    conn = sqlite3.connect(db_path)
+    insert(conn, "QUIET", fresh_groups(profile=48, ratios=48))
+    insert(conn, "POPULAR", fresh_groups(profile=48, ratios=48), requests=50)
+    insert(conn, "STALER", fresh_groups(profile=60, ratios=60))
+    plan = plan_refresh(conn, ["QUIET", "POPULAR", "STALER"], 4, FMP_SOURCE, now=NOW)
+    # each costs 2 calls, so only two fit in the budget
+    assert [ticker for ticker, _ in plan] == ["POPULAR", "STALER"]
+
+
+def test_partial_refresh_keeps_untouched_columns(db_path):
+    full = FMP_SOURCE.normalise("AAPL", {
+        'profile': {'companyName': 'Apple', 'sector': 'Technology', 'price': 200.0, 'mktCap': 3e12},
+        'ratios': {'peRatioTTM': 30.0, 'returnOnEquityTTM': 1.5},
+        'growth': {'revenue_growth': 0.1, 'earnings_growth': 0.2},
+        'key_metrics': {}, 'ocf_growth': {},
+    })
+    assert ingestion.update_sqlite_table([full]) == 1
+
+    partial = FMP_SOURCE.normalise("AAPL", {
+        'profile': {'companyName': 'Apple', 'sector': 'Technology', 'price': 210.0, 'mktCap': 3e12},
+        'ratios': {'peRatioTTM': 31.0},
+    })
+    assert 'revenue_growth' not in partial
+    assert ingestion.update_sqlite_table([partial]) == 1
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM stock_metrics_cache WHERE ticker = 'AAPL'").fetchone()
+    assert row['current_price'] == 210.0
+    assert row['pe_ratio'] == 31.0
+    assert row['revenue_growth'] == 0.1
+    stamps = json.loads(row['field_fetched_at'])
+    assert set(stamps) == set(FMP_SOURCE.columns)
+    assert stamps['pe_ratio'] == partial['fetched_at']
+    assert stamps['revenue_growth'] == full['fetched_at']
+
+
+def test_ingestion_run_writes_history_once(db_path, monkeypatch):
+    def connect():
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr(ingestion, "run_pipeline", partial(run_pipeline, conn_factory=connect))
+    raw = {'profile': {'companyName': 'Co', 'sector': 'Technology', 'price': 10.0, 'mktCap': 1e9},
+           'ratios': {'peRatioTTM': 15.0}, 'growth': {}, 'key_metrics': {}, 'ocf_growth': {}}
+    monkeypatch.setattr(FMP_SOURCE, "fetch", lambda ticker, groups: raw)
+    snapshots = []
+    record = ingestion.record_snapshot
+    monkeypatch.setattr(ingestion, "record_snapshot",
+                        lambda rows, **kw: snapshots.append(len(rows)) or record(rows, **kw))
+
+    universe = [f"T{i}" for i in range(5)]
+    stats = ingestion.run_ingestion("test", universe, max_workers=1, batch_size=2)
+    assert stats is not None
+    # three batches, one rewrite of the day's partition
+    assert snapshots == [5]
+    history = get_metrics_as_of(datetime.now(timezone.utc).date(), conn=connect())
+    assert sorted(row['ticker'] for row in history) == universe
+
+
+def test_yahoo_adapter_maps_onto_cache_columns():
+    data = YAHOO_SOURCE.normalise("MSFT", {'info': {
+        'longName': 'Microsoft', 'sector': 'Technology', 'currentPrice': 400,
+        'debtToEquity': 35.0, 'returnOnEquity': 0.38, 'revenueGrowth': 0.15,
+    }})
+    assert data['company_name'] == 'Microsoft'
+    assert data['current_price'] == 400.0
+    assert data['debt_equity_ratio'] == pytest.approx(0.35)
+    assert data['roe'] == 0.38
+    assert set(json.loads(data['field_fetched_at'])) == set(YAHOO_SOURCE.columns)
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pytest
+from src import indicator_cache
+from src.indicator_cache import (
+    STREAMING_INDICATORS, cached_indicator_outputs, streaming_indicator)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(indicator_cache, '_CACHE', OrderedDict())
+
+
+def make_series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.int64) * 60 + 1_700_000_000, 100 + rng.normal(0, 1, n).cumsum()
+
+
+def seeded_ema(values, period):
+    """EMA seeded with the SMA of the first period values, NaN before."""
+    out = np.full(len(values), np.nan)
+    seed = values[:period].mean()
+    out[period - 1:] = pd.Series(np.concatenate([[seed], values[period:]])).ewm(
+        alpha=2 / (period + 1), adjust=False).mean().to_numpy()
+    return out
+
+
+def reference(indicator, close):
+    if indicator == 'SMA':
+        return [pd.Series(close).rolling(30).mean().to_numpy()]
+    if indicator == 'EMA':
+        return [seeded_ema(close, 30)]
+    if indicator == 'RSI':
+        change = np.diff(close)
+        gain, loss = np.clip(change, 0, None), np.clip(-change, 0, None)
+        smooth = lambda x: pd.Series(np.concatenate([[x[:14].mean()], x[14:]])).ewm(
+            alpha=1 / 14, adjust=False).mean().to_numpy()
+        out = np.full(len(close), np.nan)
+        out[14:] = 100 * smooth(gain) / (smooth(gain) + smooth(loss))
+        return [out]
+    fast = np.full(len(close), np.nan)
+    fast[25:] = seeded_ema(close[14:], 12)[11:]
+    line = fast - seeded_ema(close, 26)
+    signal = np.full(len(close), np.nan)
+    signal[25:] = seeded_ema(line[25:], 9)
+    line[:33] = np.nan
+    return [line, signal, line - signal]
+
+
+@pytest.mark.parametrize("indicator", list(STREAMING_INDICATORS))
+def test_matches_reference_formulas(indicator):
+    times, close = make_series(400)
+    for got, expected in zip(streaming_indicator('AAPL', 'min:1', indicator, times, close),
+                             reference(indicator, close)):
+        np.testing.assert_allclose(got, expected, rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("indicator", list(STREAMING_INDICATORS))
+def test_matches_talib(indicator):
+    talib = pytest.importorskip("talib")
+    times, close = make_series(400)
+    expected = getattr(talib, indicator)(close, **STREAMING_INDICATORS[indicator])
+    expected = expected if isinstance(expected, tuple) else (expected,)
+    for got, want in zip(streaming_indicator('AAPL', 'min:1', indicator, times, close), expected):
+        np.testing.assert_allclose(got, want, rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("indicator", list(STREAMING_INDICATORS))
+def test_new_bars_extend_without_recomputing(indicator, monkeypatch):
+    times, close = make_series(600, seed=1)
+    first = close[:500].copy()
+    # the last cached bar was still forming and closes differently
+    first[-1] += 0.5
+    streaming_indicator('AAPL', 'min:1', indicator, times[:500], first)
+
+    def no_recompute(*args):
+        raise AssertionError("recomputed from scratch")
+    monkeypatch.setattr(indicator_cache, '_compute', no_recompute)
+    # twenty new bars arrived
+    got = streaming_indicator('AAPL', 'min:1', indicator, times[:520], close[:520])
+    monkeypatch.undo()
+    indicator_cache._CACHE.clear()
+    expected = streaming_indicator('AAPL', 'min:1', indicator, times[:520], close[:520])
+    for g, e in zip(got, expected):
+        np.testing.assert_allclose(g, e, rtol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize("indicator", list(STREAMING_INDICATORS))
+def test_warm_and_cold_results_agree(indicator):
+    times, close = make_series(600, seed=3)
+    streaming_indicator('AAPL', 'min:1', indicator, times[:500], close[:500])
+    # the window slid forward: same answer as with an empty cache, warm-up NaNs included
+    got = streaming_indicator('AAPL', 'min:1', indicator, times[10:520], close[10:520])
+    for g, e in zip(got, reference(indicator, close[10:520])):
+        np.testing.assert_allclose(g, e, rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("revised_bar", [198, 20])
+def test_revised_history_is_recomputed(revised_bar):
+    times, close = make_series(300, seed=2)
+    streaming_indicator('AAPL', 'min:1', 'EMA', times[:200], close[:200])
+    # e.g. a late print refreshed by the bar store, far behind the cached tail
+    revised = close[:250].copy()
+    revised[revised_bar] += 1.0
+    got = streaming_indicator('AAPL', 'min:1', 'EMA', times[:250], revised)
+    np.testing.assert_allclose(got[0], reference('EMA', revised)[0], rtol=1e-9, equal_nan=True)
+
+
+def test_long_series_are_not_cached(monkeypatch):
+    monkeypatch.setattr(indicator_cache, 'MAX_CACHED_BARS', 100)
+    times, close = make_series(150)
+    streaming_indicator('AAPL', 'min:1', 'SMA', times, close)
+    assert not indicator_cache._CACHE
+
+
+def test_outputs_keep_request_order():
+    times, close = make_series(100)
+    inputs = {'AAPL': {'close': close}}
+    compute = lambda inputs, indicators: {t: {'BANDS_0': close, 'BANDS_1': close, 'ADX': close}
+                                          for t in inputs}
+    columns = cached_indicator_outputs({'AAPL': times}, inputs, ['ADX', 'MACD', 'BANDS', 'RSI'],
+                                       'min:1', compute)['AAPL']
+    assert list(columns) == ['ADX', 'MACD_0', 'MACD_1', 'MACD_2', 'BANDS_0', 'BANDS_1', 'RSI']
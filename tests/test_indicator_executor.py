@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+import numpy as np
+import pytest
+from src import indicator_executor, prices
+from src.indicator_executor import compute_indicators, indicator_outputs
+from src.prices_helper import prepare_inputs
+
+
+def fake_calculate(inputs, indicator):
+    """Stands in for TA-Lib: a 5-bar MA5, a 3-output BANDS and an unknown name."""
+    close = inputs['close']
+    if indicator == 'MA5':
+        sma = np.convolve(close, np.ones(5) / 5, mode='full')[:len(close)]
+        sma[:4] = np.nan
+        return sma
+    if indicator == 'BANDS':
+        return close + inputs['high'], close, close - inputs['low']
+    return None
+
+
+def make_inputs(n_tickers, n_bars=300):
+    rng = np.random.default_rng(0)
+    inputs = {}
+    for i in range(n_tickers):
+        n = n_bars + i * 7
+        close = 100 + rng.normal(0, 1, n).cumsum()
+        inputs[f"T{i}"] = {'open': close + 0.1, 'high': close + 1.0, 'low': close - 1.0,
+                           'close': close, 'volume': rng.uniform(100, 1000, n)}
+    return inputs
+
+
+def test_parallel_matches_serial():
+    inputs = make_inputs(12)
+    indicators = ['MA5', 'BANDS', 'BAD']
+    serial = compute_indicators(inputs, indicators, max_workers=1, calculate=fake_calculate)
+    before = set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+    parallel = compute_indicators(inputs, indicators, max_workers=2, calculate=fake_calculate)
+    assert list(parallel) == list(inputs)
+    for ticker in inputs:
+        assert list(parallel[ticker]) == ['MA5', 'BANDS_0', 'BANDS_1', 'BANDS_2']
+        for name, values in serial[ticker].items():
+            assert parallel[ticker][name].dtype == np.float64
+            np.testing.assert_array_equal(parallel[ticker][name], values)
+    # the shared input block is unlinked after the request
+    if os.path.isdir('/dev/shm'):
+        assert set(os.listdir('/dev/shm')) <= before
+
+
+def test_concurrent_requests_share_one_pool():
+    inputs = make_inputs(12)
+    serial = compute_indicators(inputs, ['MA5'], max_workers=1, calculate=fake_calculate)
+    pool = indicator_executor._get_pool()
+
+    def run(i):
+        # alternating worker counts must not resize (and so shut down) the pool
+        return compute_indicators(inputs, ['MA5'], max_workers=2 + i % 2, calculate=fake_calculate)
+
+    with ThreadPoolExecutor(max_workers=4) as threads:
+        results = [future.result(timeout=60) for future in [threads.submit(run, i) for i in range(8)]]
+    assert indicator_executor._get_pool() is pool
+    for result in results:
+        for ticker in inputs:
+            np.testing.assert_array_equal(result[ticker]['MA5'], serial[ticker]['MA5'])
+
+
+def test_single_ticker_outputs():
+    inputs = make_inputs(1)['T0']
+    columns = indicator_outputs(inputs, ['BANDS', 'MA5'], calculate=fake_calculate)
+    assert list(columns) == ['BANDS_0', 'BANDS_1', 'BANDS_2', 'MA5']
+    np.testing.assert_array_equal(columns['BANDS_1'], inputs['close'])
+    assert np.isnan(columns['MA5'][:4]).all()
+
+
+def test_get_indicators_bars_have_null_strings(monkeypatch):
+    start = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+    bars = {ticker: [{'symbol': ticker, 'timestamp': start + timedelta(minutes=i),
+                      **{field: float(values[i]) for field, values in arrays.items()}}
+                     for i in range(len(arrays['close']))]
+            for ticker, arrays in make_inputs(3, 20).items()}
+    monkeypatch.setattr(prices, 'fetch_indicator_bars', lambda *args: bars)
+    monkeypatch.setattr(prices, 'compute_indicators',
+                        partial(compute_indicators, max_workers=2, calculate=fake_calculate))
+    result = prices.get_indicators(list(bars), ['MA5', 'BANDS'], 5, 'min')
+    first = result['stock_data']['T0']
+    assert [b['MA5'] for b in first[:4]] == ["null"] * 4
+    expected = fake_calculate(prepare_inputs(bars['T0']), 'MA5')
+    assert first[10]['MA5'] == pytest.approx(expected[10])
+    assert first[0]['BANDS_2'] == pytest.approx(bars['T0'][0]['close'] - bars['T0'][0]['low'])
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src import indicator_executor, indicator_kernels
+from src.indicator_executor import compute_indicators
+from src.indicator_kernels import KERNELS, BBANDS, SAR, SMA, VWAP
+
+
+def make_inputs(n_tickers, n_bars=500, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, (n_tickers, n_bars)).cumsum(axis=1)
+    return {'open': close + rng.normal(0, 0.2, close.shape),
+            'high': close + rng.uniform(0, 2, close.shape),
+            'low': close - rng.uniform(0, 2, close.shape),
+            'close': close,
+            'volume': rng.uniform(100, 1000, close.shape)}
+
+
+def as_tuple(output):
+    return output if isinstance(output, tuple) else (output,)
+
+
+@pytest.mark.parametrize("indicator", list(KERNELS))
+def test_rows_match_talib(indicator):
+    talib = pytest.importorskip("talib")
+    kernel, fields = KERNELS[indicator]
+    inputs = make_inputs(4)
+    got = as_tuple(kernel(*(inputs[field] for field in fields)))
+    for row in range(4):
+        want = as_tuple(getattr(talib, indicator)(*(inputs[field][row] for field in fields)))
+        assert len(got) == len(want)
+        for g, w in zip(got, want):
+            np.testing.assert_allclose(g[row], w, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("indicator", list(KERNELS))
+def test_one_dimensional_and_short_series(indicator):
+    kernel, fields = KERNELS[indicator]
+    inputs = make_inputs(1, 200)
+    matrix = as_tuple(kernel(*(inputs[field] for field in fields)))
+    vector = as_tuple(kernel(*(inputs[field][0] for field in fields)))
+    for m, v in zip(matrix, vector):
+        assert v.shape == (200,)
+        np.testing.assert_array_equal(m[0], v)
+    # too few bars for the lookback: all NaN, like TA-Lib
+    short = as_tuple(kernel(*(inputs[field][0, :1] for field in fields)))
+    assert all(output.shape == (1,) for output in short)
+    if indicator != 'VWAP':
+        assert all(np.isnan(output).all() for output in short)
+
+
+def test_long_recurrences_stay_exact():
+    # the EMA runs across many matrix-product blocks
+    talib = pytest.importorskip("talib")
+    close = make_inputs(2, 20 * indicator_kernels.RECURRENCE_BLOCK + 7)['close']
+    ema = indicator_kernels.EMA(close)
+    for row, series in enumerate(close):
+        np.testing.assert_allclose(ema[row], talib.EMA(series), rtol=1e-12, equal_nan=True)
+
+
+def test_recurrence_nan_only_poisons_later_bars():
+    b = make_inputs(3, 3 * indicator_kernels.RECURRENCE_BLOCK)['close']
+    b[0, 100] = np.nan
+    b[2, 5] = np.nan
+    expected = np.empty_like(b)
+    y = np.zeros(len(b))
+    for t in range(b.shape[1]):
+        y = 0.9 * y + b[:, t]
+        expected[:, t] = y
+    np.testing.assert_allclose(indicator_kernels._recurrence(b, 0.9), expected,
+                               rtol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize("indicator", ['EMA', 'DEMA', 'MACD', 'RSI', 'PLUS_DI', 'MINUS_DI', 'ADX'])
+def test_interior_nan_matches_talib(indicator):
+    talib = pytest.importorskip("talib")
+    kernel, fields = KERNELS[indicator]
+    inputs = make_inputs(2)
+    for values in inputs.values():
+        values[:, 100] = np.nan
+    got = as_tuple(kernel(*(inputs[field] for field in fields)))
+    want = as_tuple(getattr(talib, indicator)(*(inputs[field][0] for field in fields)))
+    for g, w in zip(got, want):
+        # nothing before the gap changes
+        np.testing.assert_allclose(g[0, :100], w[:100], rtol=1e-9, atol=1e-9, equal_nan=True)
+        if indicator in ('EMA', 'DEMA', 'MACD', 'ADX'):
+            np.testing.assert_allclose(g[0], w, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_sma_and_bbands_reference_formulas():
+    close = make_inputs(3)['close']
+    rolling = pd.DataFrame(close.T).rolling(20)
+    np.testing.assert_allclose(SMA(close, 20), rolling.mean().to_numpy().T, rtol=1e-12, equal_nan=True)
+    upper, middle, lower = BBANDS(close, timeperiod=20, nbdevup=1.5, nbdevdn=3.0)
+    std = rolling.std(ddof=0).to_numpy().T
+    np.testing.assert_allclose(upper, middle + 1.5 * std, rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(lower, middle - 3.0 * std, rtol=1e-12, equal_nan=True)
+
+
+def test_rolling_vwap():
+    inputs = make_inputs(2)
+    typical = (inputs['high'] + inputs['low'] + inputs['close']) / 3
+    weighted = pd.DataFrame((typical * inputs['volume']).T).rolling(10).sum()
+    expected = (weighted / pd.DataFrame(inputs['volume'].T).rolling(10).sum()).to_numpy().T
+    got = VWAP(inputs['high'], inputs['low'], inputs['close'], inputs['volume'], timeperiod=10)
+    np.testing.assert_allclose(got, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_sar_reverses_on_a_trend_change():
+    high = np.concatenate([np.linspace(10, 20, 30), np.linspace(20, 10, 30)]) + 0.5
+    sar = SAR(high, high - 1.0)
+    # under the bars while rising, over them after the turn
+    assert (sar[1:30] < high[1:30] - 1.0).all()
+    assert (sar[-10:] > high[-10:]).all()
+
+
+def test_compute_indicators_batches_tickers_of_each_length(monkeypatch):
+    monkeypatch.setattr(indicator_executor, 'talib_abstract', None)
+    matrices = make_inputs(3, 120)
+    inputs = {f"T{row}": {field: values[row] for field, values in matrices.items()} for row in range(3)}
+    # a shorter ticker is computed in its own batch
+    inputs['SHORT'] = {field: values[-60:] for field, values in inputs['T0'].items()}
+    outputs = compute_indicators(inputs, ['MACD', 'VWAP', 'SMA'], max_workers=1)
+    assert list(outputs) == list(inputs)
+    for ticker, columns in outputs.items():
+        assert list(columns) == ['MACD_0', 'MACD_1', 'MACD_2', 'VWAP', 'SMA']
+        series = inputs[ticker]
+        np.testing.assert_array_equal(columns['SMA'], SMA(series['close']))
+        np.testing.assert_array_equal(
+            columns['VWAP'], VWAP(series['high'], series['low'], series['close'], series['volume']))
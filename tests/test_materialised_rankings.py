@@ -0,0 +1,166 @@
+import sqlite3
+import pytest
+import src.data_layer.ingestion as ingestion
+from src.data_layer.backends import SQLiteMetricsBackend
+from src.data_layer.data_access import RANKING_COLUMNS
+from src.data_layer.data_version import (
+    get_data_version, get_changed_tickers, bump_data_version, CHANGE_LOG_RETENTION
+)
+from src.data_layer.materialised_rankings import MaterialisedRankings, PROFILES
+import src.data_layer.sector_stats as sector_stats
+from src.data_layer.sector_stats import get_sector_stats
+from src.profiles import InvestmentGoal, RiskTolerance
+from src.screener_scoring import calculate_scores
+
+
+class FakeBackend(SQLiteMetricsBackend):
+    """SQLite backend reading the test database."""
+
+    def __init__(self, connect):
+        self.connect = connect
+
+    def _rows(self, sql, params=()):
+        conn = self.connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def get_all_metrics_for_ranking(self, sector_filter=None):
+        return [{c: r.get(c) for c in RANKING_COLUMNS if c in r}
+                for r in self._rows("SELECT * FROM stock_metrics_cache WHERE company_name IS NOT NULL")]
+
+    def get_metrics_for_comparison(self, ticker_list):
+        marks = ', '.join('?' for _ in ticker_list)
+        return self._rows(f"SELECT * FROM stock_metrics_cache WHERE ticker IN ({marks})", ticker_list)
+
+    def get_data_version(self):
+        return super().get_data_version(conn=self.connect())
+
+    def get_changed_tickers(self, since_version):
+        return super().get_changed_tickers(since_version, conn=self.connect())
+
+
+def company(ticker, sector, pe, dy):
+    return {'ticker': ticker, 'company_name': ticker, 'sector': sector,
+            'pe_ratio': pe, 'dividend_yield': dy, 'revenue_growth': 0.1}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.sqlite"
+
+    def connect():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr(ingestion, "get_sqlite_connection", connect)
+    monkeypatch.setattr(ingestion, "record_snapshot", lambda *a, **k: 0)
+    ingestion.update_sqlite_table([
+        company("AAA", "Technology", 12.0, 0.03),
+        company("BBB", "Technology", 30.0, 0.01),
+        company("CCC", "Energy", 9.0, 0.05),
+    ])
+    rankings = MaterialisedRankings(backend=FakeBackend(connect), check_seconds=0)
+    return connect, rankings
+
+
+def live_order(connect, goal, risk, sector=None):
+    rows = FakeBackend(connect).get_all_metrics_for_ranking()
+    if sector:
+        rows = [r for r in rows if r['sector'].lower() == sector.lower()]
+    scored = [(calculate_scores(r, goal, risk)['overall_score'], r['ticker']) for r in rows]
+    return [t for _, t in sorted(scored, key=lambda s: (-s[0], s[1]))]
+
+
+def test_every_profile_matches_live_scoring(store):
+    connect, rankings = store
+    for goal, risk in PROFILES:
+        for sector in (None, "technology", "Energy"):
+            page = rankings.lookup(goal, risk, sector, limit=10)
+            assert [r['ticker'] for r in page['companies']] == live_order(connect, goal, risk, sector)
+    assert page['data_version'] == 1 and page['refreshed_at']
+    assert rankings.lookup("speculative", "moderate") is None
+
+
+def test_changes_are_applied_incrementally(store, monkeypatch):
+    connect, rankings = store
+    rankings.lookup("value", "moderate")
+    # after the first build only changed tickers may be fetched
+    monkeypatch.setattr(rankings.backend, "get_all_metrics_for_ranking",
+                        lambda *a: pytest.fail("full rebuild"))
+    ingestion.update_sqlite_table([company("BBB", "Energy", 8.0, 0.06), company("DDD", "Energy", 50.0, 0.0)])
+
+    page = rankings.lookup("value", "moderate", "energy")
+    assert page['data_version'] == 2
+    assert [r['ticker'] for r in page['companies']] == live_order(connect, "value", "moderate", "energy")
+    tech = rankings.lookup("value", "moderate", "technology")
+    assert [r['ticker'] for r in tech['companies']] == ["AAA"]
+    assert rankings.lookup("value", "moderate")['total'] == 4
+
+
+def assert_percentiles_match_store(connect, rankings):
+    for goal, risk in PROFILES:
+        for sector in (None, "technology", "energy"):
+            page = rankings.percentile_lookup(goal, risk, sector, limit=10)
+            store = SQLiteMetricsBackend().rank_by_percentile(
+                InvestmentGoal(goal), RiskTolerance(risk), sector, limit=10, conn=connect())
+            assert [r['ticker'] for r in page['companies']] == [r['ticker'] for r in store['companies']]
+            assert [r['profile_score'] for r in page['companies']] == \
+                pytest.approx([r['profile_score'] for r in store['companies']])
+            assert page['total'] == store['total']
+
+
+def test_percentile_index_follows_changes_incrementally(store, monkeypatch):
+    connect, rankings = store
+    assert_percentiles_match_store(connect, rankings)
+    monkeypatch.setattr(rankings.backend, "get_all_metrics_for_ranking",
+                        lambda *a: pytest.fail("full rebuild"))
+    # BBB moves sector and DDD is new: both sector indexes and 'all' are re-slotted
+    ingestion.update_sqlite_table([company("BBB", "Energy", 8.0, 0.06), company("DDD", "Energy", 50.0, None)])
+    assert_percentiles_match_store(connect, rankings)
+    assert rankings.percentile_lookup("value", "moderate")['data_version'] == 2
+
+
+def test_freshness_follows_the_backend_version(store, monkeypatch):
+    connect, rankings = store
+    rankings.lookup("value", "moderate")
+    # a write the backend has not versioned yet is not picked up
+    monkeypatch.setattr(rankings.backend, "get_data_version", lambda: (1, None))
+    ingestion.update_sqlite_table([company("DDD", "Energy", 5.0, 0.08)])
+    assert rankings.lookup("value", "moderate")['total'] == 3
+    monkeypatch.setattr(rankings.backend, "get_data_version", lambda: (2, None))
+    page = rankings.lookup("value", "moderate")
+    assert page['data_version'] == 2 and page['total'] == 4
+
+
+def test_change_log_gap_means_rebuild(store):
+    connect, _ = store
+    conn = connect()
+    assert get_changed_tickers(conn, 0) == ["AAA", "BBB", "CCC"]
+    for _ in range(CHANGE_LOG_RETENTION + 1):
+        bump_data_version(conn, ["AAA"])
+    assert get_data_version(conn)[0] == CHANGE_LOG_RETENTION + 2
+    assert get_changed_tickers(conn, 0) is None
+    assert get_changed_tickers(conn, CHANGE_LOG_RETENTION + 1) == ["AAA"]
+
+
+def test_sector_stats_follow_the_data_version(store, monkeypatch):
+    connect, _ = store
+    monkeypatch.setattr(sector_stats, "_CACHE", {'version': None, 'stats': None})
+    backend = FakeBackend(connect)
+    stats = get_sector_stats(backend)
+    assert stats['sectors'] == ["energy", "technology"]
+    pe = stats['columns'].index('pe_ratio')
+    assert stats['means'][1, pe] == pytest.approx(21.0)
+    assert get_sector_stats(backend) is stats
+
+    ingestion.update_sqlite_table([company("DDD", "Technology", 24.0, 0.02)])
+    fresh = get_sector_stats(backend)
+    assert fresh is not stats
+    assert fresh['means'][1, pe] == pytest.approx(22.0)
+    # a version the backend has not moved past keeps the cached stats
+    monkeypatch.setattr(backend, "get_data_version", lambda: (2, None))
+    ingestion.update_sqlite_table([company("EEE", "Technology", 90.0, 0.0)])
+    assert get_sector_stats(backend) is fresh
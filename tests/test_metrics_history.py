@@ -0,0 +1,97 @@
+import sqlite3
+import pytest
+from src.data_layer.metrics_history import (
+    record_snapshot,
+    get_history_dates,
+    get_metrics_as_of,
+    get_metric_trend
+)
+
+
+def make_row(ticker, sector, pe, price=100.0):
+    return {
+        'ticker': ticker, 'company_name': f"{ticker} Inc.", 'sector': sector,
+        'market_cap': 3.0e12, 'current_price': price, 'pe_ratio': pe,
+        'ev_ebitda': None, 'dividend_yield': 0.02, 'payout_ratio': 0.3,
+        'debt_equity_ratio': 1.1, 'current_ratio': 1.5,
+        'revenue_growth': 0.1, 'earnings_growth': 0.05, 'ocf_growth': None
+    }
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:")
+    yield connection
+    connection.close()
+
+
+def test_snapshots_are_appended_per_date(conn):
+    record_snapshot([make_row('AAPL', 'Technology', 30.0)], '2025-01-01', conn=conn)
+    record_snapshot([make_row('AAPL', 'Technology', 31.0)], '2025-01-02', conn=conn)
+    assert get_history_dates(conn=conn) == ['2025-01-01', '2025-01-02']
+
+
+def test_same_day_batches_are_merged(conn):
+    record_snapshot([make_row('AAPL', 'Technology', 30.0)], '2025-01-01', conn=conn)
+    record_snapshot([make_row('JPM', 'Financial Services', 12.0)], '2025-01-01', conn=conn)
+    record_snapshot([make_row('AAPL', 'Technology', 29.0)], '2025-01-01', conn=conn)
+
+    rows = {r['ticker']: r for r in get_metrics_as_of('2025-01-01', conn=conn)}
+    assert set(rows) == {'AAPL', 'JPM'}
+    assert rows['AAPL']['pe_ratio'] == pytest.approx(29.0)
+
+
+def test_as_of_uses_latest_value_per_ticker(conn):
+    record_snapshot([make_row('AAPL', 'Technology', 30.0),
+                     make_row('JPM', 'Financial Services', 12.0)], '2025-01-01', conn=conn)
+    # only AAPL refreshed on the 2nd
+    record_snapshot([make_row('AAPL', 'Technology', 35.0, price=190.5)], '2025-01-02', conn=conn)
+
+    rows = {r['ticker']: r for r in get_metrics_as_of('2025-01-05', conn=conn)}
+    assert rows['AAPL']['pe_ratio'] == pytest.approx(35.0)
+    assert rows['AAPL']['current_price'] == pytest.approx(190.5)
+    assert rows['AAPL']['snapshot_date'] == '2025-01-02'
+    assert rows['JPM']['snapshot_date'] == '2025-01-01'
+    assert rows['AAPL']['ev_ebitda'] is None
+
+    old = get_metrics_as_of('2025-01-01', conn=conn)
+    assert {r['ticker']: r['pe_ratio'] for r in old} == pytest.approx({'AAPL': 30.0, 'JPM': 12.0})
+    assert get_metrics_as_of('2024-12-31', conn=conn) == []
+
+
+def test_as_of_sector_filter(conn):
+    record_snapshot([make_row('AAPL', 'Technology', 30.0),
+                     make_row('JPM', 'Financial Services', 12.0)], '2025-01-01', conn=conn)
+    rows = get_metrics_as_of('2025-01-01', 'technology', conn=conn)
+    assert [r['ticker'] for r in rows] == ['AAPL']
+
+
+def test_callers_connection_keeps_its_row_factory(conn):
+    conn.row_factory = None
+    record_snapshot([make_row('AAPL', 'Technology', 30.0)], '2025-01-01', conn=conn)
+    get_metrics_as_of('2025-01-01', conn=conn)
+    assert conn.row_factory is None
+    assert isinstance(conn.execute("SELECT 1").fetchone(), tuple)
+
+
+def test_metric_trend(conn):
+    for day, pe in [('2025-01-01', 30.0), ('2025-01-02', 31.0), ('2025-01-03', 32.0)]:
+        record_snapshot([make_row('AAPL', 'Technology', pe)], day, conn=conn)
+    trend = get_metric_trend('AAPL', 'pe_ratio', start_date='2025-01-02', conn=conn)
+    assert [t['date'] for t in trend] == ['2025-01-02', '2025-01-03']
+    assert [t['value'] for t in trend] == pytest.approx([31.0, 32.0])
+    with pytest.raises(ValueError):
+        get_metric_trend('AAPL', 'not_a_metric', conn=conn)
+    with pytest.raises(ValueError, match="end_date"):
+        get_metric_trend('AAPL', 'pe_ratio', end_date='2025-13-40', conn=conn)
+
+
+def test_storage_stays_small(conn):
+    rows = [make_row(f"T{i:03d}", 'Technology', 10.0 + i) for i in range(100)]
+    for day in range(1, 29):
+        record_snapshot(rows, f"2025-02-{day:02d}", conn=conn)
+    total = conn.execute(
+        "SELECT SUM(LENGTH(metrics) + LENGTH(ticker_ids) + LENGTH(sector_ids) + LENGTH(name_ids)) "
+        "FROM stock_metrics_history").fetchone()[0]
+    # 100 tickers x 11 float64 metrics would be ~8.8KB per day uncompressed
+    assert total / 28 < 4000
@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+import time
+import pytest
+from src.data_layer.pipeline import RateLimiter, run_pipeline
+
+
+@pytest.fixture
+def conn_factory(tmp_path):
+    db_path = tmp_path / "pipeline.sqlite"
+    return lambda: sqlite3.connect(db_path)
+
+
+def normalise(ticker, raw):
+    return {'ticker': ticker, 'value': raw}
+
+
+def test_pipeline_writes_in_batches(conn_factory):
+    written = []
+
+    def write(rows):
+        written.append([r['ticker'] for r in rows])
+        return len(rows)
+
+    tickers = [f"T{i}" for i in range(10)]
+    stats = run_pipeline(tickers, fetch_fn=lambda t: 1.0, normalise_fn=normalise,
+                         write_fn=write, job_name="test", max_workers=3,
+                         batch_size=4, conn_factory=conn_factory)
+
+    assert [len(batch) for batch in written] == [4, 4, 2]
+    assert sorted(t for batch in written for t in batch) == sorted(tickers)
+    assert stats['fetch']['ok'] == 10
+    assert stats['write']['ok'] == 10
+
+
+def test_pipeline_checkpoints_failures(conn_factory):
+    def flaky_fetch(ticker):
+        if ticker == "BAD":
+            raise RuntimeError("boom")
+        return 1.0
+
+    stats = run_pipeline(["A", "BAD", "B"], fetch_fn=flaky_fetch, normalise_fn=normalise,
+                         write_fn=len, job_name="test", conn_factory=conn_factory)
+    assert stats['fetch']['failed'] == 1
+    assert stats['write']['ok'] == 2
+
+    with conn_factory() as conn:
+        rows = dict(conn.execute("SELECT ticker, status FROM ingestion_checkpoint").fetchall())
+    assert rows == {"A": "done", "BAD": "failed", "B": "done"}
+
+
+def test_interrupted_run_resumes(conn_factory):
+    def crashing_fetch(ticker):
+        if ticker == "C":
+            raise KeyboardInterrupt
+        return 1.0
+
+    with pytest.raises(KeyboardInterrupt):
+        run_pipeline(["A", "B", "C", "D"], fetch_fn=crashing_fetch, normalise_fn=normalise,
+                     write_fn=len, job_name="resume", max_workers=1, batch_size=2,
+                     conn_factory=conn_factory)
+
+    fetched = []
+    run_pipeline(["A", "B", "C", "D"], fetch_fn=lambda t: fetched.append(t) or 1.0,
+                 normalise_fn=normalise, write_fn=len, job_name="resume",
+                 max_workers=1, batch_size=2, conn_factory=conn_factory)
+    # rows buffered before the crash were flushed, so they are not fetched
+    # again; anything not yet checkpointed is
+    assert "A" not in fetched
+    assert {"C", "D"} <= set(fetched)
+
+    with conn_factory() as conn:
+        statuses = conn.execute(
+            "SELECT status, COUNT(*) FROM ingestion_runs GROUP BY status").fetchall()
+    assert statuses == [("complete", 1)]
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=50, burst=1)
+    stamps = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(5):
+            limiter.acquire()
+            with lock:
+                stamps.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stamps.sort()
+    # 10 calls at 50/s with no burst take at least ~9 intervals of 20ms
+    assert stamps[-1] - stamps[0] >= 0.15
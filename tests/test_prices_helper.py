@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.prices_helper import prepare_inputs, bars_to_arrays, BAR_FIELDS
+from src.strategy import prepare_inputs_live
+
+
+def appended_inputs(stock_bars, keys):
+    """The original np.append loop."""
+    arrays = {field: np.array([]) for field in BAR_FIELDS}
+    for bar in stock_bars:
+        tmp = bar if isinstance(bar, dict) else bar.__dict__
+        for field in BAR_FIELDS:
+            arrays[field] = np.append(arrays[field], tmp[keys[field]])
+    return arrays
+
+
+class Bar:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def make_bars(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, n).cumsum()
+    return [{'open': o, 'high': o + 1.0, 'low': o - 1.0, 'close': c, 'volume': int(v)}
+            for o, c, v in zip(close + 0.1, close, rng.integers(100, 10_000, n))]
+
+
+@pytest.mark.parametrize("kind", ["dicts", "objects", "live"])
+def test_matches_append_loop(kind):
+    bars = make_bars(500)
+    if kind == "objects":
+        bars = [Bar(**b) for b in bars]
+        result = prepare_inputs(bars)
+        keys = {f: f for f in BAR_FIELDS}
+    elif kind == "live":
+        keys = {'open': 'o', 'high': 'h', 'low': 'l', 'close': 'c', 'volume': 'v'}
+        bars = [{keys[f]: b[f] for f in BAR_FIELDS} for b in bars]
+        result = prepare_inputs_live(bars)
+    else:
+        result = prepare_inputs(bars)
+        keys = {f: f for f in BAR_FIELDS}
+    expected = appended_inputs(bars, keys)
+    for field in BAR_FIELDS:
+        assert result[field].dtype == np.float64
+        assert result[field].flags['C_CONTIGUOUS']
+        np.testing.assert_array_equal(result[field], expected[field])
+
+
+def test_dataframe_columns_are_views():
+    df = pd.DataFrame(make_bars(1000)).astype(float)
+    arrays = bars_to_arrays(df)
+    for field in BAR_FIELDS:
+        assert arrays[field].flags['C_CONTIGUOUS']
+        assert np.shares_memory(arrays[field], df[field].to_numpy())
+        np.testing.assert_array_equal(arrays[field], df[field].to_numpy())
+
+
+def test_empty_and_invalid_bars():
+    assert all(len(a) == 0 for a in prepare_inputs([]).values())
+    assert prepare_inputs([{'open': 1.0}]) is None
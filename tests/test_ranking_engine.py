@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.profiles import InvestmentGoal, RiskTolerance, get_profile_metrics
+from src.ranking_engine import (
+    normalise_metric, normalise_columns, weighted_profile_scores, rank_companies,
+    percentile_columns, PercentileIndex, sector_statistics, compute_sector_stats,
+    rank_companies_page, select_top_k, page_of, decode_cursor,
+    generate_recommendation_summary, recommendation_summaries
+)
+
+
+def reference_scores(values, higher_better, weights):
+    """The original per-value loop, normalise_metric over each column."""
+    scores = np.zeros(values.shape[0])
+    for j in range(values.shape[1]):
+        column = [None if np.isnan(v) else v for v in values[:, j]]
+        scores += np.array([normalise_metric(v, column, higher_better[j]) for v in column]) * weights[j]
+    return scores / weights.sum() * 100.0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_kernel_matches_per_value_normalisation(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(200, 5))
+    values[rng.random(values.shape) < 0.15] = np.nan
+    values[:, 3] = 7.0          # constant column
+    values[:, 4] = np.nan       # empty column
+    higher_better = np.array([True, False, True, False, True])
+    weights = rng.random(5)
+    np.testing.assert_allclose(
+        weighted_profile_scores(values, higher_better, weights),
+        reference_scores(values, higher_better, weights))
+
+
+def test_nan_and_flat_columns_are_neutral():
+    values = np.array([[1.0, 5.0], [np.nan, 5.0], [3.0, 5.0]])
+    normalised = normalise_columns(values, np.array([False, True]))
+    np.testing.assert_array_equal(normalised, [[1.0, 0.5], [0.5, 0.5], [0.0, 0.5]])
+
+
+def test_rank_companies_orders_by_profile_score():
+    companies = [
+        {'ticker': t, 'sector': 'Tech', 'pe_ratio': pe, 'dividend_yield': dy,
+         'revenue_growth': g, 'earnings_growth': g}
+        for t, pe, dy, g in [('A', 10, 0.04, 0.1), ('B', 30, 0.01, 0.3), ('C', 20, None, 0.2)]
+    ]
+    ranked = rank_companies(InvestmentGoal.INCOME, RiskTolerance.MODERATE, companies)
+    assert [r['ticker'] for r in ranked] == ['A', 'C', 'B']
+    scores = [r['profile_score'] for r in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert all(r['recommendation_summary'] for r in ranked)
+
+
+def full_order(scores, tie_keys):
+    keyed = np.where(np.isnan(scores), -np.inf, scores)
+    return sorted(range(len(scores)), key=lambda i: (-keyed[i], tie_keys[i], i))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_top_k_pages_match_full_stable_sort(seed):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(0, 20, size=300).astype(float)   # lots of ties
+    scores[rng.random(300) < 0.1] = np.nan
+    tie_keys = np.array([f"T{rng.integers(0, 1000):04d}" for _ in range(300)])
+    expected = full_order(scores, tie_keys)
+    pages = []
+    offset = 0
+    while offset < len(scores):
+        pages.extend(select_top_k(scores, 17, offset, tie_keys).tolist())
+        offset += 17
+    assert pages == expected
+
+
+def test_page_of_cursor_walks_every_row():
+    rows = [{'ticker': f"T{i}", 'score': i % 7} for i in range(45)]
+    scores = [r['score'] for r in rows]
+    tickers = [r['ticker'] for r in rows]
+    seen, cursor = [], None
+    while True:
+        offset = decode_cursor(cursor) if cursor else 0
+        page = page_of(rows, scores, 20, offset, tie_keys=tickers)
+        assert page['total'] == 45
+        seen.extend(r['ticker'] for r in page['companies'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == 45 and len(set(seen)) == 45
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_rank_companies_page_limits_and_pages():
+    companies = [{'ticker': f"T{i}", 'pe_ratio': float(i), 'dividend_yield': 0.01 * (i % 5)}
+                 for i in range(30)]
+    full = rank_companies(InvestmentGoal.INCOME, RiskTolerance.MODERATE, companies)
+    first = rank_companies_page(InvestmentGoal.INCOME, RiskTolerance.MODERATE, companies, limit=10)
+    second = rank_companies_page(InvestmentGoal.INCOME, RiskTolerance.MODERATE, companies,
+                                 limit=10, offset=decode_cursor(first['next_cursor']))
+    assert first['total'] == 30
+    assert [r['ticker'] for r in first['companies'] + second['companies']] == \
+        [r['ticker'] for r in full[:20]]
+
+
+@pytest.mark.parametrize("goal,risk", [
+    (InvestmentGoal.GROWTH, RiskTolerance.AGGRESSIVE),
+    (InvestmentGoal.VALUE, RiskTolerance.CONSERVATIVE),
+    (InvestmentGoal.INCOME, RiskTolerance.MODERATE),
+])
+def test_batched_summaries_match_per_row(goal, risk):
+    rng = np.random.default_rng(7)
+    rows = pd.DataFrame({
+        'ticker': [f"T{i}" for i in range(300)],
+        'pe_ratio': rng.uniform(5, 45, 300),
+        'roe': rng.uniform(0, 0.3, 300),
+        'revenue_growth': rng.uniform(-0.05, 0.3, 300),
+        'earnings_growth': rng.uniform(-0.05, 0.3, 300),
+        'dividend_yield': rng.uniform(0, 0.06, 300),
+    })
+    rows.loc[rng.random(300) < 0.2, 'pe_ratio'] = np.nan
+    config = {k: v for k, v in get_profile_metrics(goal, risk).items() if k in rows.columns}
+    # roe is not in any profile config, so add it to exercise that rule too
+    config['roe'] = {'weight': 0.5, 'higher_better': True}
+    expected = [generate_recommendation_summary(r, config) for r in rows.to_dict('records')]
+    assert recommendation_summaries(rows, config) == expected
+
+
+def test_percentile_columns_ties_direction_and_missing():
+    values = np.array([[1.0, 1.0], [2.0, 2.0], [2.0, np.nan], [3.0, 3.0]])
+    ranks = percentile_columns(values, np.array([True, False]))
+    # ties share the lower rank, like SQL PERCENT_RANK
+    assert ranks[:, 0].tolist() == [0.0, 1 / 3, 1 / 3, 1.0]
+    assert ranks[:, 1].tolist() == [1.0, 0.5, 0.5, 0.0]
+
+
+def test_percentile_index_updates_match_rebuild():
+    rng = np.random.default_rng(3)
+    metrics = {'pe_ratio': False, 'dividend_yield': True}
+    rows = [{'ticker': f"T{i}", 'pe_ratio': float(rng.integers(5, 30)),
+             'dividend_yield': None if i % 9 == 0 else float(rng.uniform(0, 0.05))}
+            for i in range(200)]
+    index = PercentileIndex.from_rows(rows, metrics)
+    for step in range(300):
+        i = int(rng.integers(0, 200))
+        change = {'pe_ratio': float(rng.integers(5, 30))}
+        if step % 4 == 0:
+            change['dividend_yield'] = None
+        rows[i].update(change)
+        index.update(f"T{i}", change)
+    index.remove("T0")
+    rows = rows[1:]
+
+    rebuilt = PercentileIndex.from_rows(rows, metrics)
+    weights = {'pe_ratio': 0.6, 'dividend_yield': 0.4}
+    assert index.scores(weights) == pytest.approx(rebuilt.scores(weights))
+    values = np.array([[np.nan if r[m] is None else r[m] for m in metrics] for r in rows])
+    expected = weighted_profile_scores(values, np.array([False, True]), np.array([0.6, 0.4]),
+                                       scoring='percentile')
+    assert [index.score(r['ticker'], weights) for r in rows] == pytest.approx(expected.tolist())
+
+
+def test_percentile_outlier_does_not_compress_scores():
+    companies = [{'ticker': f"T{i}", 'pe_ratio': 10.0 + i} for i in range(5)]
+    companies.append({'ticker': 'OUT', 'pe_ratio': 10_000.0})
+    ranked = rank_companies(InvestmentGoal.VALUE, RiskTolerance.MODERATE, companies,
+                            scoring='percentile')
+    scores = [r['profile_score'] for r in ranked]
+    assert [r['ticker'] for r in ranked] == ['T0', 'T1', 'T2', 'T3', 'T4', 'OUT']
+    assert scores[:5] == pytest.approx([100.0, 80.0, 60.0, 40.0, 20.0])
+
+
+def test_sector_statistics_match_groupby():
+    rng = np.random.default_rng(2)
+    values = rng.normal(10, 3, (120, 3))
+    values[rng.random((120, 3)) < 0.15] = np.nan
+    groups = rng.integers(0, 4, 120)
+    counts, means, stds = sector_statistics(values, groups, 5)
+    df = pd.DataFrame(values).assign(g=groups).groupby('g')
+    assert np.allclose(means[:4], df.mean().to_numpy())
+    assert np.allclose(stds[:4], df.std(ddof=0).to_numpy())
+    assert np.allclose(counts[:4], df.count().to_numpy())
+    assert counts[4].sum() == 0 and np.isnan(means[4]).all()
+
+
+def test_sector_scoring_compares_within_sector():
+    banks = [{'ticker': f"B{i}", 'sector': 'Financials', 'pe_ratio': pe}
+             for i, pe in enumerate([8.0, 9.0, 10.0, 11.0, 30.0])]
+    tech = [{'ticker': f"T{i}", 'sector': 'Technology', 'pe_ratio': pe}
+            for i, pe in enumerate([28.0, 34.0, 36.0, 40.0, 44.0])]
+    companies = banks + tech
+    minmax = rank_companies(InvestmentGoal.VALUE, RiskTolerance.MODERATE, companies)
+    sector = rank_companies(InvestmentGoal.VALUE, RiskTolerance.MODERATE, companies, scoring='sector')
+    # min-max puts every bank above the cheapest tech name; sector-neutral interleaves them
+    assert [r['ticker'] for r in minmax[:4]] == ['B0', 'B1', 'B2', 'B3']
+    assert sector[0]['ticker'] == 'T0'
+    assert [r['ticker'] for r in sector][-1] == 'B4'
+    assert all(0.0 <= r['profile_score'] <= 100.0 for r in sector)
+
+    # cached universe stats give the same scores as computing them inline
+    stats = compute_sector_stats(companies, ['pe_ratio', 'dividend_yield'])
+    cached = rank_companies(InvestmentGoal.VALUE, RiskTolerance.MODERATE, companies,
+                            scoring='sector', sector_stats=stats)
+    assert [r['profile_score'] for r in cached] == pytest.approx([r['profile_score'] for r in sector])
+    # ...and a sector-filtered ranking still uses the universe's sector stats
+    only_tech = rank_companies(InvestmentGoal.VALUE, RiskTolerance.MODERATE, tech,
+                               scoring='sector', sector_stats=stats)
+    assert only_tech[0]['profile_score'] == pytest.approx(cached[0]['profile_score'])
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import pytest
+from src.resample import parse_bucket, resample_bars
+
+START = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+
+
+def make_bars(symbol, n, seed, step=timedelta(minutes=1)):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 1, n).cumsum()
+    # drop ~10% of bars so buckets have gaps and uneven sizes
+    keep = rng.random(n) > 0.1
+    return [{'symbol': symbol, 'timestamp': START + i * step,
+             'open': c - 0.2, 'high': c + rng.uniform(0, 1), 'low': c - rng.uniform(0, 1), 'close': c,
+             'volume': float(rng.integers(0, 500)), 'trade_count': float(rng.integers(1, 50)),
+             'vwap': c - 0.1}
+            for i, c in enumerate(close) if keep[i]]
+
+
+def pandas_resample(bars, rule, **kwargs):
+    df = pd.DataFrame(bars).set_index('timestamp')
+    df['pv'] = df['vwap'] * df['volume']
+    out = df.resample(rule, **kwargs).agg({
+        'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+        'volume': 'sum', 'trade_count': 'sum', 'pv': 'sum'}).dropna(subset=['open'])
+    out['vwap'] = out['pv'] / out['volume']
+    return out
+
+
+@pytest.mark.parametrize("bucket,rule", [("5m", "5min"), ("15m", "15min"), ("4h", "4h")])
+def test_matches_pandas_for_many_tickers(bucket, rule):
+    data = {'AAPL': make_bars('AAPL', 2000, 1), 'MSFT': make_bars('MSFT', 1500, 2),
+            'EMPTY': []}
+    resampled = resample_bars(data, bucket)
+    assert resampled['EMPTY'] == []
+    for ticker in ('AAPL', 'MSFT'):
+        expected = pandas_resample(data[ticker], rule)
+        got = pd.DataFrame(resampled[ticker]).set_index('timestamp')
+        assert list(got.index) == list(expected.index)
+        for field in ('open', 'high', 'low', 'close', 'volume', 'trade_count'):
+            np.testing.assert_allclose(got[field], expected[field])
+        has_volume = expected['volume'] > 0
+        np.testing.assert_allclose(got['vwap'][has_volume], expected['vwap'][has_volume])
+        assert (got['symbol'] == ticker).all()
+
+
+def test_weekly_buckets_start_on_monday_and_keep_partial_week():
+    days = make_bars('SPY', 17, 3, step=timedelta(days=1))
+    resampled = resample_bars({'SPY': days}, '1w')['SPY']
+    expected = pandas_resample(days, 'W-MON', label='left', closed='left')
+    assert [b['timestamp'] for b in resampled] == list(expected.index)
+    assert all(b['timestamp'].weekday() == 0 for b in resampled)
+    # the last week is partial and still reported
+    assert resampled[-1]['close'] == days[-1]['close']
+
+
+def test_vwap_is_volume_weighted_and_zero_volume_falls_back():
+    bars = [
+        {'timestamp': START, 'open': 1, 'high': 2, 'low': 1, 'close': 2, 'volume': 100, 'trade_count': 1, 'vwap': 1.5},
+        {'timestamp': START + timedelta(minutes=1), 'open': 2, 'high': 3, 'low': 2, 'close': 3,
+         'volume': 300, 'trade_count': 2, 'vwap': 2.5},
+        {'timestamp': START + timedelta(minutes=5), 'open': 3, 'high': 3, 'low': 3, 'close': 3,
+         'volume': 0, 'trade_count': 0, 'vwap': None},
+    ]
+    first, second = resample_bars({'X': bars}, '5m')['X']
+    assert first['vwap'] == pytest.approx((1.5 * 100 + 2.5 * 300) / 400)
+    assert first['volume'] == 400 and first['trade_count'] == 3
+    assert second['vwap'] == 3.0
+
+
+@pytest.mark.parametrize("bad", ["", "5", "5s", "0m", "fast", None])
+def test_bad_buckets(bad):
+    with pytest.raises(ValueError):
+        parse_bucket(bad)
+    assert parse_bucket("4h") == 4 * 3600 and parse_bucket(300) == 300
+
+
+def test_non_utc_and_naive_timestamps_bucket_in_utc():
+    bars = make_bars('AAPL', 300, 4)
+    eastern = timezone(timedelta(hours=-5))
+    shifted = [{**b, 'timestamp': b['timestamp'].astimezone(eastern)} for b in bars]
+    naive = [{**b, 'timestamp': b['timestamp'].replace(tzinfo=None)} for b in bars]
+    expected = resample_bars({'AAPL': bars}, '15m')['AAPL']
+    assert resample_bars({'AAPL': shifted}, '15m')['AAPL'] == expected
+    assert resample_bars({'AAPL': naive}, '15m')['AAPL'] == expected
+
+
+def test_dst_zone_timestamps_bucket_in_utc():
+    zoneinfo = pytest.importorskip("zoneinfo")
+    new_york = zoneinfo.ZoneInfo("America/New_York")
+    # spans the March 2024 DST change, so the offset is not fixed
+    bars = make_bars('AAPL', 200, 5, step=timedelta(hours=1))
+    bars = [{**b, 'timestamp': b['timestamp'] + timedelta(days=66)} for b in bars]
+    local = [{**b, 'timestamp': b['timestamp'].astimezone(new_york)} for b in bars]
+    assert resample_bars({'AAPL': local}, '4h') == resample_bars({'AAPL': bars}, '4h')
@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timedelta, timezone
+import msgpack
+import numpy as np
+import pytest
+from src import prices
+from src.prices import indicator_columns, COLUMNAR_BAR_FIELDS, stream_prices
+from src.response_formats import encode_bars_ndjson, encode_columnar_json, encode_msgpack, encode_arrow
+
+START = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+
+
+def make_bars(n):
+    return [{'symbol': 'AAPL', 'timestamp': START + timedelta(minutes=i),
+             'open': 100.0 + i, 'high': 101.0 + i, 'low': 99.0 + i, 'close': 100.5 + i,
+             'volume': 1000.0 + i, 'trade_count': 10.0, 'vwap': None if i == 0 else 100.2 + i}
+            for i in range(n)]
+
+
+def make_result(n=50):
+    data = indicator_columns(make_bars(n), [])
+    sma = np.convolve(data['columns']['close'], np.ones(5) / 5, mode='full')[:n]
+    sma[:4] = np.nan
+    data['columns']['SMA'] = sma
+    return {'timestamp': START, 'stock_data': {'AAPL': data}}
+
+
+def test_indicator_columns_are_bar_fields():
+    data = indicator_columns(make_bars(3), [])
+    assert list(data['columns']) == list(COLUMNAR_BAR_FIELDS)
+    assert data['columns']['close'].tolist() == [100.5, 101.5, 102.5]
+    assert np.isnan(data['columns']['vwap'][0])
+    assert data['timestamp'][1] == START + timedelta(minutes=1)
+
+
+def test_columnar_json_has_real_nulls_and_one_encode():
+    result = make_result()
+    decoded = json.loads(encode_columnar_json(result))
+    aapl = decoded['stock_data']['AAPL']
+    assert aapl['columns']['SMA'][:4] == [None] * 4
+    assert aapl['columns']['SMA'][4] == pytest.approx(102.5)
+    assert aapl['columns']['vwap'][0] is None
+    assert aapl['timestamp'][0] == START.isoformat()
+    assert len(aapl['columns']['close']) == 50
+
+
+def test_msgpack_columns_are_raw_buffers():
+    result = make_result()
+    decoded = msgpack.unpackb(encode_msgpack(result), raw=False)
+    aapl = decoded['stock_data']['AAPL']
+    sma = np.frombuffer(aapl['columns']['SMA']['data'], dtype=aapl['columns']['SMA']['dtype'])
+    np.testing.assert_array_equal(sma, result['stock_data']['AAPL']['columns']['SMA'])
+    millis = np.frombuffer(aapl['timestamp']['data'], dtype='<i8')
+    assert millis[1] - millis[0] == 60_000
+    assert millis[0] == int(START.timestamp() * 1000)
+
+
+def test_arrow_stream_round_trips():
+    pa = pytest.importorskip("pyarrow")
+    table = pa.ipc.open_stream(encode_arrow(make_result())).read_all()
+    assert table.num_rows == 50
+    assert table.column('SMA').null_count == 4
+    assert set(table.column('symbol').to_pylist()) == {'AAPL'}
+
+
+def test_stream_prices_yields_ndjson_pages(monkeypatch):
+    seen = []
+
+    def fake_iter(tickers, resolution, start, end, crypto=False):
+        seen.append((start, end, crypto))
+        bars = make_bars(4)
+        yield None, {'AAPL': bars[:2], 'MSFT': []}
+        yield None, {'AAPL': bars[2:]}
+
+    monkeypatch.setattr(prices, 'iter_bars_planned', fake_iter)
+    pages = list(stream_prices(['AAPL', 'MSFT'], 'min', '2024-01-02', '2024-01-03'))
+    # Alpaca's end is inclusive, the requested end date is not
+    assert seen == [(datetime(2024, 1, 2, tzinfo=timezone.utc),
+                     datetime(2024, 1, 2, 23, 59, 59, tzinfo=timezone.utc), False)]
+    assert [ticker for ticker, _ in pages] == ['AAPL', 'AAPL']
+    lines = b''.join(encode_bars_ndjson(ticker, bars) for ticker, bars in pages).splitlines()
+    first = json.loads(lines[0])
+    assert first['symbol'] == 'AAPL' and len(first['bars']) == 2
+    assert first['bars'][0]['timestamp'] == START.isoformat()
+    assert first['bars'][0]['vwap'] is None and first['bars'][1]['close'] == 101.5
+    assert json.loads(lines[1])['bars'][0]['timestamp'] == (START + timedelta(minutes=2)).isoformat()
@@ -0,0 +1,58 @@
+import itertools
+import numpy as np
+import pytest
+from src.screener_scoring import (
+    calculate_scores, calculate_scores_batch, compile_scoring_table, SCORE_COLUMNS
+)
+
+METRICS = [metric for _, metric, _, _ in SCORE_COLUMNS]
+# plausible spread around every range, including exact boundaries
+SCALES = {
+    'pe_ratio': (0, 45), 'ev_ebitda': (0, 25), 'dividend_yield': (0, 0.07),
+    'payout_ratio': (0, 1.0), 'debt_equity_ratio': (0, 3.0), 'current_ratio': (0.5, 4.0),
+    'revenue_growth': (-0.1, 0.35), 'earnings_growth': (-0.1, 0.35), 'ocf_growth': (-0.1, 0.35),
+}
+
+
+def random_companies(seed, n=400):
+    rng = np.random.default_rng(seed)
+    companies = []
+    for i in range(n):
+        company = {'ticker': f"T{i}"}
+        for metric in METRICS:
+            low, high = SCALES[metric]
+            roll = rng.random()
+            if roll < 0.15:
+                company[metric] = None
+            elif roll < 0.2:
+                company[metric] = float(rng.choice([10, 12, 15, 20, 25, 0.05, 0.15, 1.5]))
+            else:
+                company[metric] = float(rng.uniform(low, high))
+        companies.append(company)
+    # whole components missing, and nothing at all
+    companies.append({'ticker': 'NOVAL', 'pe_ratio': None, 'ev_ebitda': None, 'ocf_growth': 0.1})
+    companies.append({'ticker': 'EMPTY'})
+    return companies
+
+
+@pytest.mark.parametrize("goal,risk", list(itertools.product(
+    ["value", "income", "growth", "balanced"], ["conservative", "moderate", "aggressive"])))
+def test_batch_is_identical_to_per_row(goal, risk):
+    companies = random_companies(sum(map(ord, goal + risk)))
+    batch = calculate_scores_batch(companies, goal=goal, risk=risk)
+    for company, scores in zip(companies, batch):
+        assert scores == calculate_scores(company, goal=goal, risk=risk), company['ticker']
+
+
+def test_table_is_compiled_once_per_profile():
+    assert compile_scoring_table("value", "moderate") is compile_scoring_table("value", "moderate")
+
+
+def test_unknown_profiles_cannot_grow_the_table_cache():
+    for i in range(200):
+        calculate_scores_batch([{'pe_ratio': 10.0}], goal=f"goal-{i}", risk="moderate")
+    assert compile_scoring_table.cache_info().currsize <= 64
+
+
+def test_empty_input():
+    assert calculate_scores_batch([]) == []
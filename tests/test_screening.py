@@ -0,0 +1,83 @@
+import sqlite3
+import pytest
+from src.data_layer.ingestion import ensure_db_table_exists
+from src.data_layer.backends import SQLiteMetricsBackend
+from src.data_layer.screening import (
+    parse_screen_request, parse_screen_args, compile_screen_sql, screen_rows
+)
+
+ROWS = [
+    {'ticker': 'AAA', 'company_name': 'A Co', 'sector': 'Technology', 'market_cap': 3e12, 'pe_ratio': 18.0, 'dividend_yield': 0.025},
+    {'ticker': 'BBB', 'company_name': 'B Co', 'sector': 'Energy', 'market_cap': 4e11, 'pe_ratio': 12.0, 'dividend_yield': 0.04},
+    {'ticker': 'CCC', 'company_name': 'C Co', 'sector': 'Technology', 'market_cap': 2e12, 'pe_ratio': 35.0, 'dividend_yield': 0.01},
+    {'ticker': 'DDD', 'company_name': 'D Co', 'sector': 'Energy', 'market_cap': None, 'pe_ratio': 9.0, 'dividend_yield': 0.05},
+    {'ticker': 'EEE', 'company_name': 'E Co', 'sector': 'Utilities', 'market_cap': 1e11, 'pe_ratio': None, 'dividend_yield': 0.03},
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    ensure_db_table_exists(conn)
+    cols = list(ROWS[0])
+    conn.executemany(
+        f"INSERT INTO stock_metrics_cache ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+        [tuple(r[c] for c in cols) for r in ROWS])
+    conn.commit()
+    return conn
+
+
+def run_both(conn, query):
+    sql_result = SQLiteMetricsBackend().screen(query, conn=conn)
+    snapshot_result = screen_rows(query, ROWS)
+    assert sql_result == snapshot_result
+    return sql_result
+
+
+def test_range_and_set_predicates(conn):
+    query = parse_screen_request({
+        'filters': [{'column': 'pe_ratio', 'max': 20},
+                    {'column': 'dividend_yield', 'min': 0.02},
+                    {'column': 'sector', 'in': ['technology', 'ENERGY']}],
+        'columns': ['company_name', 'pe_ratio']})
+    result = run_both(conn, query)
+    # DDD has no market cap, so it sorts last
+    assert [r['ticker'] for r in result['companies']] == ['AAA', 'BBB', 'DDD']
+    assert result['total'] == 3
+    assert set(result['companies'][0]) == {'ticker', 'company_name', 'pe_ratio'}
+
+
+def test_nulls_never_match_and_pagination(conn):
+    query = parse_screen_args({'pe_ratio': '0..', 'sort': 'pe_ratio', 'limit': '2', 'offset': '1',
+                               'columns': 'sector,market_cap,pe_ratio'})
+    result = run_both(conn, query)
+    assert [r['ticker'] for r in result['companies']] == ['BBB', 'AAA']
+    assert result['total'] == 4
+    past_end = SQLiteMetricsBackend().screen(dict(query, offset=10), conn=conn)
+    assert past_end['companies'] == [] and past_end['total'] == 4
+
+
+def test_values_are_bound_not_inlined():
+    query = parse_screen_request({'filters': [{'column': 'ticker', 'in': ["x'); DROP TABLE t;--"]}]})
+    sql, params = compile_screen_sql(query)
+    assert 'DROP' not in sql
+    assert params[0] == "X'); DROP TABLE T;--"
+
+
+@pytest.mark.parametrize("payload", [
+    {'filters': [{'column': 'website', 'in': ['x']}]},
+    {'filters': [{'column': 'pe_ratio'}]},
+    {'filters': [{'column': 'pe_ratio', 'max': 'cheap'}]},
+    {'filters': [{'column': 'sector', 'min': 1}]},
+    {'sort': 'pe_ratio; DROP TABLE x'},
+    {'columns': ['password']},
+    {'limit': 0},
+    ['pe_ratio'],
+    {'filters': ['pe_ratio']},
+    {'filters': {'column': 'pe_ratio', 'max': 20}},
+    {'filters': [{'column': 'sector', 'in': 5}]},
+    {'columns': 5},
+])
+def test_invalid_requests_are_rejected(payload):
+    with pytest.raises(ValueError):
+        parse_screen_request(payload)